@@ -0,0 +1,174 @@
+import argparse
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from predictor import MODEL_PATH, load_predictor
+
+
+# -------------------------------
+# INPUT CHUNKS
+# -------------------------------
+# Stops in the traffic_project layout (CSV as exported by the notebook, or
+# the Parquet files written by columnar.py). Only one chunk per in-flight
+# worker is ever held in memory, whatever the file size.
+KEY_COLUMNS = ["id", "stop_date", "stop_time", "country_name", "vehicle_number"]
+
+
+def iter_chunks(path, chunk_size):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False, na_values=[""])
+
+
+# -------------------------------
+# WORKERS
+# -------------------------------
+# Each worker process loads the model once in its initializer; chunks are
+# then scored with OutcomePredictor.predict_frame().
+_model_path = MODEL_PATH
+
+
+def _init_worker(model_path):
+    global _model_path
+    _model_path = model_path
+    load_predictor(model_path)
+
+
+def score_chunk(chunk_no, df, all_columns=False):
+    predictor = load_predictor(_model_path)
+    if predictor is None:
+        raise FileNotFoundError(f"No model at {_model_path}; run 'python predictor.py train' first")
+    keep = df if all_columns else df[[c for c in KEY_COLUMNS if c in df.columns]]
+    out = pd.concat([keep, predictor.predict_frame(df)], axis=1)
+    # Plain strings so every chunk has the same output schema.
+    for col in out.columns:
+        if isinstance(out[col].dtype, pd.CategoricalDtype):
+            out[col] = out[col].astype(str)
+    return chunk_no, out
+
+
+# -------------------------------
+# STREAMING OUTPUT
+# -------------------------------
+class CsvSink:
+    def __init__(self, path):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._header = True
+
+    def write(self, df):
+        df.to_csv(self._file, index=False, header=self._header)
+        self._header = False
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink:
+    def __init__(self, path):
+        self._path = path
+        self._writer = None
+
+    def write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            # A column that is all NULL in the first chunk (a blank CSV
+            # column) has no type yet; store it as text so later chunks'
+            # values fit.
+            schema = pa.schema([f.with_type(pa.string()) if pa.types.is_null(f.type) else f
+                                for f in table.schema])
+            self._writer = pq.ParquetWriter(self._path, schema.remove_metadata(), compression="zstd")
+        self._writer.write_table(table.cast(self._writer.schema, safe=False))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_sink(path):
+    return ParquetSink(path) if path.endswith(".parquet") else CsvSink(path)
+
+
+# -------------------------------
+# SCORER
+# -------------------------------
+def score_file(input_path, output_path, model_path=MODEL_PATH, chunk_size=50_000,
+               workers=None, all_columns=False, progress_every=5.0, log=print):
+    workers = workers or os.cpu_count() or 1
+    if load_predictor(model_path) is None:
+        raise FileNotFoundError(f"No model at {model_path}; run 'python predictor.py train' first")
+
+    scored = 0
+    start = last_report = time.perf_counter()
+    sink = open_sink(output_path)
+
+    def report(final=False):
+        elapsed = time.perf_counter() - start
+        rate = scored / elapsed if elapsed else 0.0
+        log(f"{'Done' if final else 'Progress'}: {scored:,} stops in {elapsed:,.1f}s ({rate:,.0f} rows/sec)")
+
+    # Results are written in input order: finished chunks wait in `ready`
+    # until every earlier chunk has been written.
+    ready = {}
+    next_chunk = 0
+
+    def drain(finished):
+        nonlocal scored, next_chunk
+        for future in finished:
+            chunk_no, out = future.result()
+            ready[chunk_no] = out
+        while next_chunk in ready:
+            out = ready.pop(next_chunk)
+            sink.write(out)
+            scored += len(out)
+            next_chunk += 1
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_path,)) as pool:
+            pending = set()
+            for chunk_no, df in enumerate(iter_chunks(input_path, chunk_size)):
+                # Same bounded in-flight window as bulk_load.load_csv(),
+                # counting finished chunks still waiting for an earlier one:
+                # a slow chunk must not let `ready` grow without limit.
+                while pending and len(pending) + len(ready) >= workers * 2:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    drain(finished)
+                pending.add(pool.submit(score_chunk, chunk_no, df, all_columns))
+
+                if time.perf_counter() - last_report >= progress_every:
+                    report()
+                    last_report = time.perf_counter()
+            drain(pending)
+    finally:
+        sink.close()
+
+    report(final=True)
+    return scored
+
+
+# -------------------------------
+# COMMAND LINE
+# -------------------------------
+# python batch_score.py stops.csv predictions.csv --workers 8
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Predict violation and stop outcome for a file of stops.")
+    parser.add_argument("input", help="CSV or .parquet file in the traffic_project layout")
+    parser.add_argument("output", help="CSV or .parquet file for the predictions")
+    parser.add_argument("--model", default=MODEL_PATH, help="model trained by predictor.py")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="rows scored per task")
+    parser.add_argument("--workers", type=int, help="scoring processes (default: CPU count)")
+    parser.add_argument("--all-columns", action="store_true", help="copy every input column to the output")
+    args = parser.parse_args()
+
+    score_file(args.input, args.output, model_path=args.model, chunk_size=args.chunk_size,
+               workers=args.workers, all_columns=args.all_columns)
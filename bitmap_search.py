@@ -0,0 +1,332 @@
+import argparse
+import threading
+import time
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from db import get_engine, read_sql
+from plate_index import normalize_plate
+from stop_filters import FORM_COLUMNS
+from watermark import IdWatermark
+
+try:
+    from pyroaring import BitMap
+except ImportError:  # optional: compressed (roaring) bitmaps
+    BitMap = None
+
+
+# -------------------------------
+# INDEXED COLUMNS
+# -------------------------------
+# Low-cardinality form fields get one bitmap per distinct value (bit i set =
+# row position i has that value), so any AND/OR of them is a handful of
+# bitmap operations. Dates, times and plates have too many distinct values
+# for a bitmap each; they are kept as one int32 code per row and turned into
+# a bitmap with a numpy scan when a query uses them.
+BITMAP_COLUMNS = [
+    "country_name", "driver_gender", "driver_race", "driver_age",
+    "search_conducted", "search_type", "stop_duration", "drugs_related_stop",
+]
+CODE_COLUMNS = ["stop_date", "stop_time", "vehicle_number"]
+SEARCH_SQL = f"""
+    SELECT id, {', '.join(CODE_COLUMNS + BITMAP_COLUMNS)}
+    FROM traffic_project
+    WHERE id > :last_id
+    ORDER BY id
+    LIMIT :limit
+"""
+SEARCH_GAP_SQL = f"SELECT id, {', '.join(CODE_COLUMNS + BITMAP_COLUMNS)} FROM traffic_project WHERE {{gaps}} ORDER BY id"
+
+
+def _time_key(value):
+    if isinstance(value, pd.Timedelta):
+        seconds = int(value.total_seconds()) % 86400
+        return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+    if hasattr(value, "strftime"):
+        return value.strftime("%H:%M:%S")
+    return str(value).strip()
+
+
+def index_key(column, value):
+    # The form's values and the stored values meet on one key per column,
+    # compared the way MySQL would (text case-insensitively, NULL never
+    # matches).
+    if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if column == "stop_date":
+        return value.strftime("%Y-%m-%d") if hasattr(value, "strftime") else str(value)[:10]
+    if column == "stop_time":
+        return _time_key(value)
+    if column == "vehicle_number":
+        return normalize_plate(str(value)) or None
+    if column in ("driver_age", "search_conducted", "drugs_related_stop"):
+        return int(value)
+    return str(value).strip().upper() or None
+
+
+# -------------------------------
+# BITMAPS
+# -------------------------------
+class IntBitmap:
+    # Fallback when pyroaring is not installed: an uncompressed bitset in a
+    # Python int. &, | and bit_count() run in C over whole machine words.
+    __slots__ = ("bits",)
+
+    def __init__(self, bits=0):
+        self.bits = bits
+
+    @classmethod
+    def from_positions(cls, positions):
+        positions = np.asarray(positions, dtype=np.int64)
+        if not len(positions):
+            return cls(0)
+        flags = np.zeros(int(positions.max()) + 1, dtype=bool)
+        flags[positions] = True
+        return cls(int.from_bytes(np.packbits(flags, bitorder="little").tobytes(), "little"))
+
+    def __and__(self, other):
+        return IntBitmap(self.bits & other.bits)
+
+    def __or__(self, other):
+        return IntBitmap(self.bits | other.bits)
+
+    def __len__(self):
+        return self.bits.bit_count()
+
+    def to_array(self):
+        data = self.bits.to_bytes((self.bits.bit_length() + 7) // 8, "little")
+        return np.flatnonzero(np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder="little"))
+
+    def nbytes(self):
+        return (self.bits.bit_length() + 7) // 8
+
+
+def make_bitmap(positions=()):
+    positions = np.asarray(positions, dtype=np.int64)
+    if BitMap is None:
+        return IntBitmap.from_positions(positions)
+    return BitMap(array("I", positions.astype(np.uint32).tobytes()))
+
+
+def _positions(bitmap):
+    return np.asarray(bitmap.to_array(), dtype=np.int64)
+
+
+def _bitmap_bytes(bitmap):
+    return bitmap.nbytes() if BitMap is None else len(bitmap.serialize())
+
+
+# -------------------------------
+# SEARCH INDEX
+# -------------------------------
+class StopSearchIndex:
+    def __init__(self):
+        self.watermark = IdWatermark()
+        self.rows = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._codes = {c: np.empty(0, dtype=np.int32) for c in CODE_COLUMNS}
+        self._dictionary = {c: {} for c in CODE_COLUMNS + BITMAP_COLUMNS}
+        self._bitmaps = {c: {} for c in BITMAP_COLUMNS}
+        self._lock = threading.Lock()
+        # Held for a whole refresh, so concurrent sessions never append the
+        # same rows twice; searches only wait for the in-memory append.
+        self._refresh_lock = threading.Lock()
+        self.searches = 0
+
+    @property
+    def last_id(self):
+        return self.watermark.last_id
+
+    def _global_codes(self, column, series):
+        # Factorize the chunk, then map each distinct key (not each row) to
+        # the index-wide code for that column. NULLs become -1.
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        dictionary = self._dictionary[column]
+        mapping = np.empty(len(uniques) + 1, dtype=np.int32)
+        mapping[-1] = -1
+        for i, value in enumerate(uniques):
+            key = index_key(column, value)
+            if key is None:
+                mapping[i] = -1
+            else:
+                mapping[i] = dictionary.setdefault(key, len(dictionary))
+        return mapping[codes]
+
+    def _append(self, df):
+        base = self.rows
+        for column in CODE_COLUMNS:
+            self._codes[column] = np.concatenate([self._codes[column], self._global_codes(column, df[column])])
+        for column in BITMAP_COLUMNS:
+            codes = self._global_codes(column, df[column])
+            order = np.argsort(codes, kind="stable")
+            sorted_codes = codes[order]
+            starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+            bitmaps = self._bitmaps[column]
+            for start, end in zip(starts, np.r_[starts[1:], len(order)]):
+                code = int(sorted_codes[start])
+                if code < 0:
+                    continue
+                positions = order[start:end] + base
+                if code in bitmaps:
+                    # A new bitmap is swapped in rather than updated in place:
+                    # searches hand the stored bitmaps out as results.
+                    bitmaps[code] = bitmaps[code] | make_bitmap(positions)
+                else:
+                    bitmaps[code] = make_bitmap(positions)
+        self._ids = np.concatenate([self._ids, df["id"].to_numpy(dtype=np.int64)])
+        self.rows += len(df)
+
+    def refresh(self, engine, chunk_size=200_000):
+        # Startup load on a fresh index, afterwards only the stops with an id
+        # above the last one seen (keyset on the primary key) and late rows
+        # in the watermark's gaps. Row positions follow arrival order, which
+        # is id order apart from those late rows.
+        loaded = 0
+        with self._refresh_lock:
+            gap_filter, gap_params = self.watermark.gap_filter()
+            if gap_filter:
+                df = read_sql(SEARCH_GAP_SQL.format(gaps=gap_filter), engine, params=gap_params,
+                              name="__bitmap_search__")
+                with self._lock:
+                    if not df.empty:
+                        self._append(df)
+                    self.watermark.fill(df["id"].tolist())
+                loaded += len(df)
+            while True:
+                df = read_sql(SEARCH_SQL, engine, params={"last_id": self.last_id, "limit": chunk_size},
+                              name="__bitmap_search__")
+                if df.empty:
+                    break
+                with self._lock:
+                    self._append(df)
+                    self.watermark.advance(df["id"].tolist())
+                loaded += len(df)
+                if len(df) < chunk_size:
+                    break
+        return loaded
+
+    # Query building blocks, all returning bitmaps.
+    def _all(self):
+        return make_bitmap(np.arange(self.rows))
+
+    def _equals(self, column, value):
+        code = self._dictionary[column].get(index_key(column, value))
+        if code is None:
+            return make_bitmap()
+        if column in self._bitmaps:
+            return self._bitmaps[column][code]
+        return make_bitmap(np.flatnonzero(self._codes[column] == code))
+
+    def _any_of(self, column, values):
+        codes = [self._dictionary[column].get(index_key(column, v)) for v in values]
+        codes = [c for c in codes if c is not None]
+        if not codes:
+            return make_bitmap()
+        return make_bitmap(np.flatnonzero(np.isin(self._codes[column], codes)))
+
+    def search(self, stop_date=None, stop_time=None, country_name=None, driver_gender=None,
+               driver_age=0, driver_race=None, search_conducted=None, search_type=None,
+               stop_duration=None, drugs_related_stop=None, vehicle_numbers=()):
+        # Same arguments and the same logic as stop_filters.build_stop_query:
+        # (date OR time) AND the other filled-in fields, OR any of the plates.
+        # Returns a bitmap of matching row positions.
+        with self._lock:
+            self.searches += 1
+            terms = []
+            date_time = [self._equals(c, v) for c, v in [("stop_date", stop_date), ("stop_time", stop_time)] if v]
+            if date_time:
+                terms.append(date_time[0] if len(date_time) == 1 else date_time[0] | date_time[1])
+            for column, value in [("country_name", country_name), ("driver_gender", driver_gender),
+                                  ("driver_race", driver_race), ("search_type", search_type),
+                                  ("stop_duration", stop_duration)]:
+                if value:
+                    terms.append(self._equals(column, value))
+            if driver_age != 0:
+                terms.append(self._equals("driver_age", driver_age))
+            for column, value in [("search_conducted", search_conducted), ("drugs_related_stop", drugs_related_stop)]:
+                if value:
+                    terms.append(self._equals(column, 1 if value == "Yes" else 0))
+
+            plates = [v.strip() for v in vehicle_numbers if v.strip()]
+            if not terms and not plates:
+                return self._all()
+            # Most selective bitmap first keeps the intermediate results small.
+            terms.sort(key=len)
+            result = None
+            for term in terms:
+                result = term if result is None else result & term
+            if plates:
+                by_plate = self._any_of("vehicle_number", plates)
+                result = by_plate if result is None else result | by_plate
+            return result
+
+    def page_ids(self, result, page=1, page_size=25):
+        # Stop ids on one page of a search result, newest stop first.
+        positions = _positions(result)
+        positions = positions[np.argsort(self._ids[positions], kind="stable")[::-1]]
+        start = (page - 1) * page_size
+        return self._ids[positions[start:start + page_size]]
+
+    def stats(self):
+        with self._lock:
+            bitmaps = [b for column in self._bitmaps.values() for b in column.values()]
+            return {
+                "rows": self.rows,
+                "last_id": self.last_id,
+                "backend": "roaring" if BitMap is not None else "int bitset",
+                "bitmaps": len(bitmaps),
+                "bitmap_bytes": sum(_bitmap_bytes(b) for b in bitmaps),
+                "code_bytes": int(sum(c.nbytes for c in self._codes.values()) + self._ids.nbytes),
+                "searches": self.searches,
+            }
+
+
+def fetch_stops(ids, engine=None):
+    # Full rows for one page of ids (primary key lookups), in the given order.
+    ids = [int(i) for i in ids]
+    if not ids:
+        return pd.DataFrame(columns=FORM_COLUMNS)
+    params = {f"id_{i}": stop_id for i, stop_id in enumerate(ids)}
+    sql = (f"SELECT id, {', '.join(FORM_COLUMNS)} FROM traffic_project "
+           f"WHERE id IN ({', '.join(':' + name for name in params)})")
+    df = read_sql(sql, engine, params=params, name="__bitmap_page__")
+    order = {stop_id: i for i, stop_id in enumerate(ids)}
+    return (df.assign(_order=df["id"].map(order)).sort_values("_order")
+            .drop(columns=["_order", "id"]).reset_index(drop=True))
+
+
+# -------------------------------
+# COMMAND LINE
+# -------------------------------
+# python bitmap_search.py --country India --gender F --search Yes
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the bitmap search index and run one form search.")
+    parser.add_argument("--country")
+    parser.add_argument("--gender")
+    parser.add_argument("--race")
+    parser.add_argument("--age", type=int, default=0)
+    parser.add_argument("--search", choices=["Yes", "No"])
+    parser.add_argument("--drugs", choices=["Yes", "No"])
+    parser.add_argument("--duration")
+    parser.add_argument("--plates", default="", help="comma separated vehicle numbers")
+    parser.add_argument("--page-size", type=int, default=10)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    index = StopSearchIndex()
+    start = time.perf_counter()
+    index.refresh(engine)
+    print(f"Indexed {index.rows:,} stops in {time.perf_counter() - start:.2f}s: {index.stats()}")
+
+    start = time.perf_counter()
+    result = index.search(
+        country_name=args.country, driver_gender=args.gender, driver_race=args.race, driver_age=args.age,
+        search_conducted=args.search, drugs_related_stop=args.drugs, stop_duration=args.duration,
+        vehicle_numbers=args.plates.split(","),
+    )
+    matches = len(result)
+    elapsed_us = (time.perf_counter() - start) * 1e6
+    print(f"{matches:,} matching stops in {elapsed_us:,.0f} µs")
+    print(fetch_stops(index.page_ids(result, 1, args.page_size), engine).to_string())
@@ -0,0 +1,274 @@
+import argparse
+import csv
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from db import DB_URL, create_pooled_engine
+
+
+# -------------------------------
+# COLUMNS & ROW CLEANING
+# -------------------------------
+# Same columns as traffic_project in traffic_stops.sql (id and created_at are
+# filled by MySQL). Extra CSV columns such as driver_age_raw are ignored.
+LOAD_COLUMNS = [
+    "stop_date", "stop_time", "country_name", "driver_gender", "driver_age",
+    "driver_race", "violation_raw", "violation", "search_conducted", "search_type",
+    "stop_outcome", "is_arrested", "stop_duration", "drugs_related_stop", "vehicle_number",
+]
+BOOL_COLUMNS = {"search_conducted", "is_arrested", "drugs_related_stop"}
+DATE_FORMATS = ["%Y-%m-%d", "%m/%d/%Y", "%d-%m-%Y", "%Y/%m/%d"]
+TIME_FORMATS = ["%H:%M:%S", "%H:%M"]
+TRUE_VALUES = {"1", "true", "t", "yes", "y"}
+REJECT_SAMPLES = 20
+
+INSERT_SQL = text(
+    f"INSERT INTO traffic_project ({', '.join(LOAD_COLUMNS)}) "
+    f"VALUES ({', '.join(':' + c for c in LOAD_COLUMNS)})"
+)
+
+CHECKPOINT_DDL = """
+    CREATE TABLE IF NOT EXISTS traffic_load_batches (
+      load_name VARCHAR(255) NOT NULL,
+      batch_no INT NOT NULL,
+      rows_loaded INT NOT NULL,
+      rows_rejected INT NOT NULL DEFAULT 0,
+      batch_size INT,
+      loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+      PRIMARY KEY (load_name, batch_no)
+    )
+"""
+
+
+def _parse(value, formats, kind):
+    for fmt in formats:
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return parsed.date().isoformat() if kind == "date" else parsed.time().isoformat()
+    return None
+
+
+def clean_row(record):
+    row = {}
+    for col in LOAD_COLUMNS:
+        value = (record.get(col) or "").strip()
+        if value == "":
+            row[col] = None
+        elif col == "stop_date":
+            row[col] = _parse(value, DATE_FORMATS, "date")
+        elif col == "stop_time":
+            row[col] = _parse(value, TIME_FORMATS, "time")
+        elif col in BOOL_COLUMNS:
+            row[col] = 1 if value.lower() in TRUE_VALUES else 0
+        elif col == "driver_age":
+            try:
+                row[col] = int(float(value))
+            except ValueError:
+                row[col] = None
+        else:
+            row[col] = value
+    # Same default the notebook applies with fillna("other").
+    if row["search_type"] is None:
+        row["search_type"] = "other"
+    return row
+
+
+def iter_batches(path, batch_size):
+    # Streams the CSV; at most one batch of rows is materialized here.
+    # Yields (batch_no, rows, rejected line numbers). stop_date is the NOT
+    # NULL partitioning key, so a row without a parseable date would fail
+    # its whole multi-row INSERT / LOAD DATA; it is left out of the batch
+    # instead. Batches still cover batch_size CSV rows each, so a resumed
+    # load splits the file the same way.
+    with open(path, newline="", encoding="utf-8") as f:
+        batch, rejected = [], []
+        batch_no = seen = 0
+        for record in csv.DictReader(f):
+            row = clean_row(record)
+            seen += 1
+            if row["stop_date"] is None:
+                # Line 1 is the header.
+                rejected.append(seen + 1)
+            else:
+                batch.append(row)
+            if seen % batch_size == 0:
+                yield batch_no, batch, rejected
+                batch_no += 1
+                batch, rejected = [], []
+        if batch or rejected:
+            yield batch_no, batch, rejected
+
+
+# -------------------------------
+# BATCH WRITERS
+# -------------------------------
+# Each batch is written and recorded in traffic_load_batches in the same
+# transaction, so after a crash a resumed load skips exactly the batches
+# that were committed.
+def _record_batch(conn, load_name, batch_no, rows, rejected, batch_size):
+    conn.execute(
+        text("INSERT INTO traffic_load_batches (load_name, batch_no, rows_loaded, rows_rejected, batch_size) "
+             "VALUES (:n, :b, :r, :x, :s)"),
+        {"n": load_name, "b": batch_no, "r": len(rows), "x": rejected, "s": batch_size},
+    )
+
+
+def write_insert(engine, load_name, batch_no, rows, rejected=0, batch_size=None):
+    with engine.begin() as conn:
+        # A list of parameter sets is sent as multi-row INSERT ... VALUES
+        # statements by the driver (pymysql rewrites executemany).
+        if rows:
+            conn.execute(INSERT_SQL, rows)
+        _record_batch(conn, load_name, batch_no, rows, rejected, batch_size)
+    return len(rows)
+
+
+def write_load_data(engine, load_name, batch_no, rows, rejected=0, batch_size=None):
+    if not rows:
+        with engine.begin() as conn:
+            _record_batch(conn, load_name, batch_no, rows, rejected, batch_size)
+        return 0
+    fd, path = tempfile.mkstemp(suffix=".csv", prefix=f"traffic_batch_{batch_no}_")
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            for row in rows:
+                writer.writerow(["\\N" if row[c] is None else row[c] for c in LOAD_COLUMNS])
+        load_sql = (
+            f"LOAD DATA LOCAL INFILE '{path.replace(os.sep, '/')}' INTO TABLE traffic_project "
+            "CHARACTER SET utf8mb4 FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+            f"LINES TERMINATED BY '\\n' ({', '.join(LOAD_COLUMNS)})"
+        )
+        with engine.begin() as conn:
+            conn.exec_driver_sql(load_sql)
+            _record_batch(conn, load_name, batch_no, rows, rejected, batch_size)
+    finally:
+        os.remove(path)
+    return len(rows)
+
+
+WRITERS = {"insert": write_insert, "load-data": write_load_data}
+
+
+# -------------------------------
+# LOADER
+# -------------------------------
+def default_load_name(path):
+    # File name plus size: re-running the same export resumes it, a new
+    # export with the same name starts a fresh load.
+    return f"{os.path.basename(path)}:{os.path.getsize(path)}"
+
+
+def completed_batches(engine, load_name):
+    with engine.begin() as conn:
+        conn.execute(text(CHECKPOINT_DDL))
+        # Checkpoint tables created before rows_rejected / batch_size existed.
+        columns = {c["name"] for c in inspect(conn).get_columns("traffic_load_batches")}
+        if "rows_rejected" not in columns:
+            conn.execute(text("ALTER TABLE traffic_load_batches ADD COLUMN rows_rejected INT NOT NULL DEFAULT 0"))
+        if "batch_size" not in columns:
+            conn.execute(text("ALTER TABLE traffic_load_batches ADD COLUMN batch_size INT"))
+        rows = conn.execute(
+            text("SELECT batch_no FROM traffic_load_batches WHERE load_name = :n"), {"n": load_name}
+        ).fetchall()
+    return {r[0] for r in rows}
+
+
+def recorded_batch_size(engine, load_name):
+    # The batch size a load's committed batches were numbered with (None
+    # for checkpoints written before it was recorded).
+    with engine.connect() as conn:
+        return conn.execute(
+            text("SELECT MAX(batch_size) FROM traffic_load_batches WHERE load_name = :n"), {"n": load_name}
+        ).scalar()
+
+
+def load_csv(path, url=DB_URL, batch_size=5000, workers=4, method="insert",
+             load_name=None, progress_every=5.0, log=print):
+    load_name = load_name or default_load_name(path)
+    connect_args = {"local_infile": True} if method == "load-data" else {}
+    engine = create_pooled_engine(url, pool_size=workers, max_overflow=0, connect_args=connect_args)
+    writer = WRITERS[method]
+
+    done = completed_batches(engine, load_name)
+    if done:
+        log(f"Resuming '{load_name}': {len(done)} batches already committed")
+        # Batch numbers count batch_size rows, so a resumed load has to
+        # split the file the way the interrupted one did.
+        recorded = recorded_batch_size(engine, load_name)
+        if recorded and recorded != batch_size:
+            log(f"Using its batch size of {recorded:,} rows instead of {batch_size:,}")
+            batch_size = recorded
+
+    loaded = skipped = rejected_count = 0
+    # Only the first few rejected line numbers are kept for the report.
+    rejected_lines = []
+    start = last_report = time.perf_counter()
+    pending = set()
+
+    def report(final=False):
+        elapsed = time.perf_counter() - start
+        rate = loaded / elapsed if elapsed else 0.0
+        label = "Done" if final else "Progress"
+        log(f"{label}: {loaded:,} rows in {elapsed:,.1f}s ({rate:,.0f} rows/sec), {skipped:,} rows skipped, "
+            f"{rejected_count:,} rows rejected")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch_no, rows, rejected in iter_batches(path, batch_size):
+            if batch_no in done:
+                skipped += len(rows) + len(rejected)
+                continue
+            rejected_count += len(rejected)
+            rejected_lines.extend(rejected[:REJECT_SAMPLES - len(rejected_lines)])
+            # Bounded in-flight work keeps memory flat: the reader waits
+            # until a worker frees up instead of racing ahead of the DB.
+            while len(pending) >= workers * 2:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                loaded += sum(f.result() for f in finished)
+            pending.add(pool.submit(writer, engine, load_name, batch_no, rows, len(rejected), batch_size))
+
+            if time.perf_counter() - last_report >= progress_every:
+                report()
+                last_report = time.perf_counter()
+
+        for future in pending:
+            loaded += future.result()
+
+    report(final=True)
+    if rejected_count:
+        shown = ", ".join(str(n) for n in rejected_lines)
+        more = f" and {rejected_count - len(rejected_lines):,} more" if rejected_count > len(rejected_lines) else ""
+        log(f"Rejected (no parseable stop_date), CSV lines: {shown}{more}")
+    engine.dispose()
+    return loaded
+
+
+# -------------------------------
+# COMMAND LINE
+# -------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a traffic stops CSV into traffic_project.")
+    parser.add_argument("csv_path")
+    parser.add_argument("--url", default=DB_URL, help="SQLAlchemy database URL")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per committed batch")
+    parser.add_argument("--workers", type=int, default=4, help="parallel writer connections")
+    parser.add_argument("--method", choices=sorted(WRITERS), default="insert")
+    parser.add_argument("--load-name", help="checkpoint name (default: file name and size)")
+    parser.add_argument("--refresh-cube", action="store_true", help="fold the new rows into the aggregate cube")
+    args = parser.parse_args()
+
+    load_csv(args.csv_path, url=args.url, batch_size=args.batch_size, workers=args.workers,
+             method=args.method, load_name=args.load_name)
+
+    if args.refresh_cube:
+        from cube import refresh_cube
+
+        engine = create_pooled_engine(args.url)
+        print(f"Cube is current up to id {refresh_cube(engine)}")
@@ -0,0 +1,240 @@
+import argparse
+import re
+import time
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+# -------------------------------
+# NORMALIZATION RULES
+# -------------------------------
+# The export's violation labels, and its violation_raw spellings mapped onto
+# them. Exact names first, then keyword rules for free-text variants; the
+# rules only ever produce one of VIOLATIONS, so cleaning adds no categories.
+VIOLATIONS = ["Speeding", "Other", "DUI"]
+VIOLATION_NAMES = {
+    "speeding": "Speeding",
+    "drunk driving": "DUI",
+    "signal violation": "Other",
+    "seatbelt": "Other",
+    "other": "Other",
+}
+VIOLATION_RULES = [
+    (re.compile(r"speed", re.I), "Speeding"),
+    (re.compile(r"\bdui\b|drunk|influence|impaired", re.I), "DUI"),
+]
+GENDERS = {"M": "M", "MALE": "M", "F": "F", "FEMALE": "F"}
+BOOL_COLUMNS = ["search_conducted", "is_arrested", "drugs_related_stop"]
+TRUE_VALUES = {"1", "1.0", "true", "t", "yes", "y"}
+FALSE_VALUES = {"0", "0.0", "false", "f", "no", "n"}
+CATEGORY_COLUMNS = [
+    "country_name", "driver_race", "violation_raw", "violation", "search_type",
+    "stop_outcome", "stop_duration", "vehicle_number",
+]
+MIN_AGE, MAX_AGE = 15, 100
+MIN_BIRTH_YEAR = 1900
+
+
+def normalize_violation(raw):
+    if raw is None or raw != raw:
+        return None
+    text = str(raw).strip()
+    if text.lower() in VIOLATION_NAMES:
+        return VIOLATION_NAMES[text.lower()]
+    for pattern, label in VIOLATION_RULES:
+        if pattern.search(text):
+            return label
+    return None
+
+
+def _violation_label(value):
+    return {label.lower(): label for label in VIOLATIONS}.get(str(value).strip().lower())
+
+
+# -------------------------------
+# COLUMN CLEANERS
+# -------------------------------
+# Text rules run once per distinct value (through the categories), never
+# once per row, so cost follows the column's cardinality.
+def _per_unique(series, parse):
+    # Dates, times and ages repeat heavily; parse each distinct string once
+    # and broadcast the results back with the factorized codes.
+    codes, uniques = pd.factorize(series)
+    parsed = parse(pd.Series(uniques, dtype="string"))
+    if not len(uniques):
+        # All missing (e.g. a chunk where the column is blank): nothing to
+        # take from, but keep the parsed dtype.
+        return pd.Series(index=series.index, dtype=parsed.dtype)
+    values = parsed.take(codes.clip(min=0)).to_numpy()
+    result = pd.Series(values, index=series.index, dtype=parsed.dtype)
+    return result.mask(codes < 0)
+
+
+def _category(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    values = series.astype("string").str.strip()
+    return values.mask(values == "").astype("category")
+
+
+def _map_categories(series, fn):
+    cat = _category(series)
+    mapping = {value: fn(value) for value in cat.cat.categories}
+    return cat.map(mapping, na_action="ignore").astype("category")
+
+
+def clean_violation(df):
+    # The export's own label wins; violation_raw only fills the rows whose
+    # label is missing or not one of VIOLATIONS.
+    derived = _map_categories(df["violation_raw"], normalize_violation).cat.set_categories(VIOLATIONS)
+    if "violation" not in df.columns:
+        return derived
+    existing = _map_categories(df["violation"], _violation_label).cat.set_categories(VIOLATIONS)
+    return existing.fillna(derived)
+
+
+def clean_gender(series):
+    return _map_categories(series, lambda v: GENDERS.get(str(v).upper())).cat.set_categories(["F", "M"])
+
+
+def clean_bool(series):
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return series.astype("boolean")
+    text = series.astype("string").str.strip().str.lower()
+    out = pd.Series(pd.NA, index=series.index, dtype="boolean")
+    out[text.isin(TRUE_VALUES).fillna(False).to_numpy(bool)] = True
+    out[text.isin(FALSE_VALUES).fillna(False).to_numpy(bool)] = False
+    return out
+
+
+def clean_date(series):
+    # ISO dates parse on the fast path; only the leftovers get format
+    # inference.
+    def parse(text):
+        text = text.str.strip()
+        parsed = pd.to_datetime(text, format="%Y-%m-%d", errors="coerce")
+        retry = parsed.isna() & text.notna() & (text != "")
+        if retry.any():
+            parsed[retry] = pd.to_datetime(text[retry], format="mixed", errors="coerce")
+        return parsed
+
+    return _per_unique(series, parse)
+
+
+def clean_time(series):
+    # Time of day as timedelta64 (what MySQL TIME reads back as), instead
+    # of one Python datetime.time object per row.
+    if pd.api.types.is_timedelta64_dtype(series.dtype):
+        return series
+
+    def parse(text):
+        text = text.str.strip()
+        text = text.mask(text.str.fullmatch(r"\d{1,2}:\d{2}").fillna(False), text + ":00")
+        return pd.to_timedelta(text, errors="coerce")
+
+    return _per_unique(series, parse)
+
+
+def _number(series):
+    return _per_unique(series, lambda text: pd.to_numeric(text, errors="coerce").astype("float64"))
+
+
+def clean_age(df, stop_date):
+    age = _number(df["driver_age"]) if "driver_age" in df.columns else None
+    if "driver_age_raw" in df.columns:
+        # driver_age_raw holds an age; only a four-digit year in it is read
+        # as a birth year. Used where driver_age is missing.
+        raw = _number(df["driver_age_raw"])
+        year = stop_date.dt.year
+        derived = raw.mask((raw >= MIN_BIRTH_YEAR) & (raw <= year), year - raw)
+        age = derived if age is None else age.fillna(derived)
+    if age is None:
+        return None
+    age = age.where((age >= MIN_AGE) & (age <= MAX_AGE))
+    return age.round().astype("UInt8")
+
+
+# -------------------------------
+# PIPELINE
+# -------------------------------
+def clean_frame(df):
+    # Returns a new frame in the traffic_project layout: datetime64 date,
+    # timedelta64 time, nullable booleans, a small-int age and categoricals
+    # for every repeated text column.
+    out = pd.DataFrame(index=df.index)
+    if "id" in df.columns:
+        out["id"] = pd.to_numeric(df["id"], errors="coerce").astype("Int64")
+    out["stop_date"] = clean_date(df["stop_date"])
+    out["stop_time"] = clean_time(df["stop_time"])
+    out["country_name"] = df["country_name"]
+    out["driver_gender"] = clean_gender(df["driver_gender"])
+    if "driver_age_raw" in df.columns:
+        out["driver_age_raw"] = _number(df["driver_age_raw"]).round().astype("Int16")
+    age = clean_age(df, out["stop_date"])
+    if age is not None:
+        out["driver_age"] = age
+    out["driver_race"] = df["driver_race"]
+    out["violation_raw"] = df["violation_raw"]
+    out["violation"] = clean_violation(df)
+    for col in BOOL_COLUMNS:
+        if col in df.columns:
+            out[col] = clean_bool(df[col])
+    search_type = _category(df["search_type"])
+    if "other" not in search_type.cat.categories:
+        search_type = search_type.cat.add_categories("other")
+    out["search_type"] = search_type.fillna("other")
+    for col in ["stop_outcome", "stop_duration", "vehicle_number"]:
+        out[col] = df[col]
+    for col in CATEGORY_COLUMNS:
+        out[col] = _category(out[col])
+    # Column order of the input wherever it overlaps.
+    order = [c for c in df.columns if c in out.columns] + [c for c in out.columns if c not in df.columns]
+    return out[order]
+
+
+def concat_clean(frames):
+    # pd.concat turns categoricals with different categories into object
+    # columns; union the categories first so the result stays compact.
+    frames = list(frames)
+    if not frames:
+        return pd.DataFrame()
+    columns = {}
+    for col in frames[0].columns:
+        parts = [f[col] for f in frames]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            columns[col] = pd.Series(union_categoricals(parts, ignore_order=True), name=col)
+        else:
+            columns[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def read_clean_csv(path, chunk_size=1_000_000):
+    # Only one raw (string) chunk is alive at a time; the cleaned chunks are
+    # already compact when they are combined.
+    chunks = pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False, na_values=[""])
+    return concat_clean(clean_frame(chunk) for chunk in chunks)
+
+
+def frame_memory(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+# -------------------------------
+# COMMAND LINE
+# -------------------------------
+# python cleaning.py traffic_stops.csv --out clean.parquet
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean a traffic stops CSV into compact dtypes.")
+    parser.add_argument("csv_path")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--out", help="write the cleaned frame to this .parquet file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df = read_clean_csv(args.csv_path, args.chunk_size)
+    elapsed = time.perf_counter() - start
+    print(f"Cleaned {len(df):,} rows in {elapsed:,.1f}s; {frame_memory(df) / 2**20:,.1f} MiB in memory")
+    print(df.dtypes.to_string())
+    if args.out:
+        df.to_parquet(args.out, index=False)
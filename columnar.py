@@ -0,0 +1,104 @@
+import argparse
+import os
+
+import pandas as pd
+from sqlalchemy import create_engine, event, text
+
+
+# -------------------------------
+# DUCKDB OVER PARQUET
+# -------------------------------
+def attach_parquet(engine, parquet_glob):
+    # Every pooled DuckDB connection sees traffic_project as a view over the
+    # Parquet snapshot, so the MySQL catalog runs unchanged (after
+    # dialect.translate) on a vectorized columnar engine.
+    path = parquet_glob.replace("'", "''")
+
+    @event.listens_for(engine, "connect")
+    def create_view(dbapi_connection, connection_record):
+        dbapi_connection.execute(
+            f"CREATE OR REPLACE VIEW traffic_project AS SELECT * FROM read_parquet('{path}')"
+        )
+
+    return engine
+
+
+# -------------------------------
+# SNAPSHOTS FROM MYSQL
+# -------------------------------
+def iter_chunks(source_engine, chunk_size=500_000, where=None, params=None, partition=None, columns=None,
+                table="traffic_project"):
+    # Keyset pages on the primary key; one chunk in memory at a time.
+    # where/params narrow the copy (e.g. a stop_date range); partition reads
+    # a single MySQL partition of the table; columns limits the copy to
+    # those columns (plus id); table reads a copy of traffic_project (the
+    # archive's staging tables).
+    source = f"{table} PARTITION ({partition})" if partition else table
+    condition = f"id > :last_id AND ({where})" if where else "id > :last_id"
+    select = "*" if columns is None else ", ".join(["id"] + [c for c in columns if c != "id"])
+    last_id = 0
+    while True:
+        with source_engine.connect() as conn:
+            df = pd.read_sql(
+                text(f"SELECT {select} FROM {source} WHERE {condition} ORDER BY id LIMIT :limit"),
+                conn,
+                params={**(params or {}), "last_id": last_id, "limit": chunk_size},
+            )
+        if df.empty:
+            return
+        if "stop_time" in df.columns and pd.api.types.is_timedelta64_dtype(df["stop_time"]):
+            # pymysql returns TIME as timedelta; store it as a time of day.
+            df["stop_time"] = (pd.Timestamp(0) + df["stop_time"]).dt.time
+        last_id = int(df["id"].iloc[-1])
+        yield df
+
+
+def snapshot_to_parquet(source_engine, out_dir, chunk_size=500_000):
+    os.makedirs(out_dir, exist_ok=True)
+    rows = 0
+    for part, df in enumerate(iter_chunks(source_engine, chunk_size)):
+        df.to_parquet(os.path.join(out_dir, f"part-{part:05d}.parquet"), compression="zstd", index=False)
+        rows += len(df)
+    return rows
+
+
+def snapshot_to_sqlite(source_engine, sqlite_path, chunk_size=500_000, where=None, params=None):
+    target = create_engine(f"sqlite:///{sqlite_path}")
+    rows = 0
+    with target.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS traffic_project"))
+    for df in iter_chunks(source_engine, chunk_size, where=where, params=params):
+        # SQLite has no DATE/TIME types; ISO strings keep strftime() working.
+        for col in ["stop_date", "stop_time", "created_at"]:
+            if col in df.columns:
+                df[col] = df[col].astype(str).where(df[col].notna(), None)
+        df.to_sql("traffic_project", target, if_exists="append", index=False)
+        rows += len(df)
+    with target.begin() as conn:
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS idx_traffic_project_id ON traffic_project (id)"))
+    target.dispose()
+    return rows
+
+
+# -------------------------------
+# COMMAND LINE
+# -------------------------------
+# python columnar.py parquet snapshot/              -> TRAFFIC_DB_URL=duckdb:///:memory:
+#                                                      TRAFFIC_PARQUET=snapshot/*.parquet
+# python columnar.py sqlite example/my_database.db  -> TRAFFIC_DB_URL=sqlite:///example/my_database.db
+if __name__ == "__main__":
+    from db import DB_URL
+
+    parser = argparse.ArgumentParser(description="Copy traffic_project into a local columnar/embedded store.")
+    parser.add_argument("format", choices=["parquet", "sqlite"])
+    parser.add_argument("target", help="output directory (parquet) or database file (sqlite)")
+    parser.add_argument("--source-url", default=DB_URL, help="SQLAlchemy URL of the MySQL source")
+    parser.add_argument("--chunk-size", type=int, default=500_000)
+    args = parser.parse_args()
+
+    source = create_engine(args.source_url)
+    if args.format == "parquet":
+        copied = snapshot_to_parquet(source, args.target, args.chunk_size)
+    else:
+        copied = snapshot_to_sqlite(source, args.target, args.chunk_size)
+    print(f"Copied {copied:,} rows to {args.target}")
@@ -0,0 +1,539 @@
+import argparse
+
+from sqlalchemy import text
+
+from partitions import ARCHIVE_DIR, load_manifest
+from queries import queries
+from watermark import GAP_TTL, find_gaps
+
+
+# -------------------------------
+# CUBE TABLES
+# -------------------------------
+# Pre-aggregated counts/sums at the grains the insight catalog groups by.
+# Grouping columns are NOT NULL so ON DUPLICATE KEY UPDATE can merge new
+# rows into existing cells: NULL is stored as '' for text and -1 for numbers,
+# and the cube queries turn the sentinels back into NULL.
+CUBE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS traffic_cube_state (
+      cube_name VARCHAR(50) PRIMARY KEY,
+      last_id BIGINT NOT NULL DEFAULT 0,
+      updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """,
+    # ids below last_id that had no committed row when they were folded;
+    # re-checked on every refresh (see watermark.py)
+    """
+    CREATE TABLE IF NOT EXISTS traffic_cube_gaps (
+      gap_first BIGINT NOT NULL PRIMARY KEY,
+      gap_last BIGINT NOT NULL,
+      recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # driver demographics x violation
+    """
+    CREATE TABLE IF NOT EXISTS traffic_cube_demo (
+      country_name VARCHAR(100) NOT NULL,
+      driver_gender VARCHAR(20) NOT NULL,
+      driver_age SMALLINT NOT NULL,
+      driver_race VARCHAR(50) NOT NULL,
+      violation VARCHAR(120) NOT NULL,
+      stops BIGINT NOT NULL,
+      searches BIGINT NOT NULL,
+      arrests BIGINT NOT NULL,
+      drug_stops BIGINT NOT NULL,
+      duration_minutes BIGINT NOT NULL,
+      duration_stops BIGINT NOT NULL,
+      PRIMARY KEY (country_name, driver_gender, driver_age, driver_race, violation)
+    )
+    """,
+    # country x year / month / hour of day
+    """
+    CREATE TABLE IF NOT EXISTS traffic_cube_time (
+      country_name VARCHAR(100) NOT NULL,
+      stop_year SMALLINT NOT NULL,
+      stop_month TINYINT NOT NULL,
+      stop_hour TINYINT NOT NULL,
+      stops BIGINT NOT NULL,
+      arrests BIGINT NOT NULL,
+      PRIMARY KEY (country_name, stop_year, stop_month, stop_hour)
+    )
+    """,
+    # exact time of day (seconds since midnight)
+    """
+    CREATE TABLE IF NOT EXISTS traffic_cube_clock (
+      stop_second INT NOT NULL PRIMARY KEY,
+      stops BIGINT NOT NULL
+    )
+    """,
+    # per vehicle
+    """
+    CREATE TABLE IF NOT EXISTS traffic_cube_vehicle (
+      vehicle_number VARCHAR(50) NOT NULL PRIMARY KEY,
+      stops BIGINT NOT NULL,
+      searches BIGINT NOT NULL,
+      drug_stops BIGINT NOT NULL,
+      KEY idx_cube_vehicle_searches (searches),
+      KEY idx_cube_vehicle_drug_stops (drug_stops)
+    )
+    """,
+    "INSERT IGNORE INTO traffic_cube_state (cube_name, last_id) VALUES ('traffic_project', 0)",
+]
+
+CUBE_TABLES = ["traffic_cube_demo", "traffic_cube_time", "traffic_cube_clock", "traffic_cube_vehicle",
+               "traffic_cube_gaps"]
+
+DURATION_MINUTES = """
+    CASE
+        WHEN stop_duration = '0-15 Min' THEN 7
+        WHEN stop_duration = '16-30 Min' THEN 23
+        WHEN stop_duration = '30+ Min' THEN 35
+    END
+"""
+
+
+# -------------------------------
+# INCREMENTAL FOLD
+# -------------------------------
+# Each statement aggregates only the id range (:lo, :hi] of traffic_project
+# and adds it onto the existing cells, so a refresh costs as much as the
+# number of new stops, not the size of the table.
+FOLD_SQL = [
+    f"""
+    INSERT INTO traffic_cube_demo (
+        country_name, driver_gender, driver_age, driver_race, violation,
+        stops, searches, arrests, drug_stops, duration_minutes, duration_stops
+    )
+    SELECT
+        COALESCE(country_name, ''),
+        COALESCE(driver_gender, ''),
+        COALESCE(driver_age, -1),
+        COALESCE(driver_race, ''),
+        COALESCE(violation, ''),
+        COUNT(*),
+        COALESCE(SUM(search_conducted = 1), 0),
+        COALESCE(SUM(stop_outcome = 'Arrest'), 0),
+        COALESCE(SUM(drugs_related_stop = 1), 0),
+        COALESCE(SUM({DURATION_MINUTES}), 0),
+        COUNT({DURATION_MINUTES})
+    FROM traffic_project
+    WHERE id > :lo AND id <= :hi
+    GROUP BY 1, 2, 3, 4, 5
+    ON DUPLICATE KEY UPDATE
+        stops = stops + VALUES(stops),
+        searches = searches + VALUES(searches),
+        arrests = arrests + VALUES(arrests),
+        drug_stops = drug_stops + VALUES(drug_stops),
+        duration_minutes = duration_minutes + VALUES(duration_minutes),
+        duration_stops = duration_stops + VALUES(duration_stops)
+    """,
+    """
+    INSERT INTO traffic_cube_time (country_name, stop_year, stop_month, stop_hour, stops, arrests)
+    SELECT
+        COALESCE(country_name, ''),
+        COALESCE(YEAR(stop_date), -1),
+        COALESCE(MONTH(stop_date), -1),
+        COALESCE(HOUR(stop_time), -1),
+        COUNT(*),
+        COALESCE(SUM(stop_outcome = 'Arrest'), 0)
+    FROM traffic_project
+    WHERE id > :lo AND id <= :hi
+    GROUP BY 1, 2, 3, 4
+    ON DUPLICATE KEY UPDATE
+        stops = stops + VALUES(stops),
+        arrests = arrests + VALUES(arrests)
+    """,
+    """
+    INSERT INTO traffic_cube_clock (stop_second, stops)
+    SELECT COALESCE(TIME_TO_SEC(stop_time), -1), COUNT(*)
+    FROM traffic_project
+    WHERE id > :lo AND id <= :hi
+    GROUP BY 1
+    ON DUPLICATE KEY UPDATE stops = stops + VALUES(stops)
+    """,
+    """
+    INSERT INTO traffic_cube_vehicle (vehicle_number, stops, searches, drug_stops)
+    SELECT
+        COALESCE(vehicle_number, ''),
+        COUNT(*),
+        COALESCE(SUM(search_conducted = 1), 0),
+        COALESCE(SUM(drugs_related_stop = 1), 0)
+    FROM traffic_project
+    WHERE id > :lo AND id <= :hi
+    GROUP BY 1
+    ON DUPLICATE KEY UPDATE
+        stops = stops + VALUES(stops),
+        searches = searches + VALUES(searches),
+        drug_stops = drug_stops + VALUES(drug_stops)
+    """,
+]
+
+_tables_ready = set()
+
+
+def ensure_cube_tables(engine):
+    if str(engine.url) in _tables_ready:
+        return
+    with engine.begin() as conn:
+        for ddl in CUBE_DDL:
+            conn.execute(text(ddl))
+    _tables_ready.add(str(engine.url))
+
+
+# Locking reads: they wait for inserts still in flight in the range and
+# keep new ones out of it until commit, so the ids listed here are exactly
+# the rows the fold statements aggregate.
+RANGE_IDS_SQL = "SELECT id FROM traffic_project WHERE id > :lo AND id <= :hi ORDER BY id FOR SHARE"
+
+
+def _lock_state(conn):
+    # FOR UPDATE serializes concurrent refreshes (several Streamlit
+    # sessions) so no id range is ever folded twice.
+    return conn.execute(
+        text("SELECT last_id FROM traffic_cube_state WHERE cube_name = 'traffic_project' FOR UPDATE")
+    ).scalar()
+
+
+def _fold_range(conn, lo, hi, recorded_at=None):
+    # Folds the rows with lo < id <= hi and records the ids in the range
+    # that have no row yet as gaps.
+    ids = [r[0] for r in conn.execute(text(RANGE_IDS_SQL), {"lo": lo, "hi": hi})]
+    if ids:
+        for sql in FOLD_SQL:
+            conn.execute(text(sql), {"lo": lo, "hi": hi})
+    gaps = find_gaps(ids, lo, hi)
+    if gaps:
+        conn.execute(
+            text("INSERT INTO traffic_cube_gaps (gap_first, gap_last, recorded_at) "
+                 "VALUES (:first, :last, COALESCE(:recorded_at, CURRENT_TIMESTAMP))"),
+            [{"first": first, "last": last, "recorded_at": recorded_at} for first, last in gaps],
+        )
+    return len(ids)
+
+
+def _fill_gaps(conn, gap_ttl):
+    # Rows that committed below the watermark after it passed them.
+    conn.execute(
+        text("DELETE FROM traffic_cube_gaps WHERE recorded_at < NOW() - INTERVAL :ttl SECOND"),
+        {"ttl": gap_ttl},
+    )
+    gaps = conn.execute(text("SELECT gap_first, gap_last, recorded_at FROM traffic_cube_gaps")).fetchall()
+    for first, last, recorded_at in gaps:
+        found = conn.execute(
+            text("SELECT COUNT(*) FROM traffic_project WHERE id >= :first AND id <= :last"),
+            {"first": first, "last": last},
+        ).scalar()
+        if found:
+            conn.execute(text("DELETE FROM traffic_cube_gaps WHERE gap_first = :first"), {"first": first})
+            _fold_range(conn, first - 1, last, recorded_at)
+
+
+def refresh_cube(engine, up_to=None, chunk_size=500_000, gap_ttl=GAP_TTL):
+    # Folds every stop with id <= up_to (default: the current MAX(id)) into
+    # the cube and returns the id the cube is now current to. Rows are
+    # folded in id chunks, one transaction each, so a first build on a large
+    # table does not hold one giant transaction open. Rows that committed
+    # late, below ids already folded, are picked up from the gaps.
+    #
+    # The cube only sees inserts. Rows that are updated or deleted after
+    # they were folded need a rebuild_cube().
+    ensure_cube_tables(engine)
+    if up_to is None:
+        with engine.connect() as conn:
+            up_to = conn.execute(text("SELECT MAX(id) FROM traffic_project")).scalar()
+    up_to = int(up_to or 0)
+
+    with engine.begin() as conn:
+        _lock_state(conn)
+        _fill_gaps(conn, gap_ttl)
+
+    while True:
+        with engine.begin() as conn:
+            last_id = _lock_state(conn)
+            if last_id >= up_to:
+                return last_id
+            hi = min(last_id + chunk_size, up_to)
+            _fold_range(conn, last_id, hi)
+            conn.execute(
+                text("UPDATE traffic_cube_state SET last_id = :hi WHERE cube_name = 'traffic_project'"),
+                {"hi": hi},
+            )
+
+
+def rebuild_cube(engine, chunk_size=500_000, archive_dir=ARCHIVE_DIR):
+    # Re-aggregates traffic_project from scratch. Stops archived to Parquet
+    # are no longer in it and only the cube still counts them, so a rebuild
+    # is refused once any partition has been archived.
+    archived = load_manifest(archive_dir)["files"]
+    if archived:
+        raise RuntimeError(
+            f"{len(archived)} archive file(s) in {archive_dir}: rebuilding the cube from traffic_project "
+            "would drop the archived stops"
+        )
+    ensure_cube_tables(engine)
+    with engine.begin() as conn:
+        for table in CUBE_TABLES:
+            conn.execute(text(f"TRUNCATE TABLE {table}"))
+        conn.execute(text("UPDATE traffic_cube_state SET last_id = 0 WHERE cube_name = 'traffic_project'"))
+    return refresh_cube(engine, chunk_size=chunk_size)
+
+
+# -------------------------------
+# INSIGHT QUERIES OVER THE CUBE
+# -------------------------------
+# Same names, columns and ordering as the entries in queries.py.
+cube_queries = {
+    "Top 10 vehicles involved in drug-related stops": """
+        SELECT NULLIF(vehicle_number, '') AS vehicle_number, drug_stops AS stop_count
+        FROM traffic_cube_vehicle
+        WHERE drug_stops > 0
+        ORDER BY stop_count DESC
+        LIMIT 10;
+    """,
+    "Vehicles most frequently searched": """
+        SELECT NULLIF(vehicle_number, '') AS vehicle_number, searches AS search_count
+        FROM traffic_cube_vehicle
+        WHERE searches > 0
+        ORDER BY search_count DESC;
+    """,
+    "Driver age group with highest arrest rate": """
+        SELECT
+            CASE
+                WHEN driver_age = -1 THEN '>70'
+                WHEN driver_age < 30 THEN '<30'
+                WHEN driver_age BETWEEN 30 AND 50 THEN '30-50'
+                WHEN driver_age BETWEEN 51 AND 70 THEN '51-70'
+                ELSE '>70'
+            END AS age_group,
+            SUM(arrests) AS total_arrest
+        FROM traffic_cube_demo
+        GROUP BY age_group;
+    """,
+    "Gender distribution of drivers stopped in each country": """
+        SELECT
+            NULLIF(country_name, '') AS country_name,
+            NULLIF(driver_gender, '') AS driver_gender,
+            CAST(SUM(stops) AS SIGNED) AS total_stops
+        FROM traffic_cube_demo
+        GROUP BY country_name, driver_gender
+        ORDER BY country_name, driver_gender;
+    """,
+    "Race and gender combination with highest search rate": """
+        SELECT
+            NULLIF(driver_gender, '') AS driver_gender,
+            NULLIF(driver_race, '') AS driver_race,
+            CAST(SUM(stops) AS SIGNED) AS total_stops,
+            SUM(searches) AS total_searches,
+            ROUND(SUM(searches) * 100.0 / SUM(stops), 2) AS search_rate_percent
+        FROM traffic_cube_demo
+        GROUP BY driver_gender, driver_race
+        ORDER BY search_rate_percent DESC;
+    """,
+    "Time of day with most traffic stops": """
+        SELECT SEC_TO_TIME(NULLIF(stop_second, -1)) AS stop_time, stops AS traffic_time
+        FROM traffic_cube_clock
+        ORDER BY traffic_time DESC;
+    """,
+    "Average stop duration for different violations": """
+        SELECT
+            NULLIF(violation, '') AS violation,
+            SUM(duration_minutes) / NULLIF(SUM(duration_stops), 0) AS avg_stop_duration_minutes
+        FROM traffic_cube_demo
+        GROUP BY violation
+        ORDER BY avg_stop_duration_minutes DESC;
+    """,
+    "Are stops during night more likely to lead to arrests?": """
+        SELECT
+            CASE
+                WHEN stop_hour BETWEEN 0 AND 5 THEN 'Night'
+                ELSE 'Other'
+            END AS time_of_day,
+            CAST(SUM(stops) AS SIGNED) AS total_stops,
+            SUM(arrests) AS total_arrests
+        FROM traffic_cube_time
+        GROUP BY time_of_day;
+    """,
+    "Violations most associated with searches or arrests": """
+        SELECT
+            NULLIF(violation, '') AS violation,
+            SUM(searches) AS total_searches,
+            SUM(arrests) AS total_arrest
+        FROM traffic_cube_demo
+        GROUP BY violation
+        ORDER BY total_searches DESC, total_arrest DESC;
+    """,
+    "Violations most common among younger drivers (<25)": """
+        SELECT
+            NULLIF(violation, '') AS violation,
+            CAST(SUM(stops) AS SIGNED) AS total_stop
+        FROM traffic_cube_demo
+        WHERE driver_age >= 0 AND driver_age < 25
+        GROUP BY violation
+        ORDER BY total_stop DESC;
+    """,
+    "Violation rarely results in search or arrest": """
+        SELECT
+            NULLIF(violation, '') AS violation,
+            SUM(searches) AS total_searches,
+            SUM(arrests) AS total_arrests,
+            CAST(SUM(stops) AS SIGNED) AS total_stop
+        FROM traffic_cube_demo
+        GROUP BY violation
+        ORDER BY total_searches ASC, total_arrests ASC;
+    """,
+    "Countries with highest rate of drug-related stops": """
+        SELECT
+            NULLIF(country_name, '') AS country_name,
+            CAST(SUM(stops) AS SIGNED) AS total_stop,
+            SUM(drug_stops) AS drug_stop,
+            ROUND(SUM(drug_stops) * 100.0 / SUM(stops), 2) AS drug_stop_rate_percent
+        FROM traffic_cube_demo
+        GROUP BY country_name
+        ORDER BY drug_stop DESC;
+    """,
+    "Arrest rate by country and violation": """
+        SELECT
+            NULLIF(country_name, '') AS country_name,
+            NULLIF(violation, '') AS violation,
+            CAST(SUM(stops) AS SIGNED) AS total_stop,
+            SUM(arrests) AS Arrest_stop,
+            ROUND(SUM(arrests) * 100.0 / SUM(stops), 2) AS Arrest_rate_percent
+        FROM traffic_cube_demo
+        GROUP BY country_name, violation
+        ORDER BY Arrest_rate_percent DESC;
+    """,
+    "Country with most stops with search conducted": """
+        SELECT
+            NULLIF(country_name, '') AS country_name,
+            CAST(SUM(stops) AS SIGNED) AS total_stop,
+            SUM(searches) AS search_stop
+        FROM traffic_cube_demo
+        GROUP BY country_name
+        ORDER BY search_stop DESC;
+    """,
+    "Yearly Breakdown of Stops and Arrests by Country (Using Subquery and Window Functions)": """
+        SELECT
+            country_name,
+            year,
+            total_stops,
+            total_arrests,
+            ROUND(total_arrests*100.0/total_stops,2) AS arrest_rate_percent,
+            RANK() OVER (PARTITION BY year ORDER BY total_arrests DESC) AS rank_by_arrests
+        FROM (
+            SELECT
+                NULLIF(country_name, '') AS country_name,
+                NULLIF(stop_year, -1) AS year,
+                CAST(SUM(stops) AS SIGNED) AS total_stops,
+                SUM(arrests) AS total_arrests
+            FROM traffic_cube_time
+            GROUP BY country_name, stop_year
+        ) AS yearly_data
+        ORDER BY year, country_name;
+    """,
+    "Driver Violation Trends Based on Age and Race (Join with Subquery)": """
+        SELECT
+            CASE
+                WHEN driver_age < 20 THEN 'Under 20'
+                WHEN driver_age BETWEEN 20 AND 30 THEN '20-30'
+                WHEN driver_age BETWEEN 31 AND 50 THEN '31-50'
+                ELSE '50+'
+            END AS age_group,
+            NULLIF(driver_race, '') AS race,
+            NULLIF(violation, '') AS violation,
+            CAST(SUM(stops) AS SIGNED) AS stops
+        FROM traffic_cube_demo
+        WHERE driver_age <> -1
+        GROUP BY age_group, race, violation
+        ORDER BY age_group, race, violation;
+    """,
+    "Time Period Analysis of Stops (Year, Month, Hour)": """
+        SELECT
+            NULLIF(country_name, '') AS country_name,
+            stop_year AS year,
+            stop_month AS month,
+            stop_hour AS hour,
+            CAST(SUM(stops) AS SIGNED) AS total_stops
+        FROM traffic_cube_time
+        WHERE stop_year <> -1
+          AND stop_hour <> -1
+        GROUP BY country_name, stop_year, stop_month, stop_hour
+        ORDER BY stop_year, stop_month, stop_hour, country_name;
+    """,
+    "Violations with High Search and Arrest Rates (Window Function)": """
+        SELECT
+            violation,
+            total_stops,
+            total_searches,
+            total_arrests,
+            ROUND(total_searches*100.0/total_stops,2) AS search_rate_percent,
+            ROUND(total_arrests*100.0/total_stops,2) AS arrest_rate_percent,
+            RANK() OVER (ORDER BY (total_arrests*1.0/total_stops) DESC) AS rank_by_arrest_rate
+        FROM (
+            SELECT
+                NULLIF(violation, '') AS violation,
+                CAST(SUM(stops) AS SIGNED) AS total_stops,
+                SUM(searches) AS total_searches,
+                SUM(arrests) AS total_arrests
+            FROM traffic_cube_demo
+            GROUP BY violation
+        ) v
+        ORDER BY arrest_rate_percent DESC;
+    """,
+    "Driver Demographics by Country (Age, Gender, Race)": """
+        SELECT
+            CAST(SUM(stops) AS SIGNED) AS drivers,
+            NULLIF(driver_age, -1) AS driver_age,
+            NULLIF(country_name, '') AS country_name,
+            NULLIF(driver_gender, '') AS driver_gender,
+            NULLIF(driver_race, '') AS driver_race
+        FROM traffic_cube_demo
+        GROUP BY driver_age, country_name, driver_gender, driver_race
+        ORDER BY driver_age;
+    """,
+    "Top 5 Violations with Highest Arrest Rates": """
+        SELECT
+            NULLIF(violation, '') AS violation,
+            CAST(SUM(stops) AS SIGNED) AS total_stops,
+            SUM(arrests) AS total_arrests,
+            ROUND(SUM(arrests) * 100.0 / SUM(stops),2) AS arrest_rate_percent
+        FROM traffic_cube_demo
+        GROUP BY violation
+        ORDER BY arrest_rate_percent DESC
+        LIMIT 5;
+    """,
+}
+
+
+def cube_supported(engine):
+    # The fold statements use MySQL's ON DUPLICATE KEY UPDATE; the embedded
+    # columnar backends scan fast enough without a cube.
+    return engine.dialect.name == "mysql"
+
+
+def insight_sql(name, use_cube=True):
+    if use_cube and name in cube_queries:
+        return cube_queries[name]
+    return queries[name]
+
+
+# -------------------------------
+# COMMAND LINE
+# -------------------------------
+# python cube.py            fold new stops into the cube
+# python cube.py --rebuild  recompute the cube from scratch (not once years
+#                           are archived)
+if __name__ == "__main__":
+    from db import get_engine
+
+    parser = argparse.ArgumentParser(description="Maintain the traffic_project aggregate cube.")
+    parser.add_argument("--rebuild", action="store_true", help="truncate and rebuild all cube tables")
+    parser.add_argument("--chunk-size", type=int, default=500_000, help="ids folded per transaction")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if args.rebuild:
+        last_id = rebuild_cube(engine, chunk_size=args.chunk_size)
+    else:
+        last_id = refresh_cube(engine, chunk_size=args.chunk_size)
+    print(f"Cube is current up to id {last_id}")
@@ -0,0 +1,111 @@
+import re
+
+
+# -------------------------------
+# MYSQL -> DUCKDB / SQLITE TRANSLATION
+# -------------------------------
+# The insight catalog is written for MySQL. These rewrites cover the
+# MySQL-only constructs it uses so the same text runs on the embedded
+# backends:
+#   IF(c, a, b)          -> CASE WHEN c THEN a ELSE b END
+#   SUM(x = 1)           -> SUM(CAST((x = 1) AS INTEGER))   (duckdb)
+#   HOUR/YEAR/MONTH(x)   -> CAST(strftime(...) AS INTEGER)  (sqlite)
+#   Traffic_project      -> traffic_project
+COMPARISON = re.compile(r"<>|!=|<=|>=|=|<|>")
+DATE_PARTS = {"HOUR": "%H", "YEAR": "%Y", "MONTH": "%m"}
+
+
+def _split_call(sql, open_paren):
+    # Returns (args, end) for the call whose "(" is at open_paren: the
+    # top-level comma separated arguments and the index after ")".
+    depth = 0
+    args = []
+    start = open_paren + 1
+    i = open_paren
+    quote = None
+    while i < len(sql):
+        ch = sql[i]
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+            if depth == 0:
+                args.append(sql[start:i])
+                return args, i + 1
+        elif ch == "," and depth == 1:
+            args.append(sql[start:i])
+            start = i + 1
+        i += 1
+    raise ValueError(f"Unbalanced parentheses in SQL near: {sql[open_paren:open_paren + 60]!r}")
+
+
+def _rewrite_calls(sql, name, rewrite):
+    # Rewrites every NAME(...) call (innermost arguments first) with
+    # rewrite(args) -> replacement text.
+    pattern = re.compile(rf"\b{name}\s*\(", re.IGNORECASE)
+    out = []
+    pos = 0
+    while True:
+        match = pattern.search(sql, pos)
+        if not match:
+            out.append(sql[pos:])
+            return "".join(out)
+        args, end = _split_call(sql, match.end() - 1)
+        args = [_rewrite_calls(a, name, rewrite) for a in args]
+        out.append(sql[pos:match.start()])
+        out.append(rewrite(args))
+        pos = end
+
+
+def _has_top_level_comparison(expr):
+    depth = 0
+    stripped = expr.strip()
+    if stripped.upper().startswith("CASE"):
+        return False
+    for token in re.findall(r"'[^']*'|\(|\)|<>|!=|<=|>=|=|<|>|[^()'<>=!]+", stripped):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0 and COMPARISON.fullmatch(token):
+            return True
+    return False
+
+
+def _if_to_case(args):
+    cond, then, other = (a.strip() for a in args)
+    return f"CASE WHEN {cond} THEN {then} ELSE {other} END"
+
+
+def _sum_bool(args):
+    expr = args[0]
+    if _has_top_level_comparison(expr):
+        return f"SUM(CAST(({expr.strip()}) AS INTEGER))"
+    return f"SUM({expr})"
+
+
+def _date_part(part):
+    def rewrite(args):
+        return f"CAST(strftime('{DATE_PARTS[part]}', {args[0].strip()}) AS INTEGER)"
+    return rewrite
+
+
+def translate(sql, dialect):
+    if dialect == "mysql":
+        return sql
+    sql = re.sub(r"\btraffic_project\b", "traffic_project", sql, flags=re.IGNORECASE)
+    sql = _rewrite_calls(sql, "IF", _if_to_case)
+    if dialect == "duckdb":
+        # DuckDB has HOUR/YEAR/MONTH but cannot SUM a boolean.
+        sql = _rewrite_calls(sql, "SUM", _sum_bool)
+    elif dialect == "sqlite":
+        # SQLite comparisons already yield 0/1, but it has no date part
+        # functions.
+        for part in DATE_PARTS:
+            sql = _rewrite_calls(sql, part, _date_part(part))
+    return sql
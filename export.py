@@ -0,0 +1,232 @@
+import argparse
+import gzip
+import os
+import sys
+import time
+from decimal import Decimal
+
+import pandas as pd
+from sqlalchemy import text
+
+from db import get_engine
+from dialect import translate
+from insight_defs import Filters
+from pagination import estimate_rows
+from partitions import ARCHIVE_DIR, archive_engine, archive_files
+
+
+# -------------------------------
+# STREAMING READ
+# -------------------------------
+# stream_results=True asks the driver for a server-side (unbuffered) cursor
+# (pymysql's SSCursor on MySQL), so rows come off the socket one chunk at a
+# time instead of the whole result landing in client memory first.
+EXPORT_CHUNK_ROWS = 50_000
+
+
+def _plain_frame(rows, columns):
+    # Unlike transport.compact_frame, no categoricals: every chunk must
+    # produce the same column types for the Parquet writer.
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == object:
+            sample = series.dropna()
+            if not sample.empty and isinstance(sample.iloc[0], Decimal):
+                df[col] = series.astype("float64")
+        elif pd.api.types.is_timedelta64_dtype(series):
+            # pymysql returns TIME as timedelta; export it as a time of day.
+            df[col] = (pd.Timestamp(0) + series).dt.time
+    return df
+
+
+def stream_results(sql, engine=None, params=None, chunk_size=EXPORT_CHUNK_ROWS):
+    # Yields DataFrames of at most chunk_size rows; one chunk in memory at a
+    # time. The connection is held until the generator is exhausted/closed.
+    engine = engine or get_engine()
+    statement = translate(sql, engine.dialect.name)
+    with engine.connect().execution_options(stream_results=True) as conn:
+        result = conn.execute(text(statement), params or {})
+        columns = list(result.keys())
+        for rows in result.partitions(chunk_size):
+            yield _plain_frame(rows, columns)
+
+
+# -------------------------------
+# WRITERS
+# -------------------------------
+# Both write each chunk as it arrives: gzip CSV appends to the compressed
+# stream (level 6: nearly level 9's size for much less CPU), Parquet adds
+# one row group per chunk (zstd, like the snapshots).
+EXPORT_FORMATS = {"csv.gz": "text/csv", "parquet": "application/octet-stream"}
+
+
+def format_for(path):
+    return "parquet" if str(path).endswith(".parquet") else "csv.gz"
+
+
+class _CsvGzipWriter:
+    def __init__(self, out):
+        if isinstance(out, (str, os.PathLike)):
+            self._file = gzip.open(out, "wb", compresslevel=6)
+        else:
+            self._file = gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6)
+        self._header = True
+
+    def write(self, df):
+        self._file.write(df.to_csv(index=False, header=self._header).encode("utf-8"))
+        self._header = False
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, out):
+        self._out = out
+        self._writer = None
+
+    def write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            # A column that is all NULL in the first chunk has no type yet;
+            # store it as text so later chunks' values fit.
+            schema = pa.schema([f.with_type(pa.string()) if pa.types.is_null(f.type) else f
+                                for f in table.schema])
+            self._writer = pq.ParquetWriter(self._out, schema.remove_metadata(), compression="zstd")
+        self._writer.write_table(table.cast(self._writer.schema, safe=False))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def export_frames(frames, out, fmt=None, progress=None):
+    # Writes an iterable of DataFrames into `out` (a path or a binary file
+    # object) as gzip CSV or Parquet. progress(rows, seconds) is called
+    # after every chunk. Returns {rows, seconds, rows_per_s, bytes}.
+    fmt = fmt or format_for(out)
+    writer = _ParquetWriter(out) if fmt == "parquet" else _CsvGzipWriter(out)
+    start = time.perf_counter()
+    rows = 0
+    try:
+        for df in frames:
+            writer.write(df)
+            rows += len(df)
+            if progress:
+                progress(rows, time.perf_counter() - start)
+    finally:
+        writer.close()
+    seconds = time.perf_counter() - start
+    nbytes = os.path.getsize(out) if isinstance(out, (str, os.PathLike)) else None
+    return {"rows": rows, "seconds": round(seconds, 2), "rows_per_s": round(rows / seconds) if seconds else 0,
+            "bytes": nbytes}
+
+
+def export_query(sql, out, fmt=None, engine=None, params=None, chunk_size=EXPORT_CHUNK_ROWS, progress=None):
+    # Streams the result of `sql` into `out`; see export_frames().
+    return export_frames(stream_results(sql, engine, params, chunk_size), out, fmt, progress)
+
+
+# -------------------------------
+# EXPORT SOURCES
+# -------------------------------
+def stop_sql(filters=None):
+    # Raw stops under the app's global filters (insight_defs.Filters), in
+    # id order. Returns (sql, params).
+    where, params = (filters or Filters()).compile()
+    return f"SELECT * FROM traffic_project {where} ORDER BY id", params
+
+
+def _archived_stop_sql(filters):
+    # Archive files are written in id order and DuckDB keeps file order
+    # without an ORDER BY, which would make it buffer the whole result.
+    where, params = filters.compile()
+    return f"SELECT * FROM traffic_project {where}", params
+
+
+def stream_stops(filters=None, engine=None, chunk_size=EXPORT_CHUNK_ROWS, archive_dir=ARCHIVE_DIR):
+    # Stops under the filters from both tiers: archived years first (read
+    # from their Parquet files), then traffic_project, each in id order.
+    filters = filters or Filters()
+    files = archive_files(filters.start, filters.end, archive_dir)
+    if files:
+        cold_engine = archive_engine(files)
+        try:
+            sql, params = _archived_stop_sql(filters)
+            yield from stream_results(sql, cold_engine, params, chunk_size)
+        finally:
+            cold_engine.dispose()
+    sql, params = stop_sql(filters)
+    yield from stream_results(sql, engine, params, chunk_size)
+
+
+def count_stops(filters=None, engine=None, archive_dir=ARCHIVE_DIR):
+    # (rows, exact) for stream_stops(): the hot table's estimate plus an
+    # exact count of the archived stops.
+    filters = filters or Filters()
+    sql, params = stop_sql(filters)
+    rows, exact = estimate_rows(sql, engine or get_engine(), params)
+    files = archive_files(filters.start, filters.end, archive_dir)
+    if files:
+        sql, params = _archived_stop_sql(filters)
+        cold_engine = archive_engine(files)
+        try:
+            archived, _ = estimate_rows(sql, cold_engine, params)
+        finally:
+            cold_engine.dispose()
+        rows += archived
+    return rows, exact
+
+
+def export_stops(filters, out, fmt=None, engine=None, chunk_size=EXPORT_CHUNK_ROWS, progress=None,
+                 archive_dir=ARCHIVE_DIR):
+    # Streams every stop under the filters, archived years included, into
+    # `out`; see export_frames().
+    return export_frames(stream_stops(filters, engine, chunk_size, archive_dir), out, fmt, progress)
+
+
+# -------------------------------
+# COMMAND LINE
+# -------------------------------
+# python export.py query "Vehicles most frequently searched" --out searched.csv.gz
+# python export.py stops --country India --start 2020-01-01 --out india.parquet
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a catalog query or a set of stops to gzip CSV or Parquet.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    query_cmd = sub.add_parser("query")
+    query_cmd.add_argument("name", help="catalog query name (queries.py)")
+    stops_cmd = sub.add_parser("stops")
+    stops_cmd.add_argument("--country", action="append", default=[])
+    stops_cmd.add_argument("--start", help="first stop_date (YYYY-MM-DD)")
+    stops_cmd.add_argument("--end", help="stop_date to stop before (YYYY-MM-DD)")
+    stops_cmd.add_argument("--min-age", type=int)
+    stops_cmd.add_argument("--max-age", type=int)
+    for cmd in (query_cmd, stops_cmd):
+        cmd.add_argument("--out", required=True, help="*.csv.gz or *.parquet")
+        cmd.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    engine = get_engine()
+
+    def report(rows, seconds):
+        print(f"\r{rows:,} rows, {rows / seconds if seconds else 0:,.0f} rows/s", end="", file=sys.stderr)
+
+    if args.command == "query":
+        from cube import cube_supported, insight_sql, refresh_cube
+
+        # Through the cube where there is one: it still counts the stops
+        # archived out of traffic_project.
+        use_cube = cube_supported(engine)
+        if use_cube:
+            refresh_cube(engine)
+        stats = export_query(insight_sql(args.name, use_cube), args.out, engine=engine,
+                             chunk_size=args.chunk_size, progress=report)
+    else:
+        filters = Filters(args.country, args.start, args.end, args.min_age, args.max_age)
+        stats = export_stops(filters, args.out, engine=engine, chunk_size=args.chunk_size, progress=report)
+    print(f"\nWrote {stats['rows']:,} rows to {args.out} ({stats['bytes']:,} bytes) in {stats['seconds']}s "
+          f"({stats['rows_per_s']:,} rows/s)", file=sys.stderr)
@@ -0,0 +1,162 @@
+import argparse
+import os
+import threading
+import time
+
+import pandas as pd
+
+from db import create_pooled_engine, get_engine, read_sql
+from insight_defs import INSIGHTS, INSIGHTS_BY_NAME, Filters, compile_scan, finish, plan_scans
+from overview import run_concurrently
+from query_cache import get_watermark
+
+
+# -------------------------------
+# SHARD CONFIGURATION
+# -------------------------------
+# One database per country (or check post), e.g.
+#   TRAFFIC_SHARDS="Canada=mysql+pymysql://root:pw@ca-db/vehicle;India=sqlite:///shards/India.db"
+# Every shard holds a traffic_project table with the usual schema.
+SHARDS = os.environ.get("TRAFFIC_SHARDS", "")
+
+
+def parse_shards(value=SHARDS):
+    # "name=url;name=url" -> {name: url}, in the order given.
+    shards = {}
+    for item in value.split(";"):
+        if not item.strip():
+            continue
+        name, sep, url = item.partition("=")
+        if not sep or not name.strip() or not url.strip():
+            raise ValueError(f"TRAFFIC_SHARDS entry {item!r} is not name=url")
+        shards[name.strip()] = url.strip()
+    return shards
+
+
+_shard_engines = None
+_shard_lock = threading.Lock()
+
+
+def get_shard_engines():
+    # {shard name: pooled engine}, built once per process like
+    # db.get_engine(). Empty when no shards are configured.
+    global _shard_engines
+    if _shard_engines is None:
+        with _shard_lock:
+            if _shard_engines is None:
+                _shard_engines = {name: create_pooled_engine(url) for name, url in parse_shards().items()}
+    return _shard_engines
+
+
+def shard_watermark(engines):
+    # The tuple of every shard's watermark: changes when any shard gets new
+    # stops (or goes down / comes back), so it can key the shared query
+    # cache.
+    marks = []
+    for name, engine in engines.items():
+        try:
+            marks.append((name, get_watermark(engine)))
+        except Exception:
+            marks.append((name, None))
+    return tuple(marks)
+
+
+# -------------------------------
+# FAN-OUT & MERGE
+# -------------------------------
+# Each shard answers the same union-grain scan from insight_defs: only
+# additive base measures (counts and sums) at the grouping grain, so the
+# partial results are tiny and simply add up. finish() then sums the
+# concatenated partials to each insight's grain and derives rates, averages
+# and ranks from the merged numerators and denominators; averaging per-shard
+# rates would weight a small shard like a large one.
+def _shards_for(engines, filters):
+    # With per-country shards, a country filter only needs the shards of the
+    # selected countries. Shards named otherwise are all queried.
+    names = {c.upper() for c in filters.countries}
+    matching = {name: engine for name, engine in engines.items() if name.upper() in names}
+    return matching or engines
+
+
+def federated_insights(names=None, filters=None, engines=None, timeout=60.0):
+    # Returns ({insight name: DataFrame}, [per-shard report]). Every
+    # (scan, shard) pair runs at once, so the wall time tracks the slowest
+    # shard. A shard that fails or times out is left out and reported; the
+    # results then cover the shards that answered.
+    engines = get_shard_engines() if engines is None else engines
+    if not engines:
+        raise ValueError("no shards configured (set TRAFFIC_SHARDS)")
+    filters = filters or Filters()
+    insights = [INSIGHTS_BY_NAME[n] for n in names] if names else INSIGHTS
+    scans = plan_scans(insights)
+    targets = _shards_for(engines, filters)
+
+    tasks = {}
+    for i, (dimensions, measures, _) in enumerate(scans):
+        sql, params = compile_scan(dimensions, measures, filters)
+        for shard, engine in targets.items():
+            tasks[(i, shard)] = (lambda sql=sql, params=params, shard=shard, engine=engine:
+                                 read_sql(sql, engine, params=params, name=f"__shard_{shard}__"))
+
+    partials = {i: [] for i in range(len(scans))}
+    report = {shard: {"shard": shard, "rows": 0, "seconds": 0.0, "error": None} for shard in targets}
+    for (i, shard), df, error, seconds in run_concurrently(tasks, timeout=timeout):
+        entry = report[shard]
+        entry["seconds"] = round(max(entry["seconds"], seconds), 4)
+        if error:
+            entry["error"] = error
+        else:
+            entry["rows"] += len(df)
+            partials[i].append(df)
+
+    results = {}
+    for i, (dimensions, measures, members) in enumerate(scans):
+        frames = [df for df in partials[i] if not df.empty]
+        if frames:
+            merged = pd.concat(frames, ignore_index=True)
+        else:
+            merged = pd.DataFrame(columns=dimensions + measures)
+        for insight in members:
+            results[insight.name] = finish(insight, merged)
+    return results, list(report.values())
+
+
+# -------------------------------
+# COMMAND LINE
+# -------------------------------
+# python federation.py split --out shards        one SQLite stand-in per country
+# python federation.py run "Arrest rate by country and violation"
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fan insight queries out to every TRAFFIC_SHARDS database.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    split_cmd = sub.add_parser("split", help="copy the default database into one SQLite file per country")
+    split_cmd.add_argument("--out", default="shards")
+    run_cmd = sub.add_parser("run")
+    run_cmd.add_argument("insights", nargs="*", help="insight names (default: every declared insight)")
+    run_cmd.add_argument("--country", action="append", default=[])
+    run_cmd.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    if args.command == "split":
+        from columnar import snapshot_to_sqlite
+
+        source = get_engine()
+        os.makedirs(args.out, exist_ok=True)
+        countries = read_sql("SELECT DISTINCT country_name FROM traffic_project WHERE country_name IS NOT NULL",
+                             source)["country_name"]
+        shards = []
+        for country in countries:
+            path = os.path.join(args.out, f"{country}.db")
+            rows = snapshot_to_sqlite(source, path, where="country_name = :country", params={"country": country})
+            print(f"{country}: {rows:,} rows -> {path}")
+            shards.append(f"{country}=sqlite:///{os.path.abspath(path)}")
+        print(f'TRAFFIC_SHARDS="{";".join(shards)}"')
+    else:
+        start = time.perf_counter()
+        results, report = federated_insights(args.insights or None, Filters(countries=args.country),
+                                             timeout=args.timeout)
+        elapsed = time.perf_counter() - start
+        for name, df in results.items():
+            print(f"\n== {name}\n{df.to_string(index=False)}")
+        print(f"\n{len(results)} insights from {len(report)} shards in {elapsed:.2f}s")
+        print(pd.DataFrame(report).to_string(index=False))
@@ -0,0 +1,349 @@
+import argparse
+import hashlib
+import os
+import re
+import statistics
+import tempfile
+from datetime import date, time
+
+from sqlalchemy import text
+
+from benchmark import reset_schema, timed
+from bulk_load import LOAD_COLUMNS, load_csv
+from db import create_pooled_engine, driver_sql
+from dialect import translate
+from profiling import format_explain
+from queries import queries
+from stop_filters import build_stop_query
+from synth import write_csv
+
+
+# -------------------------------
+# WORKLOAD PARSING
+# -------------------------------
+# Light, regex-level reading of the catalog: enough to see which columns are
+# compared for equality, which are ranged, and which are grouped, per
+# OR-branch of each WHERE / ON clause. Not a general SQL parser.
+COLUMNS = ["id"] + LOAD_COLUMNS + ["created_at"]
+COLUMN = r"(?:\b\w+\.)?\b(" + "|".join(COLUMNS) + r")\b"
+EQUALITY = re.compile(COLUMN + r"\s*(?:=|\bIN\s*\()", re.IGNORECASE)
+RANGE = re.compile(COLUMN + r"\s*(?:<=|>=|<(?!>)|>|\bBETWEEN\b)", re.IGNORECASE)
+ANY_COLUMN = re.compile(COLUMN, re.IGNORECASE)
+WHERE_START = re.compile(r"\b(?:WHERE|ON)\b", re.IGNORECASE)
+GROUP_START = re.compile(r"\bGROUP\s+BY\b", re.IGNORECASE)
+CLAUSE_END = re.compile(r"\b(?:WHERE|ON|GROUP\s+BY|ORDER\s+BY|HAVING|LIMIT|WINDOW|JOIN)\b|;", re.IGNORECASE)
+MAX_INDEX_COLUMNS = 5
+MIN_SPEEDUP = 1.1
+
+
+def _strip_literals(sql):
+    return re.sub(r"'[^']*'", "?", sql)
+
+
+def _clauses(sql, start_pattern):
+    # Text of each clause opened by start_pattern, up to the next clause
+    # keyword at the same depth or the ")" that closes its subquery.
+    for start in start_pattern.finditer(sql):
+        depth = 0
+        i = start.end()
+        while i < len(sql):
+            ch = sql[i]
+            if ch == "(":
+                depth += 1
+            elif ch == ")":
+                if depth == 0:
+                    break
+                depth -= 1
+            elif depth == 0 and CLAUSE_END.match(sql, i) and not sql[i - 1].isalnum():
+                break
+            i += 1
+        yield sql[start.end():i]
+
+
+def _split_top(expr, word):
+    # Splits expr on a keyword at parenthesis depth 0.
+    parts, depth, start = [], 0, 0
+    pattern = re.compile(rf"\b{word}\b", re.IGNORECASE)
+    i = 0
+    while i < len(expr):
+        ch = expr[i]
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif depth == 0:
+            match = pattern.match(expr, i)
+            if match and (i == 0 or not expr[i - 1].isalnum()):
+                parts.append(expr[start:i])
+                start = i = match.end()
+                continue
+        i += 1
+    parts.append(expr[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _unwrap(expr):
+    # "(a AND b)" -> "a AND b" when the parentheses enclose the whole term.
+    while expr.startswith("(") and expr.endswith(")"):
+        depth = 0
+        for i, ch in enumerate(expr):
+            depth += ch == "("
+            depth -= ch == ")"
+            if depth == 0 and i < len(expr) - 1:
+                return expr
+        expr = expr[1:-1].strip()
+    return expr
+
+
+def _access_paths(condition):
+    # One (equality columns, range columns) pair per OR-branch. A nested
+    # OR inside a conjunction adds one path per alternative, each carrying
+    # the conjunction's other columns (an index-merge union over them).
+    paths = []
+    for branch in _split_top(_unwrap(condition), "OR"):
+        eq, rng, nested = [], [], []
+        for atom in _split_top(_unwrap(branch), "AND"):
+            atom = _unwrap(atom)
+            if len(_split_top(atom, "OR")) > 1:
+                nested.append(atom)
+                continue
+            if re.search(r"\bIS\s+(?:NOT\s+)?NULL\b", atom, re.IGNORECASE):
+                continue
+            eq += [m.group(1).lower() for m in EQUALITY.finditer(atom)]
+            rng += [m.group(1).lower() for m in RANGE.finditer(atom)]
+        if nested:
+            for alternative in nested:
+                for alt_eq, alt_rng in _access_paths(alternative):
+                    paths.append((eq + alt_eq, rng + alt_rng))
+        elif eq or rng:
+            paths.append((eq, rng))
+    return paths
+
+
+def analyze_query(sql):
+    # {"paths": [(eq, range)], "group": [...], "columns": {...}}
+    sql = _strip_literals(sql)
+    paths = []
+    for clause in _clauses(sql, WHERE_START):
+        paths += _access_paths(clause)
+    group = []
+    for clause in _clauses(sql, GROUP_START):
+        for col in ANY_COLUMN.finditer(clause):
+            if col.group(1).lower() not in group:
+                group.append(col.group(1).lower())
+    columns = {m.group(1).lower() for m in ANY_COLUMN.finditer(sql)}
+    return {"paths": paths, "group": group, "columns": columns}
+
+
+# -------------------------------
+# CANDIDATE INDEXES
+# -------------------------------
+def _dedupe(seq):
+    out = []
+    for item in seq:
+        if item not in out:
+            out.append(item)
+    return out
+
+
+def propose_indexes(workload, distinct):
+    # workload: {name: analyze_query() result}; distinct: {column: ndv}.
+    # Per access path: equality columns (most selective first), then one
+    # range column, then the GROUP BY columns; plus a covering variant when
+    # the query touches few enough columns. Indexes that are a prefix of
+    # another candidate are dropped.
+    candidates = []
+    for info in workload.values():
+        paths = info["paths"] or ([([], [])] if info["group"] else [])
+        for eq, rng in paths:
+            key = sorted(_dedupe(eq), key=lambda c: -distinct.get(c, 0))
+            if rng:
+                key.append(rng[0])
+            elif info["group"]:
+                key += [c for c in info["group"] if c not in key]
+            key = _dedupe(key)[:MAX_INDEX_COLUMNS]
+            if not key or key == ["id"]:
+                continue
+            candidates.append(tuple(key))
+            extra = sorted(info["columns"] - set(key) - {"id"})
+            if extra and len(key) + len(extra) <= MAX_INDEX_COLUMNS:
+                candidates.append(tuple(key + extra))
+    candidates = _dedupe(candidates)
+    return [c for c in candidates if not any(o != c and o[:len(c)] == c for o in candidates)]
+
+
+def index_name(columns):
+    # MySQL identifiers stop at 64 characters; long names keep a hash of
+    # the full column list so they stay unique.
+    name = "idx_tp_" + "_".join(columns)
+    if len(name) > 64:
+        name = name[:55] + "_" + hashlib.blake2b(name.encode(), digest_size=4).hexdigest()
+    return name
+
+
+def index_ddl(columns):
+    return f"CREATE INDEX {index_name(columns)} ON traffic_project ({', '.join(columns)})"
+
+
+# -------------------------------
+# FORM WORKLOAD
+# -------------------------------
+def form_workload(engine):
+    # The predicate shapes the Traffic.py form produces, filled in with a
+    # real stop so the lookups hit rows.
+    with engine.connect() as conn:
+        row = conn.execute(text(
+            "SELECT stop_date, stop_time, country_name, driver_gender, driver_age, driver_race, "
+            "vehicle_number FROM traffic_project ORDER BY id LIMIT 1 OFFSET 1000"
+        )).mappings().first()
+    if row is None:
+        return {}
+    stop_date = row["stop_date"] if isinstance(row["stop_date"], date) else date.fromisoformat(str(row["stop_date"]))
+    stop_time = row["stop_time"]
+    if not isinstance(stop_time, time):
+        h, m, s = str(stop_time).split(" ")[-1].split(":")[:3]
+        stop_time = time(int(h), int(m), int(float(s)))
+    base = dict(stop_date=stop_date, stop_time=stop_time, country_name=row["country_name"],
+                driver_race=row["driver_race"])
+    return {
+        "form: plates only": build_stop_query(vehicle_numbers=[row["vehicle_number"], "ZZ0000000"]),
+        "form: defaults": build_stop_query(**base),
+        "form: all fields": build_stop_query(**base, driver_gender=row["driver_gender"],
+                                             driver_age=row["driver_age"], search_conducted="No",
+                                             stop_duration="0-15 Min", drugs_related_stop="No"),
+        "form: defaults + plate": build_stop_query(**base, vehicle_numbers=[row["vehicle_number"]]),
+    }
+
+
+# -------------------------------
+# VERIFICATION
+# -------------------------------
+PLAN_PREFIX = {"mysql": "EXPLAIN ", "sqlite": "EXPLAIN QUERY PLAN "}
+
+
+def _runner(engine, sql, values):
+    if values is None:
+        statement = text(translate(sql, engine.dialect.name))
+
+        def run(prefix=""):
+            with engine.connect() as conn:
+                return conn.execute(text(prefix + statement.text.strip().rstrip(";"))).fetchall()
+    else:
+        statement = driver_sql(sql, engine)
+
+        def run(prefix=""):
+            with engine.connect() as conn:
+                return conn.exec_driver_sql(prefix + statement.strip().rstrip(";"), tuple(values)).fetchall()
+    return run
+
+
+def used_indexes(plan_rows, dialect):
+    # Index names the plan reads through: MySQL's `key` column (comma
+    # separated for an index merge), not possible_keys; SQLite's
+    # "USING [COVERING] INDEX name" details.
+    used = set()
+    for row in plan_rows:
+        if dialect == "mysql":
+            used.update(k for k in (row._mapping.get("key") or "").split(",") if k)
+        else:
+            used.update(re.findall(r"USING (?:COVERING )?INDEX (\w+)", str(row._mapping.get("detail") or "")))
+    return used
+
+
+def measure(engine, workload_sql, repeat):
+    prefix = PLAN_PREFIX[engine.dialect.name]
+    results = {}
+    for name, (sql, values) in workload_sql.items():
+        run = _runner(engine, sql, values)
+        times, _ = timed(run, repeat)
+        plan = run(prefix)
+        results[name] = {"median_s": statistics.median(times), "plan": format_explain(plan),
+                         "indexes": used_indexes(plan, engine.dialect.name)}
+    return results
+
+
+def column_distinct(engine):
+    exprs = ", ".join(f"COUNT(DISTINCT {c}) AS {c}" for c in LOAD_COLUMNS)
+    with engine.connect() as conn:
+        row = conn.execute(text(f"SELECT {exprs} FROM traffic_project")).mappings().first()
+    return {c: int(row[c] or 0) for c in LOAD_COLUMNS}
+
+
+def advise(engine, repeat=3, min_speedup=MIN_SPEEDUP, log=print):
+    # Returns (report, recommended DDL). An index is recommended when the
+    # optimizer picked it for at least one query that got min_speedup
+    # faster; queries that got slower are flagged in the report.
+    workload_sql = {name: (sql, None) for name, sql in queries.items()}
+    workload_sql.update(form_workload(engine))
+    workload = {name: analyze_query(sql) for name, (sql, _) in workload_sql.items()}
+    candidates = propose_indexes(workload, column_distinct(engine))
+    log(f"{len(candidates)} candidate indexes for {len(workload_sql)} queries")
+
+    before = measure(engine, workload_sql, repeat)
+    with engine.begin() as conn:
+        for columns in candidates:
+            conn.execute(text(index_ddl(columns)))
+        conn.execute(text("ANALYZE TABLE traffic_project" if engine.dialect.name == "mysql" else "ANALYZE"))
+    after = measure(engine, workload_sql, repeat)
+
+    report = []
+    useful = set()
+    for name in workload_sql:
+        indexes = [index_name(c) for c in candidates if index_name(c) in after[name]["indexes"]]
+        speedup = before[name]["median_s"] / max(after[name]["median_s"], 1e-9)
+        if speedup >= min_speedup:
+            useful.update(indexes)
+        report.append({
+            "query": name,
+            "before_s": round(before[name]["median_s"], 6),
+            "after_s": round(after[name]["median_s"], 6),
+            "speedup": round(speedup, 2),
+            "regressed": speedup < 1 / min_speedup,
+            "indexes": indexes,
+            "plan_before": before[name]["plan"],
+            "plan_after": after[name]["plan"],
+        })
+    recommended = [index_ddl(c) for c in candidates if index_name(c) in useful]
+    return report, recommended
+
+
+def load_scratch(url, rows):
+    engine = create_pooled_engine(url)
+    reset_schema(engine)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = write_csv(os.path.join(tmp, "stops.csv"), rows)
+        load_csv(csv_path, url=url, workers=1 if engine.dialect.name == "sqlite" else 4, log=lambda msg: None)
+    return engine
+
+
+# -------------------------------
+# COMMAND LINE
+# -------------------------------
+# python index_advisor.py --scratch-url sqlite:////tmp/advisor.db --rows 500000 --out indexes.sql
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Propose and verify indexes for the query catalog and form.")
+    parser.add_argument("--scratch-url", default=f"sqlite:///{os.path.join(tempfile.gettempdir(), 'advisor.db')}",
+                        help="scratch database (its traffic_project is dropped and reloaded)")
+    parser.add_argument("--rows", type=int, default=200_000, help="synthetic stops to load into the scratch DB")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-speedup", type=float, default=MIN_SPEEDUP,
+                        help="recommend indexes only from queries at least this much faster")
+    parser.add_argument("--show-plans", action="store_true")
+    parser.add_argument("--out", help="write the recommended CREATE INDEX statements here")
+    args = parser.parse_args()
+
+    engine = load_scratch(args.scratch_url, args.rows)
+    report, recommended = advise(engine, args.repeat, args.min_speedup)
+    for r in sorted(report, key=lambda r: -r["speedup"]):
+        print(f"{r['speedup']:>7.2f}x{' !' if r['regressed'] else '  '} "
+              f"{r['before_s']:>9.4f}s -> {r['after_s']:>9.4f}s  {r['query']}"
+              f"{'  [' + ', '.join(r['indexes']) + ']' if r['indexes'] else ''}")
+        if args.show_plans:
+            print(f"    before:\n      {r['plan_before'].replace(chr(10), chr(10) + '      ')}")
+            print(f"    after:\n      {r['plan_after'].replace(chr(10), chr(10) + '      ')}")
+    print("\nRecommended indexes:")
+    for ddl in recommended:
+        print(f"  {ddl};")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write("".join(f"{ddl};\n" for ddl in recommended))
@@ -0,0 +1,258 @@
+import pandas as pd
+
+from partitions import read_tiers
+
+
+# -------------------------------
+# DIMENSIONS & MEASURES
+# -------------------------------
+# Insights are declared as dimensions + measures instead of SQL text. Base
+# measures are additive (counts and sums), so one GROUP BY at the union of
+# several insights' dimensions can be rolled up to each insight's own grain;
+# rates and averages are derived afterwards from the rolled-up sums.
+DIMENSIONS = {
+    "violation": "violation",
+    "country_name": "country_name",
+    "driver_gender": "driver_gender",
+    "driver_race": "driver_race",
+    "year": "YEAR(stop_date)",
+    "age_group": """CASE
+            WHEN driver_age < 30 THEN '<30'
+            WHEN driver_age BETWEEN 30 AND 50 THEN '30-50'
+            WHEN driver_age BETWEEN 51 AND 70 THEN '51-70'
+            ELSE '>70'
+        END""",
+    "time_of_day": "CASE WHEN HOUR(stop_time) BETWEEN 0 AND 5 THEN 'Night' ELSE 'Other' END",
+}
+# Rough distinct counts, used to keep a merged scan's result small.
+DIMENSION_CARDINALITY = {
+    "violation": 10, "country_name": 5, "driver_gender": 3, "driver_race": 6,
+    "year": 30, "age_group": 4, "time_of_day": 2,
+}
+MAX_SCAN_GROUPS = 200_000
+
+BASE_MEASURES = {
+    "stops": "COUNT(*)",
+    "searches": "SUM(CASE WHEN search_conducted = 1 THEN 1 ELSE 0 END)",
+    "arrests": "SUM(CASE WHEN stop_outcome = 'Arrest' THEN 1 ELSE 0 END)",
+    "drug_stops": "SUM(CASE WHEN drugs_related_stop = 1 THEN 1 ELSE 0 END)",
+    "duration_minutes": """SUM(CASE stop_duration
+            WHEN '0-15 Min' THEN 7 WHEN '16-30 Min' THEN 23 WHEN '30+ Min' THEN 35 ELSE 0 END)""",
+    "duration_stops": "SUM(CASE WHEN stop_duration IN ('0-15 Min', '16-30 Min', '30+ Min') THEN 1 ELSE 0 END)",
+}
+
+
+def _percent(part, whole):
+    return lambda df: df[part] * 100.0 / df[whole]
+
+
+# name: (base measures, formula, decimals shown). Ranks use the unrounded
+# value, like RANK() over the expression in SQL.
+DERIVED_MEASURES = {
+    "search_rate": (["searches", "stops"], _percent("searches", "stops"), 2),
+    "arrest_rate": (["arrests", "stops"], _percent("arrests", "stops"), 2),
+    "drug_rate": (["drug_stops", "stops"], _percent("drug_stops", "stops"), 2),
+    "avg_duration": (["duration_minutes", "duration_stops"],
+                     lambda df: df["duration_minutes"] / df["duration_stops"].where(df["duration_stops"] > 0),
+                     None),
+}
+
+
+def _measure(df, measure):
+    if measure in DERIVED_MEASURES:
+        return DERIVED_MEASURES[measure][1](df)
+    return df[measure]
+
+
+class Insight:
+    # columns: [(output column, base or derived measure)]
+    # order: [(output column, ascending)]
+    # rank: (output column, measure, partition dimension or None);
+    #       RANK() OVER (PARTITION BY ... ORDER BY measure DESC)
+    def __init__(self, name, dimensions, columns, order=(), limit=None, rank=None):
+        self.name = name
+        self.dimensions = list(dimensions)
+        self.columns = list(columns)
+        self.order = list(order)
+        self.limit = limit
+        self.rank = rank
+
+    def base_measures(self):
+        needed = []
+        measures = [m for _, m in self.columns] + ([self.rank[1]] if self.rank else [])
+        for measure in measures:
+            for base in DERIVED_MEASURES[measure][0] if measure in DERIVED_MEASURES else [measure]:
+                if base not in needed:
+                    needed.append(base)
+        return needed
+
+
+# Catalog insights over the same handful of columns, declared once.
+INSIGHTS = [
+    Insight("Violations most associated with searches or arrests", ["violation"],
+            [("total_searches", "searches"), ("total_arrest", "arrests")],
+            order=[("total_searches", False), ("total_arrest", False)]),
+    Insight("Violation rarely results in search or arrest", ["violation"],
+            [("total_searches", "searches"), ("total_arrests", "arrests"), ("total_stop", "stops")],
+            order=[("total_searches", True), ("total_arrests", True)]),
+    Insight("Violations with High Search and Arrest Rates (Window Function)", ["violation"],
+            [("total_stops", "stops"), ("total_searches", "searches"), ("total_arrests", "arrests"),
+             ("search_rate_percent", "search_rate"), ("arrest_rate_percent", "arrest_rate")],
+            order=[("arrest_rate_percent", False)],
+            rank=("rank_by_arrest_rate", "arrest_rate", None)),
+    Insight("Top 5 Violations with Highest Arrest Rates", ["violation"],
+            [("total_stops", "stops"), ("total_arrests", "arrests"), ("arrest_rate_percent", "arrest_rate")],
+            order=[("arrest_rate_percent", False)], limit=5),
+    Insight("Average stop duration for different violations", ["violation"],
+            [("avg_stop_duration_minutes", "avg_duration")],
+            order=[("avg_stop_duration_minutes", False)]),
+    Insight("Countries with highest rate of drug-related stops", ["country_name"],
+            [("total_stop", "stops"), ("drug_stop", "drug_stops"), ("drug_stop_rate_percent", "drug_rate")],
+            order=[("drug_stop", False)]),
+    Insight("Country with most stops with search conducted", ["country_name"],
+            [("total_stop", "stops"), ("search_stop", "searches")],
+            order=[("search_stop", False)]),
+    Insight("Arrest rate by country and violation", ["country_name", "violation"],
+            [("total_stop", "stops"), ("Arrest_stop", "arrests"), ("Arrest_rate_percent", "arrest_rate")],
+            order=[("Arrest_rate_percent", False)]),
+    Insight("Gender distribution of drivers stopped in each country", ["country_name", "driver_gender"],
+            [("total_stops", "stops")],
+            order=[("country_name", True), ("driver_gender", True)]),
+    Insight("Race and gender combination with highest search rate", ["driver_gender", "driver_race"],
+            [("total_stops", "stops"), ("total_searches", "searches"), ("search_rate_percent", "search_rate")],
+            order=[("search_rate_percent", False)]),
+    Insight("Driver age group with highest arrest rate", ["age_group"],
+            [("total_arrest", "arrests")]),
+    Insight("Are stops during night more likely to lead to arrests?", ["time_of_day"],
+            [("total_stops", "stops"), ("total_arrests", "arrests")]),
+    Insight("Yearly Breakdown of Stops and Arrests by Country (Using Subquery and Window Functions)",
+            ["country_name", "year"],
+            [("total_stops", "stops"), ("total_arrests", "arrests"), ("arrest_rate_percent", "arrest_rate")],
+            order=[("year", True), ("country_name", True)],
+            rank=("rank_by_arrests", "arrests", "year")),
+]
+INSIGHTS_BY_NAME = {insight.name: insight for insight in INSIGHTS}
+
+
+# -------------------------------
+# GLOBAL FILTERS
+# -------------------------------
+class Filters:
+    # countries: list of country names; start/end: stop_date range with end
+    # exclusive; min_age/max_age: inclusive driver_age bounds.
+    def __init__(self, countries=None, start=None, end=None, min_age=None, max_age=None):
+        self.countries = list(countries or [])
+        self.start = start
+        self.end = end
+        self.min_age = min_age
+        self.max_age = max_age
+
+    def key(self):
+        return (tuple(self.countries), self.start, self.end, self.min_age, self.max_age)
+
+    def compile(self):
+        # (WHERE clause or "", bound parameters)
+        terms, params = [], {}
+        if self.countries:
+            names = []
+            for i, country in enumerate(self.countries):
+                params[f"country_{i}"] = country
+                names.append(f":country_{i}")
+            terms.append(f"country_name IN ({', '.join(names)})")
+        if self.start is not None:
+            params["start_date"] = self.start
+            terms.append("stop_date >= :start_date")
+        if self.end is not None:
+            params["end_date"] = self.end
+            terms.append("stop_date < :end_date")
+        if self.min_age is not None:
+            params["min_age"] = int(self.min_age)
+            terms.append("driver_age >= :min_age")
+        if self.max_age is not None:
+            params["max_age"] = int(self.max_age)
+            terms.append("driver_age <= :max_age")
+        return ("WHERE " + " AND ".join(terms) if terms else ""), params
+
+
+# -------------------------------
+# SCAN PLANNING
+# -------------------------------
+def _grain_size(dimensions):
+    size = 1
+    for dim in dimensions:
+        size *= DIMENSION_CARDINALITY.get(dim, 1000)
+    return size
+
+
+def plan_scans(insights):
+    # Greedily packs insights into shared scans while the union grain stays
+    # under MAX_SCAN_GROUPS result groups. Returns [(dimensions, measures,
+    # insights)].
+    scans = []
+    for insight in insights:
+        for scan in scans:
+            dims = scan[0] + [d for d in insight.dimensions if d not in scan[0]]
+            if _grain_size(dims) <= MAX_SCAN_GROUPS:
+                scan[0][:] = dims
+                scan[1].extend(m for m in insight.base_measures() if m not in scan[1])
+                scan[2].append(insight)
+                break
+        else:
+            scans.append((list(insight.dimensions), insight.base_measures(), [insight]))
+    return scans
+
+
+def compile_scan(dimensions, measures, filters=None):
+    # One GROUP BY at the union grain. MySQL has no GROUPING SETS (only WITH
+    # ROLLUP, which rolls up a single hierarchy), so the per-insight rollups
+    # happen in pandas on this small result instead.
+    where, params = (filters or Filters()).compile()
+    select = [f"{DIMENSIONS[d]} AS {d}" for d in dimensions] + [f"{BASE_MEASURES[m]} AS {m}" for m in measures]
+    group = f"\nGROUP BY {', '.join(DIMENSIONS[d] for d in dimensions)}" if dimensions else ""
+    sql = f"SELECT {', '.join(select)}\nFROM traffic_project\n{where}{group}"
+    return sql, params
+
+
+# -------------------------------
+# ROLLUP
+# -------------------------------
+def finish(insight, scan_df):
+    if insight.dimensions:
+        df = (scan_df.groupby(insight.dimensions, dropna=False, observed=True)[insight.base_measures()]
+              .sum().reset_index())
+    else:
+        df = scan_df[insight.base_measures()].sum().to_frame().T
+    out = df[insight.dimensions].copy()
+    for column, measure in insight.columns:
+        values = _measure(df, measure)
+        decimals = DERIVED_MEASURES[measure][2] if measure in DERIVED_MEASURES else None
+        out[column] = values.round(decimals) if decimals is not None else values
+    if insight.rank:
+        column, measure, partition = insight.rank
+        values = _measure(df, measure)
+        ranks = (values.groupby(df[partition], dropna=False, observed=True) if partition else values).rank(
+            method="min", ascending=False)
+        out[column] = ranks.astype("int32") if ranks.notna().all() else ranks.astype("Int32")
+    if insight.order:
+        out = out.sort_values([c for c, _ in insight.order], ascending=[a for _, a in insight.order],
+                              kind="stable")
+    if insight.limit:
+        out = out.head(insight.limit)
+    return out.reset_index(drop=True)
+
+
+def run_insights(names=None, filters=None, engine=None):
+    # {insight name: DataFrame}, answering every requested insight from as
+    # few table scans as plan_scans() allows. Each scan also covers the
+    # archived years in the filters' date range; finish() adds the two
+    # tiers' groups together like any other rollup.
+    filters = filters or Filters()
+    insights = [INSIGHTS_BY_NAME[n] for n in names] if names else INSIGHTS
+    results = {}
+    for dimensions, measures, members in plan_scans(insights):
+        sql, params = compile_scan(dimensions, measures, filters)
+        scan_df = pd.concat(read_tiers(sql, engine, params=params, name=f"__scan_{'_'.join(dimensions)}__",
+                                       start=filters.start, end=filters.end), ignore_index=True)
+        for insight in members:
+            results[insight.name] = finish(insight, scan_df)
+    return results
@@ -0,0 +1,114 @@
+import threading
+from collections import Counter, deque
+
+from sqlalchemy import text
+
+from cube import cube_supported, refresh_cube
+from watermark import IdWatermark
+
+
+# -------------------------------
+# RUNNING AGGREGATES
+# -------------------------------
+# Seeded once from an aggregate (the cube on MySQL), then kept current by
+# tailing traffic_project past the last seen id. Each poll reads only the
+# new rows (plus late rows in the watermark's gaps), so refresh cost follows
+# the arrival rate, not the table size.
+LIVE_COLUMNS = [
+    "id", "stop_date", "stop_time", "country_name", "violation", "stop_outcome",
+    "search_conducted", "drugs_related_stop", "vehicle_number",
+]
+
+SEED_FROM_TABLE = """
+    SELECT violation, COUNT(*) AS stops,
+           SUM(CASE WHEN stop_outcome = 'Arrest' THEN 1 ELSE 0 END) AS arrests,
+           SUM(CASE WHEN search_conducted = 1 THEN 1 ELSE 0 END) AS searches,
+           SUM(CASE WHEN drugs_related_stop = 1 THEN 1 ELSE 0 END) AS drug_stops
+    FROM traffic_project
+    WHERE id <= :hi
+    GROUP BY violation
+"""
+
+SEED_FROM_CUBE = """
+    SELECT NULLIF(violation, '') AS violation, SUM(stops) AS stops, SUM(arrests) AS arrests,
+           SUM(searches) AS searches, SUM(drug_stops) AS drug_stops
+    FROM traffic_cube_demo
+    GROUP BY violation
+"""
+
+
+class LiveAggregates:
+    def __init__(self, recent=20):
+        self.watermark = IdWatermark()
+        self.violations = Counter()
+        self.totals = Counter()
+        self.recent = deque(maxlen=recent)
+        self._lock = threading.Lock()
+
+    @property
+    def last_id(self):
+        return self.watermark.last_id
+
+    def seed(self, engine):
+        with self._lock, engine.connect() as conn:
+            hi = conn.execute(text("SELECT MAX(id) FROM traffic_project")).scalar() or 0
+            if cube_supported(engine):
+                # End this connection's read snapshot so the SELECT below
+                # sees what refresh_cube() commits on its own connection.
+                conn.commit()
+                refresh_cube(engine, up_to=hi)
+                # The cube may already be ahead of hi (another session
+                # refreshed it); read its watermark in the same snapshot.
+                hi = conn.execute(
+                    text("SELECT last_id FROM traffic_cube_state WHERE cube_name = 'traffic_project'")
+                ).scalar()
+                # Ids the cube has not seen yet are gaps here too.
+                gaps = conn.execute(text("SELECT gap_first, gap_last FROM traffic_cube_gaps")).fetchall()
+                rows = conn.execute(text(SEED_FROM_CUBE)).fetchall()
+            else:
+                gaps = []
+                rows = conn.execute(text(SEED_FROM_TABLE), {"hi": hi}).fetchall()
+            for violation, stops, arrests, searches, drug_stops in rows:
+                self.violations[violation or "Unknown"] += int(stops)
+                self.totals["stops"] += int(stops)
+                self.totals["arrests"] += int(arrests or 0)
+                self.totals["searches"] += int(searches or 0)
+                self.totals["drug_stops"] += int(drug_stops or 0)
+            self.watermark = IdWatermark(int(hi))
+            self.watermark.add_gaps(gaps)
+
+    def fold(self, row):
+        self.violations[row["violation"] or "Unknown"] += 1
+        self.totals["stops"] += 1
+        self.totals["arrests"] += row["stop_outcome"] == "Arrest"
+        self.totals["searches"] += bool(row["search_conducted"])
+        self.totals["drug_stops"] += bool(row["drugs_related_stop"])
+        self.recent.appendleft(row)
+
+    def poll(self, engine, limit=10_000):
+        # Returns how many new stops were folded in. The lock keeps two
+        # sessions polling at once from folding the same rows twice.
+        columns = ", ".join(LIVE_COLUMNS)
+        sql = text(f"SELECT {columns} FROM traffic_project WHERE id > :last_id ORDER BY id LIMIT :limit")
+        with self._lock, engine.connect() as conn:
+            late = []
+            gap_filter, gap_params = self.watermark.gap_filter()
+            if gap_filter:
+                late = conn.execute(
+                    text(f"SELECT {columns} FROM traffic_project WHERE {gap_filter} ORDER BY id"), gap_params
+                ).mappings().fetchall()
+                self.watermark.fill([row["id"] for row in late])
+            rows = conn.execute(sql, {"last_id": self.watermark.last_id, "limit": limit}).mappings().fetchall()
+            self.watermark.advance([row["id"] for row in rows])
+            for row in [*late, *rows]:
+                self.fold(dict(row))
+        return len(late) + len(rows)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "last_id": self.last_id,
+                "totals": dict(self.totals),
+                "violations": self.violations.most_common(),
+                "recent": list(self.recent),
+            }
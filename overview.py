@@ -0,0 +1,51 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from db import POOL_SIZE
+
+
+# -------------------------------
+# CONCURRENT EXECUTION
+# -------------------------------
+def _timed(name, task, started):
+    start = time.perf_counter()
+    # Each query's clock starts when a worker picks it up, not while it
+    # waits in the queue behind the others.
+    started[name] = start
+    try:
+        return name, task(), None, time.perf_counter() - start
+    except Exception as e:
+        return name, None, str(e), time.perf_counter() - start
+
+
+def run_concurrently(tasks, max_workers=None, timeout=30.0):
+    # tasks: {name: zero-argument callable returning a DataFrame}.
+    # Yields (name, df, error, seconds) in completion order, so callers can
+    # show each result as soon as it lands; total time tracks the slowest
+    # query instead of the sum. A query still running timeout seconds after
+    # it started is reported as timed out. Tasks should also enforce the
+    # timeout themselves (db.read_sql(timeout=...)) so the database aborts
+    # the query and its worker and pooled connection are freed for the
+    # queries still queued.
+    max_workers = max_workers or min(len(tasks), POOL_SIZE) or 1
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="insight")
+    started = {}
+    futures = {pool.submit(_timed, name, task, started): name for name, task in tasks.items()}
+    pending = set(futures)
+    try:
+        while pending:
+            # Wake at the earliest deadline among the running queries; a
+            # query that starts in the meantime is seen on the next pass.
+            deadlines = [started[futures[f]] + timeout for f in pending if futures[f] in started]
+            wake = min(deadlines) - time.perf_counter() if deadlines else timeout
+            done, pending = wait(pending, timeout=max(wake, 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+            now = time.perf_counter()
+            for future in [f for f in pending if futures[f] in started]:
+                elapsed = now - started[futures[future]]
+                if elapsed >= timeout:
+                    pending.discard(future)
+                    yield futures[future], None, f"timed out after {timeout:g}s", elapsed
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
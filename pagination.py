@@ -0,0 +1,132 @@
+from sqlalchemy import text
+
+from db import read_sql
+from dialect import translate
+
+
+# -------------------------------
+# PAGINATED CATALOG ENTRIES
+# -------------------------------
+# Insight queries whose result grows with the data (one row per plate, per
+# distinct second, per demographic cell, ...). Each gets a sort key that
+# matches its ORDER BY and ends in columns that make it unique, so pages can
+# be fetched by keyset ("rows after the last one shown") instead of OFFSET.
+PAGINATION_KEYS = {
+    "Vehicles most frequently searched": [("search_count", "DESC"), ("vehicle_number", "ASC")],
+    "Time of day with most traffic stops": [("traffic_time", "DESC"), ("stop_time", "ASC")],
+    "Gender distribution of drivers stopped in each country": [("country_name", "ASC"), ("driver_gender", "ASC")],
+    "Arrest rate by country and violation": [
+        ("Arrest_rate_percent", "DESC"), ("country_name", "ASC"), ("violation", "ASC"),
+    ],
+    "Driver Violation Trends Based on Age and Race (Join with Subquery)": [
+        ("age_group", "ASC"), ("race", "ASC"), ("violation", "ASC"),
+    ],
+    "Time Period Analysis of Stops (Year, Month, Hour)": [
+        ("year", "ASC"), ("month", "ASC"), ("hour", "ASC"), ("country_name", "ASC"),
+    ],
+    "Driver Demographics by Country (Age, Gender, Race)": [
+        ("driver_age", "ASC"), ("country_name", "ASC"), ("driver_gender", "ASC"), ("driver_race", "ASC"),
+    ],
+}
+
+PAGE_SIZES = [50, 100, 500, 1000]
+
+
+def _strip(sql):
+    return sql.strip().rstrip(";").strip()
+
+
+def _order_by(keys):
+    # NULLs first for ASC and last for DESC on every backend (MySQL's
+    # default), spelled out because DuckDB sorts NULLs last by default.
+    parts = []
+    for col, direction in keys:
+        if direction == "ASC":
+            parts.append(f"({col} IS NULL) DESC, {col} ASC")
+        else:
+            parts.append(f"({col} IS NULL) ASC, {col} DESC")
+    return ", ".join(parts)
+
+
+def _after(keys, cursor, params):
+    # Rows strictly after `cursor` in _order_by() order, as an OR of
+    # "equal on the first i keys and after on key i".
+    alternatives = []
+    for i, (col, direction) in enumerate(keys):
+        terms = []
+        for j, (prev_col, _) in enumerate(keys[:i]):
+            value = cursor[prev_col]
+            if value is None:
+                terms.append(f"{prev_col} IS NULL")
+            else:
+                params[f"k{j}"] = value
+                terms.append(f"{prev_col} = :k{j}")
+        value = cursor[col]
+        if direction == "ASC":
+            if value is None:
+                terms.append(f"{col} IS NOT NULL")
+            else:
+                params[f"k{i}"] = value
+                terms.append(f"{col} > :k{i}")
+        else:
+            if value is None:
+                continue  # nothing sorts after a trailing NULL
+            params[f"k{i}"] = value
+            terms.append(f"({col} < :k{i} OR {col} IS NULL)")
+        alternatives.append("(" + " AND ".join(terms) + ")")
+    return " OR ".join(alternatives) if alternatives else "1 = 0"
+
+
+def page_sql(sql, keys, cursor=None, page_size=100):
+    params = {"page_limit": int(page_size)}
+    where = f"WHERE {_after(keys, cursor, params)}" if cursor else ""
+    statement = (
+        f"SELECT * FROM (\n{_strip(sql)}\n) AS page_src\n"
+        f"{where}\nORDER BY {_order_by(keys)}\nLIMIT :page_limit"
+    )
+    return statement, params
+
+
+def next_cursor(page_df, keys):
+    # Key values of the last row shown, with pandas NA mapped back to None.
+    if page_df.empty:
+        return None
+    last = page_df.iloc[-1]
+    cursor = {}
+    for col, _ in keys:
+        value = last[col]
+        try:
+            missing = value is None or value != value
+        except (TypeError, ValueError):
+            missing = False
+        if missing:
+            value = None
+        elif hasattr(value, "to_pytimedelta"):
+            value = value.to_pytimedelta()  # TIME columns come back as Timedelta
+        elif hasattr(value, "to_pydatetime"):
+            value = value.to_pydatetime()
+        elif hasattr(value, "item"):
+            value = value.item()  # numpy scalar -> Python scalar for the driver
+        cursor[col] = value
+    return cursor
+
+
+# -------------------------------
+# ROW COUNT
+# -------------------------------
+def estimate_rows(sql, engine, params=None):
+    # (rows, exact). On MySQL the optimizer's estimate for the derived table
+    # is read from EXPLAIN without running the query; the embedded columnar
+    # backends count exactly, which is cheap for them. Counts what sql
+    # returns on engine alone: archived years are in it only when sql reads
+    # the cube (export.count_stops adds them for stop exports).
+    inner = _strip(translate(sql, engine.dialect.name))
+    if engine.dialect.name == "mysql":
+        with engine.connect() as conn:
+            plan = conn.execute(text(f"EXPLAIN SELECT * FROM (\n{inner}\n) AS count_src"),
+                                params or {}).mappings().first()
+        if plan and plan.get("rows") is not None:
+            return int(plan["rows"]), False
+    df = read_sql(f"SELECT COUNT(*) AS n FROM (\n{inner}\n) AS count_src", engine, params=params,
+                  name="__row_count__")
+    return int(df.iloc[0]["n"]), True
@@ -0,0 +1,406 @@
+import argparse
+import json
+import os
+import re
+from datetime import date, datetime
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from bulk_load import LOAD_COLUMNS
+from columnar import iter_chunks
+from db import get_engine, read_sql
+
+
+# -------------------------------
+# PARTITION LAYOUT
+# -------------------------------
+# traffic_project is RANGE COLUMNS partitioned on stop_date (see
+# traffic_stops.sql). Cold partitions are swapped out into a staging table,
+# copied to zstd Parquet files under ARCHIVE_DIR and listed in manifest.json;
+# read_tiered() puts the two tiers back together for a date range,
+# read_tiers() runs additive aggregates on each tier for the caller to
+# combine.
+ARCHIVE_DIR = os.environ.get("TRAFFIC_ARCHIVE", "archive")
+MANIFEST = "manifest.json"
+
+PARTITIONS_SQL = """
+    SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS
+    FROM information_schema.PARTITIONS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'traffic_project' AND PARTITION_NAME IS NOT NULL
+    ORDER BY PARTITION_ORDINAL_POSITION
+"""
+
+
+def _bound(description):
+    # PARTITION_DESCRIPTION is "'2021-01-01'" or "MAXVALUE".
+    value = description.strip("'")
+    return None if value == "MAXVALUE" else date.fromisoformat(value)
+
+
+def list_partitions(engine):
+    # [{name, start, end, rows}], start inclusive / end exclusive, None for
+    # an open bound. rows is InnoDB's estimate.
+    with engine.connect() as conn:
+        rows = conn.execute(text(PARTITIONS_SQL)).fetchall()
+    partitions = []
+    start = None
+    for name, description, table_rows in rows:
+        end = _bound(description)
+        partitions.append({"name": name, "start": start, "end": end, "rows": int(table_rows or 0)})
+        start = end
+    return partitions
+
+
+def add_year_partitions(engine, through_year):
+    # Splits the catch-all p_future partition so every year up to
+    # through_year gets its own partition (and can be archived on its own).
+    existing = {p["name"] for p in list_partitions(engine)}
+    years = [y for y in range(date.today().year, through_year + 1) if f"p{y}" not in existing]
+    if not years:
+        return []
+    parts = [f"PARTITION p{y} VALUES LESS THAN ('{y + 1}-01-01')" for y in years]
+    parts.append("PARTITION p_future VALUES LESS THAN (MAXVALUE)")
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE traffic_project REORGANIZE PARTITION p_future INTO ({', '.join(parts)})"))
+    return [f"p{y}" for y in years]
+
+
+# -------------------------------
+# ARCHIVE MANIFEST
+# -------------------------------
+def load_manifest(archive_dir=ARCHIVE_DIR):
+    path = os.path.join(archive_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"files": []}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest, archive_dir):
+    path = os.path.join(archive_dir, MANIFEST)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+# -------------------------------
+# TIERING JOB
+# -------------------------------
+TABLE_COLUMNS = ["id"] + LOAD_COLUMNS + ["created_at", "idempotency_key"]
+
+
+def table_schema(columns=TABLE_COLUMNS):
+    # traffic_project's column types (traffic_stops.sql) as Arrow; every
+    # other column is text. Archive files and the hot rows are written with
+    # it instead of a schema inferred from the first chunk, where a column
+    # that happens to be all NULL (idempotency_key, search_type) has no type.
+    import pyarrow as pa
+
+    types = {
+        "id": pa.int64(), "stop_date": pa.date32(), "stop_time": pa.time64("us"),
+        "driver_age": pa.int16(), "search_conducted": pa.int8(), "is_arrested": pa.int8(),
+        "drugs_related_stop": pa.int8(), "created_at": pa.timestamp("us"),
+    }
+    return pa.schema([(c, types.get(c, pa.string())) for c in columns])
+
+
+def _stage_table(partition):
+    return f"traffic_project_archive_{partition}"
+
+
+def _stage_rows(engine, stage):
+    # Rows in a partition's staging table, None when there is none.
+    with engine.connect() as conn:
+        exists = conn.execute(
+            text("SELECT COUNT(*) FROM information_schema.TABLES "
+                 "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :name"),
+            {"name": stage},
+        ).scalar()
+        return conn.execute(text(f"SELECT COUNT(*) FROM {stage}")).scalar() if exists else None
+
+
+def _drop_stage(engine, stage):
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {stage}"))
+
+
+def _resolve_pending(engine, manifest, archive_dir, log):
+    # An entry stays "pending" between writing the manifest (its file holds
+    # every staged row) and dropping the staging table, so finishing it only
+    # takes the drop. A staging table without an entry is copied again by
+    # the next archive_partition.
+    for entry in [e for e in manifest["files"] if e.get("state") == "pending"]:
+        if not os.path.exists(os.path.join(archive_dir, entry["file"])):
+            manifest["files"].remove(entry)
+            log(f"{entry['partition']}: dropped manifest entry for missing {entry['file']}")
+        else:
+            _drop_stage(engine, _stage_table(entry["partition"]))
+            entry["state"] = "done"
+    _save_manifest(manifest, archive_dir)
+
+
+def archive_partition(engine, partition, archive_dir=ARCHIVE_DIR, chunk_size=500_000, log=print):
+    # EXCHANGE PARTITION into an empty staging table -> copy the staging
+    # table -> verify -> manifest entry (pending) -> DROP the staging table
+    # -> entry done. The exchange takes the partition's rows in one atomic
+    # step, so a stop inserted during the copy lands in the emptied
+    # partition and stays hot instead of being truncated uncopied. Until the
+    # entry is written the staged stops are in neither tier; the cube keeps
+    # counting them (and archived stops) throughout. Only "done" files are
+    # read, and an interrupted run is settled by the next one, so no stop is
+    # lost or counted twice.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    layout = {p["name"]: p for p in list_partitions(engine)}
+    if partition not in layout:
+        raise ValueError(f"traffic_project has no partition {partition!r}")
+    bounds = layout[partition]
+    os.makedirs(archive_dir, exist_ok=True)
+    manifest = load_manifest(archive_dir)
+    _resolve_pending(engine, manifest, archive_dir, log)
+    part_no = sum(1 for f in manifest["files"] if f["partition"] == partition)
+    file_name = f"traffic_project_{partition}_{part_no:03d}.parquet"
+    path = os.path.join(archive_dir, file_name)
+
+    stage = _stage_table(partition)
+    staged = _stage_rows(engine, stage)
+    if staged:
+        # A previous run stopped after its exchange; copy those rows first.
+        # Stops that arrived since stay hot until the next run.
+        log(f"{partition}: resuming the copy of {staged:,} staged rows")
+    else:
+        with engine.begin() as conn:
+            if staged is None:
+                conn.execute(text(f"CREATE TABLE {stage} LIKE traffic_project"))
+                conn.execute(text(f"ALTER TABLE {stage} REMOVE PARTITIONING"))
+            conn.execute(text(f"ALTER TABLE traffic_project EXCHANGE PARTITION {partition} WITH TABLE {stage}"))
+        staged = _stage_rows(engine, stage)
+    if not staged:
+        _drop_stage(engine, stage)
+        log(f"{partition}: nothing to archive")
+        return 0
+
+    writer = None
+    copied = 0
+    try:
+        for df in iter_chunks(engine, chunk_size, table=stage):
+            schema = table_schema(list(df.columns))
+            if writer is None:
+                writer = pq.ParquetWriter(path, schema, compression="zstd")
+            writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+            copied += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    if copied != staged or pq.ParquetFile(path).metadata.num_rows != copied:
+        raise RuntimeError(f"{partition}: {path} does not hold the {staged:,} staged rows; they stay in {stage}")
+
+    entry = {
+        "partition": partition,
+        "file": file_name,
+        "start": _iso(bounds["start"]),
+        "end": _iso(bounds["end"]),
+        "rows": copied,
+        "archived_at": datetime.now().isoformat(timespec="seconds"),
+        "state": "pending",
+    }
+    manifest["files"].append(entry)
+    _save_manifest(manifest, archive_dir)
+    _drop_stage(engine, stage)
+    entry["state"] = "done"
+    _save_manifest(manifest, archive_dir)
+    log(f"{partition}: archived {copied:,} rows to {path}")
+    return copied
+
+
+def archive_before(engine, cutoff, archive_dir=ARCHIVE_DIR, chunk_size=500_000, log=print):
+    # Archives every partition that ends on or before cutoff.
+    total = 0
+    for p in list_partitions(engine):
+        if p["end"] is not None and p["end"] <= cutoff:
+            total += archive_partition(engine, p["name"], archive_dir, chunk_size, log)
+    return total
+
+
+# -------------------------------
+# DATE-SCOPED QUERIES
+# -------------------------------
+TABLE_REF = re.compile(
+    r"\b(FROM|JOIN)\s+traffic_project\b"
+    r"(\s+(?:AS\s+)?(?!(?:WHERE|GROUP|ORDER|LIMIT|JOIN|INNER|LEFT|RIGHT|CROSS|ON|HAVING|UNION|WINDOW)\b)([A-Za-z_]\w*))?",
+    re.IGNORECASE,
+)
+
+
+def scope_table(sql, start=None, end=None):
+    # Replaces each traffic_project reference with a derived table bounded
+    # to [start, end). MySQL merges the derived table into the outer query,
+    # so the stop_date predicate prunes partitions. Returns (sql, params).
+    params = {}
+    terms = []
+    if start is not None:
+        params["range_start"] = start
+        terms.append("stop_date >= :range_start")
+    if end is not None:
+        params["range_end"] = end
+        terms.append("stop_date < :range_end")
+    if not terms:
+        return sql, params
+    where = " AND ".join(terms)
+
+    def scoped(match):
+        alias = match.group(3) or "traffic_project"
+        return f"{match.group(1)} (SELECT * FROM traffic_project WHERE {where}) AS {alias}"
+
+    return TABLE_REF.sub(scoped, sql), params
+
+
+def _overlaps(entry, start, end):
+    lo = date.fromisoformat(entry["start"]) if entry["start"] else None
+    hi = date.fromisoformat(entry["end"]) if entry["end"] else None
+    return (start is None or hi is None or start < hi) and (end is None or lo is None or lo < end)
+
+
+SELECT_STAR = re.compile(r"SELECT\s+(?:DISTINCT\s+)?(?:\w+\.)?\*", re.IGNORECASE)
+
+
+def referenced_columns(sql):
+    # traffic_project columns the query names (always id, the keyset
+    # column); all of them for SELECT *.
+    if SELECT_STAR.search(sql):
+        return list(TABLE_COLUMNS)
+    return ["id"] + [c for c in TABLE_COLUMNS[1:] if re.search(rf"\b{c}\b", sql, re.IGNORECASE)]
+
+
+def archive_files(start=None, end=None, archive_dir=ARCHIVE_DIR):
+    # Archive files ("done" entries) that can hold stops in [start, end);
+    # start/end are dates or ISO strings.
+    start, end = (date.fromisoformat(d) if isinstance(d, str) else d for d in (start, end))
+    return [
+        os.path.join(archive_dir, entry["file"])
+        for entry in load_manifest(archive_dir)["files"]
+        if entry.get("state") == "done" and _overlaps(entry, start, end)
+    ]
+
+
+def _parquet_source(files, select="*"):
+    paths = ", ".join("'" + f.replace("'", "''") + "'" for f in files)
+    return f"SELECT {select} FROM read_parquet([{paths}], union_by_name = true)"
+
+
+def archive_engine(files):
+    # Throwaway in-memory DuckDB where traffic_project is the archived files
+    # alone.
+    engine = create_engine("duckdb:///:memory:", poolclass=StaticPool)
+    with engine.connect() as conn:
+        conn.connection.driver_connection.execute(f"CREATE VIEW traffic_project AS {_parquet_source(files)}")
+    return engine
+
+
+def _union_engine(files, hot_chunks, columns):
+    # Throwaway in-memory DuckDB where traffic_project is the archived files
+    # plus the hot rows fetched from MySQL for the same range. Hot rows are
+    # appended to a DuckDB table (typed from table_schema) one chunk at a
+    # time, so no more than one chunk is ever held in pandas.
+    engine = create_engine("duckdb:///:memory:", poolclass=StaticPool)
+    select = ", ".join(columns)
+    sources = [_parquet_source(files, select)]
+    with engine.connect() as conn:
+        duck = conn.connection.driver_connection
+        duck.register("hot_schema", table_schema(columns).empty_table())
+        duck.execute("CREATE TABLE hot_rows AS SELECT * FROM hot_schema")
+        duck.unregister("hot_schema")
+        for chunk in hot_chunks:
+            duck.register("hot_chunk", chunk)
+            duck.execute("INSERT INTO hot_rows BY NAME SELECT * FROM hot_chunk")
+            duck.unregister("hot_chunk")
+        sources.append(f"SELECT {select} FROM hot_rows")
+        duck.execute(f"CREATE VIEW traffic_project AS {' UNION ALL BY NAME '.join(sources)}")
+    return engine
+
+
+def read_tiered(sql, start=None, end=None, engine=None, params=None, name=None,
+                archive_dir=ARCHIVE_DIR, chunk_size=500_000):
+    # Runs a catalog query over stops in [start, end) wherever they live.
+    # Ranges that only touch hot partitions run on MySQL with pruning; ranges
+    # that reach archived years run in DuckDB over the Parquet files plus the
+    # range's hot rows, so non-additive results (AVG, RANK, rates) stay exact.
+    # The hot rows are read with the range predicate (pruned to the range's
+    # partitions) and only the columns the query uses.
+    engine = engine or get_engine()
+    statement, scope_params = scope_table(sql, start, end)
+    params = {**(params or {}), **scope_params}
+    files = archive_files(start, end, archive_dir)
+    if not files:
+        return read_sql(statement, engine, params=params, name=name)
+
+    where = " AND ".join(t for t, v in [("stop_date >= :range_start", start), ("stop_date < :range_end", end)] if v)
+    columns = referenced_columns(sql)
+    hot_chunks = iter_chunks(engine, chunk_size, where=where or None, params=scope_params, columns=columns)
+    cold_engine = _union_engine(files, hot_chunks, columns)
+    try:
+        return read_sql(statement, cold_engine, params=params, name=name)
+    finally:
+        cold_engine.dispose()
+
+
+def read_tiers(sql, engine=None, params=None, name=None, start=None, end=None, archive_dir=ARCHIVE_DIR):
+    # For queries whose rows are partial aggregates that add up (GROUP BY
+    # with COUNT/SUM, or MIN/MAX): runs sql on the hot table and, when
+    # archived years can hold matching stops, once more over the archive
+    # files in DuckDB, without copying any hot rows. Returns the results as
+    # a list for the caller to combine, like the shard partials in
+    # federation.py. start/end only pick the files; sql does the filtering.
+    engine = engine or get_engine()
+    frames = [read_sql(sql, engine, params=params, name=name)]
+    files = archive_files(start, end, archive_dir)
+    if files:
+        cold_engine = archive_engine(files)
+        try:
+            frames.append(read_sql(sql, cold_engine, params=params, name=name))
+        finally:
+            cold_engine.dispose()
+    return frames
+
+
+# -------------------------------
+# COMMAND LINE
+# -------------------------------
+# python partitions.py list
+# python partitions.py archive --before 2023-01-01
+# python partitions.py add --through 2030
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage traffic_project partitions and the Parquet archive.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    archive_cmd = sub.add_parser("archive")
+    archive_cmd.add_argument("--before", required=True, type=date.fromisoformat,
+                             help="archive partitions that end on or before this date")
+    archive_cmd.add_argument("--dir", default=ARCHIVE_DIR)
+    archive_cmd.add_argument("--chunk-size", type=int, default=500_000)
+    add_cmd = sub.add_parser("add")
+    add_cmd.add_argument("--through", type=int, required=True, help="last year to get its own partition")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if args.command == "list":
+        archived = {}
+        for entry in load_manifest()["files"]:
+            if entry.get("state") != "done":
+                continue
+            archived[entry["partition"]] = archived.get(entry["partition"], 0) + entry["rows"]
+        for p in list_partitions(engine):
+            print(f"{p['name']:<10} {_iso(p['start']) or '-':<10} .. {_iso(p['end']) or 'MAXVALUE':<10} "
+                  f"~{p['rows']:>12,} hot  {archived.get(p['name'], 0):>12,} archived")
+    elif args.command == "archive":
+        total = archive_before(engine, args.before, args.dir, args.chunk_size)
+        print(f"Archived {total:,} rows")
+    else:
+        print(f"Added partitions: {', '.join(add_year_partitions(engine, args.through)) or 'none'}")
@@ -0,0 +1,173 @@
+import hashlib
+import math
+import threading
+from collections import deque
+
+from sqlalchemy import text
+
+from watermark import IdWatermark
+
+
+# -------------------------------
+# BLOOM FILTER
+# -------------------------------
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(int(capacity), 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.num_hashes = max(int(round(self.num_bits / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: k positions from the two halves of one digest.
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+# -------------------------------
+# PLATE INDEX
+# -------------------------------
+RECORD_COLUMNS = [
+    "id", "stop_date", "stop_time", "country_name", "violation", "stop_outcome",
+    "search_conducted", "stop_duration", "drugs_related_stop",
+]
+
+
+def normalize_plate(plate):
+    # MySQL compares vehicle_number case- and trailing-space-insensitively,
+    # so the index keys follow the same rule.
+    return (plate or "").strip().upper()
+
+
+def parse_plates(value):
+    # Same comma separated format as the Vehicle Number(s) form field.
+    return [p.strip() for p in (value or "").split(",") if p.strip()]
+
+
+class PlateIndex:
+    def __init__(self, history=3, bloom_capacity=1_000_000, error_rate=0.01):
+        self.history = history
+        self.error_rate = error_rate
+        self.watermark = IdWatermark()
+        self._records = {}
+        self._bloom = BloomFilter(bloom_capacity, error_rate)
+        self._lock = threading.Lock()
+        # Held from reading the watermark through the fold, so concurrent
+        # sessions never fetch and add the same rows twice. Lookups only
+        # take _lock and keep running while a refresh waits on the database.
+        self._refresh_lock = threading.Lock()
+        self.lookups = 0
+        self.bloom_rejects = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    @property
+    def last_id(self):
+        return self.watermark.last_id
+
+    def add(self, row):
+        # row: tuple in RECORD_COLUMNS order plus vehicle_number. The right
+        # end of each deque is the stop with the highest id.
+        key = normalize_plate(row[-1])
+        if not key:
+            return
+        records = self._records.get(key)
+        if records is None:
+            records = self._records[key] = deque(maxlen=self.history)
+            if len(self._records) > self._bloom.capacity:
+                self._grow_bloom()
+            else:
+                self._bloom.add(key)
+        record = tuple(row[:-1])
+        if records and record[0] < records[-1][0]:
+            # A late row from a watermark gap: keep the history in id order.
+            ordered = sorted([*records, record])
+            records.clear()
+            records.extend(ordered[-self.history:])
+        else:
+            records.append(record)
+
+    def _grow_bloom(self):
+        # Past its capacity the false positive rate climbs, so rebuild at
+        # twice the size from the keys we already hold.
+        bloom = BloomFilter(self._bloom.capacity * 2, self.error_rate)
+        for key in self._records:
+            bloom.add(key)
+        self._bloom = bloom
+
+    def refresh(self, engine, chunk_size=100_000):
+        # Loads every stop newer than last_id; on a fresh index this is the
+        # startup load, afterwards only the rows that arrived since the last
+        # call are read (keyset on the primary key, no OFFSET), plus rows
+        # that committed late inside the watermark's gaps. NULL plates are
+        # read too, so their ids do not look like gaps.
+        columns = ", ".join(RECORD_COLUMNS + ["vehicle_number"])
+        sql = text(f"SELECT {columns} FROM traffic_project WHERE id > :last_id ORDER BY id LIMIT :limit")
+        loaded = 0
+        with self._refresh_lock, engine.connect() as conn:
+            gap_filter, gap_params = self.watermark.gap_filter()
+            if gap_filter:
+                rows = conn.execute(
+                    text(f"SELECT {columns} FROM traffic_project WHERE {gap_filter} ORDER BY id"), gap_params
+                ).fetchall()
+                with self._lock:
+                    for row in rows:
+                        self.add(row)
+                    self.watermark.fill([row[0] for row in rows])
+                loaded += len(rows)
+            while True:
+                rows = conn.execute(sql, {"last_id": self.last_id, "limit": chunk_size}).fetchall()
+                if not rows:
+                    break
+                with self._lock:
+                    for row in rows:
+                        self.add(row)
+                    self.watermark.advance([row[0] for row in rows])
+                loaded += len(rows)
+                if len(rows) < chunk_size:
+                    break
+        return loaded
+
+    def lookup(self, plate):
+        key = normalize_plate(plate)
+        with self._lock:
+            self.lookups += 1
+            if key not in self._bloom:
+                self.bloom_rejects += 1
+                return []
+            records = self._records.get(key)
+            if not records:
+                return []
+            return [dict(zip(RECORD_COLUMNS, r)) for r in reversed(records)]
+
+    def lookup_many(self, plates):
+        # Batched API: {plate: [most recent record first, ...]} for every
+        # requested plate, unknown plates map to [].
+        if isinstance(plates, str):
+            plates = parse_plates(plates)
+        return {plate: self.lookup(plate) for plate in plates}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "plates": len(self._records),
+                "last_id": self.last_id,
+                "lookups": self.lookups,
+                "bloom_rejects": self.bloom_rejects,
+                "bloom_bits": self._bloom.num_bits,
+                "bloom_hashes": self._bloom.num_hashes,
+            }
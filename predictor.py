@@ -0,0 +1,287 @@
+import argparse
+import json
+import math
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from partitions import read_tiers
+
+
+# -------------------------------
+# FEATURES
+# -------------------------------
+# Categorical Naive Bayes over the stop attributes an officer enters in the
+# form. Training only needs (target, feature value) counts, which the
+# database aggregates with one GROUP BY per feature; scoring is a handful
+# of dict lookups and additions, far below a millisecond.
+MODEL_PATH = os.environ.get("TRAFFIC_MODEL_PATH", "traffic_model.json")
+TARGETS = ["violation", "stop_outcome"]
+
+AGE_BUCKET_SQL = """
+    CASE
+        WHEN driver_age IS NULL THEN 'unknown'
+        WHEN driver_age < 20 THEN '<20'
+        WHEN driver_age < 30 THEN '20-29'
+        WHEN driver_age < 40 THEN '30-39'
+        WHEN driver_age < 50 THEN '40-49'
+        WHEN driver_age < 65 THEN '50-64'
+        ELSE '65+'
+    END
+"""
+FEATURE_SQL = {
+    "country": "country_name",
+    "gender": "driver_gender",
+    "age": AGE_BUCKET_SQL,
+    "race": "driver_race",
+    "search": "search_conducted",
+    "drugs": "drugs_related_stop",
+    "duration": "stop_duration",
+    "hour": "HOUR(stop_time)",
+}
+GENDERS = {"m": "M", "male": "M", "f": "F", "female": "F"}
+
+
+def age_bucket(age):
+    if age is None:
+        return "unknown"
+    for limit, label in [(20, "<20"), (30, "20-29"), (40, "30-39"), (50, "40-49"), (65, "50-64")]:
+        if age < limit:
+            return label
+    return "65+"
+
+
+def _missing(value):
+    try:
+        return value is None or bool(value != value)
+    except TypeError:  # pandas.NA refuses to be truth-tested
+        return True
+
+
+def normalize_value(feature, value):
+    # One spelling per value for both training rows and form input.
+    if _missing(value):
+        return "unknown"
+    if feature == "gender":
+        return GENDERS.get(str(value).strip().lower(), str(value).strip())
+    if feature in ("search", "drugs"):
+        if isinstance(value, str):
+            return "1" if value.strip().lower() in ("1", "yes", "true") else "0"
+        return "1" if value else "0"
+    if feature == "hour":
+        return str(int(value))
+    return str(value).strip()
+
+
+def form_features(country, gender, age, race, search, drugs, duration, hour):
+    raw = {
+        "country": country, "gender": gender, "race": race,
+        "search": search, "drugs": drugs, "duration": duration, "hour": hour,
+    }
+    features = {f: normalize_value(f, v) for f, v in raw.items()}
+    features["age"] = age_bucket(age)
+    return features
+
+
+AGE_BINS = [-np.inf, 20, 30, 40, 50, 65, np.inf]
+AGE_LABELS = ["<20", "20-29", "30-39", "40-49", "50-64", "65+"]
+TRUE_VALUES = ["1", "1.0", "yes", "y", "true", "t"]
+
+
+def _text(series):
+    return series.astype("string").str.strip()
+
+
+def _flag(series):
+    flags = _text(series).str.lower().isin(TRUE_VALUES).map({True: "1", False: "0"})
+    return flags.where(series.notna(), "unknown")
+
+
+def _hour(series):
+    # TIME columns arrive as Timedelta (MySQL/Parquet) or "HH:MM[:SS]" text (CSV).
+    if pd.api.types.is_timedelta64_dtype(series.dtype):
+        hours = series.dt.components.hours
+    else:
+        hours = pd.to_numeric(_text(series).str.extract(r"^(\d{1,2}):", expand=False), errors="coerce")
+    return hours.astype("Int64").astype("string")
+
+
+def frame_features(df):
+    # Vectorized form_features() over rows in the traffic_project layout;
+    # produces the same spellings normalize_value() gives one stop.
+    gender = _text(df["driver_gender"])
+    age = pd.cut(pd.to_numeric(df["driver_age"], errors="coerce"), AGE_BINS, labels=AGE_LABELS, right=False)
+    features = pd.DataFrame({
+        "country": _text(df["country_name"]),
+        "gender": gender.str.lower().map(GENDERS).fillna(gender),
+        "age": age.astype("string").fillna("unknown"),
+        "race": _text(df["driver_race"]),
+        "search": _flag(df["search_conducted"]),
+        "drugs": _flag(df["drugs_related_stop"]),
+        "duration": _text(df["stop_duration"]),
+        "hour": _hour(df["stop_time"]),
+    }, index=df.index)
+    return features.fillna("unknown")
+
+
+# -------------------------------
+# TRAINING
+# -------------------------------
+def train(engine=None):
+    # Counts come from every tier: archived years are part of the history
+    # the model learns from.
+    model = {"version": 1, "trained_at": datetime.now().isoformat(timespec="seconds"), "targets": {}}
+    for target in TARGETS:
+        classes = {}
+        for df in read_tiers(
+            f"SELECT {target} AS label, COUNT(*) AS n FROM traffic_project "
+            f"WHERE {target} IS NOT NULL GROUP BY {target}",
+            engine, name=f"__train_{target}__",
+        ):
+            for label, n in df.itertuples(index=False):
+                classes[str(label)] = classes.get(str(label), 0) + int(n)
+        counts = {}
+        for feature, expr in FEATURE_SQL.items():
+            table = counts.setdefault(feature, {})
+            for df in read_tiers(
+                f"SELECT {target} AS label, {expr} AS value, COUNT(*) AS n FROM traffic_project "
+                f"WHERE {target} IS NOT NULL GROUP BY 1, 2",
+                engine, name=f"__train_{target}_{feature}__",
+            ):
+                for label, value, n in df.itertuples(index=False):
+                    key = value if feature == "age" else normalize_value(feature, value)
+                    per_label = table.setdefault(str(label), {})
+                    per_label[key] = per_label.get(key, 0) + int(n)
+        model["targets"][target] = {"classes": classes, "counts": counts}
+    model["rows"] = sum(model["targets"][TARGETS[0]]["classes"].values())
+    return model
+
+
+def save_model(model, path=MODEL_PATH):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(model, f)
+    os.replace(tmp, path)
+
+
+# -------------------------------
+# SCORING
+# -------------------------------
+class OutcomePredictor:
+    def __init__(self, model, alpha=1.0):
+        # Turn raw counts into log-probabilities once, at load time.
+        self.trained_at = model["trained_at"]
+        self.rows = model["rows"]
+        self._targets = {}
+        for target, spec in model["targets"].items():
+            classes = spec["classes"]
+            total = sum(classes.values())
+            priors = {c: math.log(n / total) for c, n in classes.items()}
+            likelihoods = {}
+            unseen = {}
+            for feature, per_label in spec["counts"].items():
+                values = {v for counts in per_label.values() for v in counts}
+                vocab = len(values) + 1
+                table = likelihoods.setdefault(feature, {})
+                unseen[feature] = {}
+                for c, n in classes.items():
+                    counts = per_label.get(c, {})
+                    denominator = n + alpha * vocab
+                    unseen[feature][c] = math.log(alpha / denominator)
+                    for value in values:
+                        table.setdefault(value, {})[c] = math.log((counts.get(value, 0) + alpha) / denominator)
+            self._targets[target] = (priors, likelihoods, unseen)
+
+    def predict_proba(self, target, features):
+        priors, likelihoods, unseen = self._targets[target]
+        scores = dict(priors)
+        for feature, value in features.items():
+            table = likelihoods.get(feature)
+            if table is None:
+                continue
+            per_class = table.get(value, unseen[feature])
+            for c in scores:
+                scores[c] += per_class.get(c, unseen[feature][c])
+        top = max(scores.values())
+        weights = {c: math.exp(s - top) for c, s in scores.items()}
+        norm = sum(weights.values())
+        return sorted(((c, w / norm) for c, w in weights.items()), key=lambda cw: cw[1], reverse=True)
+
+    def predict(self, features):
+        # {target: (label, probability)} for violation and stop_outcome.
+        return {target: self.predict_proba(target, features)[0] for target in self._targets}
+
+    def predict_frame(self, df):
+        # Scores a whole chunk at once: every feature column is factorized
+        # and its per-value log-likelihood rows gathered with one take().
+        features = frame_features(df)
+        out = pd.DataFrame(index=df.index)
+        for target, (priors, likelihoods, unseen) in self._targets.items():
+            classes = list(priors)
+            scores = np.tile(np.array([priors[c] for c in classes]), (len(df), 1))
+            for feature, table in likelihoods.items():
+                codes, values = pd.factorize(features[feature])
+                rows = np.array([
+                    [table.get(value, unseen[feature]).get(c, unseen[feature][c]) for c in classes]
+                    for value in values
+                ]).reshape(len(values), len(classes))
+                scores += rows[codes]
+            scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+            best = scores.argmax(axis=1)
+            out[f"predicted_{target}"] = pd.Categorical.from_codes(best, classes)
+            out[f"{target}_probability"] = (scores[np.arange(len(df)), best] / scores.sum(axis=1)).round(4)
+        return out
+
+
+_predictors = {}
+_predictor_lock = threading.Lock()
+
+
+def load_predictor(path=MODEL_PATH):
+    # Loaded once per process and model file; returns None until a model
+    # has been trained.
+    path = os.path.abspath(path)
+    predictor = _predictors.get(path)
+    if predictor is None:
+        with _predictor_lock:
+            predictor = _predictors.get(path)
+            if predictor is None and os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    predictor = _predictors[path] = OutcomePredictor(json.load(f))
+    return predictor
+
+
+# -------------------------------
+# COMMAND LINE
+# -------------------------------
+# python predictor.py train
+# python predictor.py predict --country India --gender M --age 28 --race Asian --hour 14
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train or query the stop outcome/violation model.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train_cmd = sub.add_parser("train")
+    train_cmd.add_argument("--out", default=MODEL_PATH)
+    predict_cmd = sub.add_parser("predict")
+    predict_cmd.add_argument("--model", default=MODEL_PATH)
+    for name, default in [("country", "India"), ("gender", "M"), ("race", "Asian"), ("search", "No"),
+                          ("drugs", "No"), ("duration", "0-15 Min")]:
+        predict_cmd.add_argument(f"--{name}", default=default)
+    predict_cmd.add_argument("--age", type=int, default=30)
+    predict_cmd.add_argument("--hour", type=int, default=12)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        model = train()
+        save_model(model, args.out)
+        print(f"Trained on {model['rows']:,} stops -> {args.out}")
+    else:
+        predictor = load_predictor(args.model)
+        if predictor is None:
+            raise SystemExit(f"No model at {args.model}; run 'python predictor.py train' first")
+        features = form_features(args.country, args.gender, args.age, args.race, args.search,
+                                 args.drugs, args.duration, args.hour)
+        for target, (label, prob) in predictor.predict(features).items():
+            print(f"{target}: {label} ({prob:.1%})")
@@ -0,0 +1,107 @@
+import statistics
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+
+# -------------------------------
+# QUERY PROFILER
+# -------------------------------
+# Rolling, process-wide history of DB calls made through db.read_sql():
+# execute (DB) time, fetch time, DataFrame build time, rows and bytes.
+class QueryProfiler:
+    def __init__(self, max_history=500):
+        self._history = deque(maxlen=max_history)
+        self._lock = threading.Lock()
+
+    def record(self, profile):
+        with self._lock:
+            self._history.append(profile)
+
+    def history(self, name=None):
+        with self._lock:
+            items = list(self._history)
+        if name is not None:
+            items = [p for p in items if p["name"] == name]
+        return items
+
+    def last(self, name):
+        items = self.history(name)
+        return items[-1] if items else None
+
+    def summary(self):
+        by_name = {}
+        for p in self.history():
+            if p["error"] is None:
+                by_name.setdefault(p["name"], []).append(p)
+        rows = []
+        for name, items in by_name.items():
+            walls = sorted(p["wall_s"] for p in items)
+            rows.append({
+                "name": name,
+                "calls": len(items),
+                "mean_s": round(statistics.fmean(walls), 4),
+                "p95_s": round(walls[min(int(len(walls) * 0.95), len(walls) - 1)], 4),
+                "max_s": round(walls[-1], 4),
+                "mean_db_s": round(statistics.fmean(p["db_s"] for p in items), 4),
+                "rows": items[-1]["rows"],
+                "bytes": items[-1]["bytes"],
+            })
+        return sorted(rows, key=lambda r: r["mean_s"], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._history.clear()
+
+
+profiler = QueryProfiler()
+
+
+class Stopwatch:
+    def __init__(self):
+        self.started_at = datetime.now()
+        self._start = self._last = time.perf_counter()
+        self.laps = {}
+
+    def lap(self, label):
+        now = time.perf_counter()
+        self.laps[label] = now - self._last
+        self._last = now
+
+    @property
+    def total(self):
+        return time.perf_counter() - self._start
+
+
+def make_profile(name, sql, watch, rows=0, nbytes=0, explain=None, error=None):
+    return {
+        "name": name or " ".join(sql.split())[:80],
+        "started_at": watch.started_at.strftime("%H:%M:%S"),
+        "wall_s": round(watch.total - watch.laps.get("explain", 0.0), 4),
+        "db_s": round(watch.laps.get("db", 0.0), 4),
+        "fetch_s": round(watch.laps.get("fetch", 0.0), 4),
+        "frame_s": round(watch.laps.get("frame", 0.0), 4),
+        "rows": rows,
+        "bytes": nbytes,
+        "explain": explain,
+        "error": error,
+        "sql": sql,
+    }
+
+
+# -------------------------------
+# EXPLAIN
+# -------------------------------
+# EXPLAIN ANALYZE executes the statement once more with per-step timings
+# (MySQL 8.0.18+, DuckDB); SQLite only has the static query plan.
+EXPLAIN_PREFIX = {"mysql": "EXPLAIN ANALYZE ", "duckdb": "EXPLAIN ANALYZE ", "sqlite": "EXPLAIN QUERY PLAN "}
+
+
+def explain_sql(sql, dialect):
+    prefix = EXPLAIN_PREFIX.get(dialect, "EXPLAIN ")
+    return prefix + sql.strip().rstrip(";")
+
+
+def format_explain(rows):
+    return "\n".join(" | ".join(str(v) for v in row) for row in rows)
@@ -0,0 +1,90 @@
+import threading
+from collections import OrderedDict
+
+from db import read_sql
+
+
+# -------------------------------
+# TABLE WATERMARK
+# -------------------------------
+# The newest id (and its created_at) moves on every insert, so it changes
+# exactly when new stops land. Reading the last row of the primary key is a
+# single index probe, unlike MAX(created_at) which has no index to use.
+WATERMARK_SQL = "SELECT id AS max_id, created_at AS max_created FROM traffic_project ORDER BY id DESC LIMIT 1;"
+
+
+def get_watermark(engine):
+    df = read_sql(WATERMARK_SQL, engine, name="__watermark__")
+    if df.empty:
+        return (0, "")
+    row = df.iloc[0]
+    return (int(row["max_id"]), str(row["max_created"]))
+
+
+# -------------------------------
+# LRU RESULT CACHE
+# -------------------------------
+class QueryCache:
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, name, watermark):
+        key = (name, watermark)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, name, watermark, value):
+        key = (name, watermark)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, name, watermark, loader):
+        value = self.get(name, watermark)
+        if value is None:
+            # Loading happens outside the lock so one slow GROUP BY does not
+            # block cache hits for every other session.
+            value = loader()
+            self.put(name, watermark, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+def cached_read_sql(cache, name, sql, engine, watermark=None, params=None, timeout=None):
+    if watermark is None:
+        watermark = get_watermark(engine)
+    # Bound parameters (e.g. a page cursor) are part of the cache key.
+    key = name if not params else (name, tuple(sorted((k, repr(v)) for k, v in params.items())))
+    # Hand each caller its own copy so a rerun that mutates the frame
+    # cannot corrupt the entry shared with other sessions.
+    return cache.get_or_load(
+        key, watermark, lambda: read_sql(sql, engine, params=params, name=name, timeout=timeout)
+    ).copy()
@@ -0,0 +1,342 @@
+import argparse
+import math
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from db import get_engine, read_sql
+from watermark import IdWatermark
+
+
+# -------------------------------
+# HASHING
+# -------------------------------
+# One 64-bit hash per value (pandas' vectorized SipHash with a fixed key, so
+# it is stable across processes). Count-Min derives its row positions from
+# the two halves; HyperLogLog splits it into register index and rank.
+def hash_values(values):
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+def _plates(series):
+    # vehicle_number as MySQL's GROUP BY sees it (case-insensitive, trailing
+    # spaces ignored); NULL and empty plates are dropped.
+    plates = series.astype("string").str.strip().str.upper()
+    return plates[plates.notna() & (plates != "")]
+
+
+# -------------------------------
+# COUNT-MIN HEAVY HITTERS
+# -------------------------------
+class HeavyHitters:
+    # Count-Min sketch with conservative update plus the `capacity` plates
+    # with the highest estimates. Estimates never undercount; with
+    # probability 1 - e^-depth each overcounts by at most e/width * total.
+    def __init__(self, width=2 ** 18, depth=4, capacity=1000):
+        self.width = width
+        self.depth = depth
+        self.capacity = capacity
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+        self.candidates = pd.Series(dtype="int64")
+
+    def _positions(self, hashes):
+        h1 = (hashes & 0xFFFFFFFF).astype(np.int64)
+        h2 = (hashes >> np.uint64(32)).astype(np.int64) | 1
+        return np.stack([(h1 + i * h2) % self.width for i in range(self.depth)])
+
+    def _estimate(self, positions):
+        return self.table[np.arange(self.depth)[:, None], positions].min(axis=0)
+
+    def update(self, plates):
+        # plates: the chunk's plates, one per counted stop.
+        counts = plates.value_counts()
+        if counts.empty:
+            return
+        positions = self._positions(hash_values(counts.index))
+        # Conservative update: raise each cell only as far as this plate's
+        # new estimate, which keeps collisions from piling up.
+        target = self._estimate(positions) + counts.to_numpy()
+        for row in range(self.depth):
+            np.maximum.at(self.table[row], positions[row], target)
+        self.total += int(counts.sum())
+        # A plate's estimate is complete as of its latest stop, so checking
+        # every plate seen in this chunk (and the current candidates) keeps
+        # the true heavy hitters.
+        keys = self.candidates.index.union(counts.index)
+        estimates = self._estimate(self._positions(hash_values(keys)))
+        self.candidates = pd.Series(estimates, index=keys).nlargest(self.capacity)
+
+    def error_bound(self):
+        return math.ceil(math.e / self.width * self.total)
+
+    def confidence(self):
+        return 1 - math.exp(-self.depth)
+
+    def top(self, k):
+        return self.candidates.head(k)
+
+    def nbytes(self):
+        return int(self.table.nbytes)
+
+
+# -------------------------------
+# HYPERLOGLOG DISTINCT COUNTS
+# -------------------------------
+class HyperLogLog:
+    # 2**precision one-byte registers; relative standard error 1.04/sqrt(m)
+    # (about 0.8% at precision 14). Registers merge with max, so one sketch
+    # per group can be combined into any roll-up.
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        if not len(hashes):
+            return
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.precision)) - 1)
+        # Rank = position of the leftmost 1 bit in the remaining 64-p bits;
+        # frexp gives floor(log2) exactly (the values fit in a double).
+        _, exponent = np.frexp(rest.astype(np.float64))
+        rank = np.where(rest == 0, 64 - self.precision + 1, 64 - self.precision - exponent + 1)
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)
+        return raw
+
+    def relative_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+
+# -------------------------------
+# RESERVOIR SAMPLE
+# -------------------------------
+class Reservoir:
+    # Uniform sample of up to `size` stops over everything seen so far
+    # (Algorithm R, applied a chunk at a time).
+    def __init__(self, size=100_000, seed=0):
+        self.size = size
+        self.seen = 0
+        self.sample = None
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, df):
+        # Held as plain objects: each chunk's categoricals have their own
+        # categories and could not be written into the sample's columns.
+        df = df.reset_index(drop=True).astype(object)
+        if self.sample is None:
+            self.sample = df.iloc[:0].copy()
+        fill = max(min(self.size - len(self.sample), len(df)), 0)
+        if fill:
+            self.sample = pd.concat([self.sample, df.iloc[:fill]], ignore_index=True)
+        rest = df.iloc[fill:]
+        if len(rest):
+            # Stop number i (0-based, over the whole stream) replaces a
+            # random slot with probability size / (i + 1).
+            numbers = self.seen + fill + np.arange(len(rest))
+            slots = (self._rng.random(len(rest)) * (numbers + 1)).astype(np.int64)
+            keep = slots < self.size
+            if keep.any():
+                # Later stops win when two pick the same slot, as they would
+                # one at a time.
+                slots, rows = slots[keep], np.flatnonzero(keep)
+                last = pd.Series(rows).groupby(slots).last()
+                self.sample.iloc[last.index.to_numpy()] = rest.iloc[last.to_numpy()].to_numpy()
+        self.seen += len(df)
+
+
+# -------------------------------
+# SKETCHES AT INGEST
+# -------------------------------
+# Built once from the table, then kept current by reading only the stops
+# past the last seen id and in the watermark's gaps (like
+# live.LiveAggregates), so approximate answers cost no table scan.
+SKETCH_COLUMNS = [
+    "id", "country_name", "violation", "driver_gender", "driver_race", "driver_age",
+    "stop_outcome", "search_conducted", "drugs_related_stop", "vehicle_number",
+]
+SKETCH_SQL = f"""
+    SELECT {', '.join(SKETCH_COLUMNS)}
+    FROM traffic_project
+    WHERE id > :last_id
+    ORDER BY id
+    LIMIT :limit
+"""
+SKETCH_GAP_SQL = f"SELECT {', '.join(SKETCH_COLUMNS)} FROM traffic_project WHERE {{gaps}} ORDER BY id"
+SAMPLE_COLUMNS = SKETCH_COLUMNS[1:-1]
+DISTINCT_BY = ["country_name", "violation"]
+
+
+class StopSketches:
+    def __init__(self, width=2 ** 18, depth=4, capacity=1000, precision=14, sample_size=100_000):
+        self.watermark = IdWatermark()
+        self.rows = 0
+        self.drug_plates = HeavyHitters(width, depth, capacity)
+        self.searched_plates = HeavyHitters(width, depth, capacity)
+        self.precision = precision
+        self.vehicles = HyperLogLog(precision)
+        self.vehicles_by = {by: {} for by in DISTINCT_BY}
+        self.sample = Reservoir(sample_size)
+        self._lock = threading.Lock()
+        # Held for a whole refresh: two sessions reading the same rows would
+        # add them twice to every sketch and void the error bounds.
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def last_id(self):
+        return self.watermark.last_id
+
+    def update(self, df):
+        plates = _plates(df["vehicle_number"])
+        self.drug_plates.update(plates[df.loc[plates.index, "drugs_related_stop"].fillna(0).astype(bool)])
+        self.searched_plates.update(plates[df.loc[plates.index, "search_conducted"].fillna(0).astype(bool)])
+        hashes = pd.Series(hash_values(plates), index=plates.index)
+        self.vehicles.add_hashes(hashes.to_numpy())
+        for by in DISTINCT_BY:
+            groups = df.loc[plates.index, by].astype("string").fillna("")
+            for value, group_hashes in hashes.groupby(groups.to_numpy()):
+                sketch = self.vehicles_by[by].setdefault(value, HyperLogLog(self.precision))
+                sketch.add_hashes(group_hashes.to_numpy())
+        self.sample.update(df[SAMPLE_COLUMNS])
+        self.rows += len(df)
+
+    def refresh(self, engine, chunk_size=200_000):
+        loaded = 0
+        with self._refresh_lock:
+            gap_filter, gap_params = self.watermark.gap_filter()
+            if gap_filter:
+                df = read_sql(SKETCH_GAP_SQL.format(gaps=gap_filter), engine, params=gap_params,
+                              name="__sketches__")
+                with self._lock:
+                    if not df.empty:
+                        self.update(df)
+                    self.watermark.fill(df["id"].tolist())
+                loaded += len(df)
+            while True:
+                df = read_sql(SKETCH_SQL, engine, params={"last_id": self.last_id, "limit": chunk_size},
+                              name="__sketches__")
+                if df.empty:
+                    break
+                with self._lock:
+                    self.update(df)
+                    self.watermark.advance(df["id"].tolist())
+                loaded += len(df)
+                if len(df) < chunk_size:
+                    break
+        return loaded
+
+    # Approximate answers -------------------------------------------------
+    def top_plates(self, kind="drug", k=10):
+        # Columns of the matching catalog query plus the error bound: the
+        # true count lies in [count - max_overcount, count].
+        sketch = self.drug_plates if kind == "drug" else self.searched_plates
+        column = "stop_count" if kind == "drug" else "search_count"
+        with self._lock:
+            top = sketch.top(k)
+            bound = sketch.error_bound()
+        return pd.DataFrame({
+            "vehicle_number": top.index.astype(str),
+            column: top.to_numpy(),
+            "max_overcount": bound,
+        })
+
+    def distinct_vehicles(self, by=None):
+        with self._lock:
+            if by is None:
+                sketches = {"all": self.vehicles}
+            else:
+                sketches = dict(self.vehicles_by[by])
+            rows = [(value or None, round(s.estimate())) for value, s in sketches.items()]
+            error = self.vehicles.relative_error()
+        df = pd.DataFrame(rows, columns=[by or "scope", "distinct_vehicles"])
+        df["error_pct_95"] = round(196 * error, 2)
+        return df.sort_values("distinct_vehicles", ascending=False, ignore_index=True)
+
+    def sample_rate(self, by, flag="arrest"):
+        # Percent of stops with the flag per group, from the reservoir, with
+        # a 95% normal-approximation interval.
+        with self._lock:
+            sample = self.sample.sample.copy() if self.sample.sample is not None else pd.DataFrame()
+            seen = self.sample.seen
+        if sample.empty:
+            return pd.DataFrame(columns=[by, "sample_stops", "rate_percent", "ci95_low", "ci95_high"])
+        if flag == "arrest":
+            hit = sample["stop_outcome"].astype("string") == "Arrest"
+        else:
+            hit = sample[flag].fillna(0).astype(bool)
+        grouped = hit.fillna(False).astype(int).groupby(sample[by].astype("string"))
+        n = grouped.size()
+        p = grouped.mean()
+        half = 1.96 * np.sqrt(p * (1 - p) / n)
+        df = pd.DataFrame({
+            "sample_stops": n,
+            "rate_percent": (p * 100).round(2),
+            "ci95_low": ((p - half).clip(lower=0) * 100).round(2),
+            "ci95_high": ((p + half).clip(upper=1) * 100).round(2),
+        }).rename_axis(by).reset_index()
+        df.attrs["population"] = seen
+        return df.sort_values("rate_percent", ascending=False, ignore_index=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rows": self.rows,
+                "last_id": self.last_id,
+                "sketch_bytes": self.drug_plates.nbytes() + self.searched_plates.nbytes()
+                + self.vehicles.m * (1 + sum(len(g) for g in self.vehicles_by.values())),
+                "sample_rows": 0 if self.sample.sample is None else len(self.sample.sample),
+            }
+
+
+# Catalog insights the sketches can answer, and how.
+APPROXIMATE_QUERIES = {
+    "Top 10 vehicles involved in drug-related stops": lambda s: s.top_plates("drug", 10),
+    "Vehicles most frequently searched": lambda s: s.top_plates("searched", 100),
+    "Top 5 Violations with Highest Arrest Rates": lambda s: s.sample_rate("violation").head(5),
+}
+
+
+# -------------------------------
+# COMMAND LINE
+# -------------------------------
+# python sketches.py      build the sketches and compare with exact answers
+if __name__ == "__main__":
+    from queries import queries
+
+    parser = argparse.ArgumentParser(description="Build the ingest sketches and compare them with exact queries.")
+    parser.add_argument("--width", type=int, default=2 ** 18)
+    parser.add_argument("--sample-size", type=int, default=100_000)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    sketches = StopSketches(width=args.width, sample_size=args.sample_size)
+    start = time.perf_counter()
+    sketches.refresh(engine)
+    print(f"Sketched {sketches.rows:,} stops in {time.perf_counter() - start:.1f}s: {sketches.stats()}")
+
+    for name, answer in APPROXIMATE_QUERIES.items():
+        start = time.perf_counter()
+        approx = answer(sketches)
+        approx_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        exact = read_sql(queries[name], engine, name=name)
+        exact_ms = (time.perf_counter() - start) * 1000
+        print(f"\n== {name}: approximate {approx_ms:.1f} ms, exact {exact_ms:.0f} ms")
+        print(approx.head(10).to_string(index=False))
+        print(exact.head(10).to_string(index=False))
+    print()
+    print(sketches.distinct_vehicles("country_name").to_string(index=False))
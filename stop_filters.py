@@ -0,0 +1,84 @@
+# -------------------------------
+# FORM FILTER QUERY
+# -------------------------------
+# The SQL form of the example/Traffic.py search (bitmap_search.py answers
+# the same criteria in memory), kept so the index advisor can replay the
+# predicate shapes the form generates and as a reference for the semantics.
+# Placeholders are "%s"; run it through db.driver_sql() for the backend.
+FORM_COLUMNS = [
+    "stop_date", "stop_time", "country_name", "driver_gender", "driver_age", "driver_race",
+    "violation", "search_conducted", "search_type",
+    "stop_outcome", "is_arrested", "stop_duration", "drugs_related_stop", "vehicle_number",
+]
+
+
+def build_stop_query(stop_date=None, stop_time=None, country_name=None, driver_gender=None,
+                     driver_age=0, driver_race=None, search_conducted=None, search_type=None,
+                     stop_duration=None, drugs_related_stop=None, vehicle_numbers=(), limit=1):
+    # Returns (query, values): (date OR time) AND the other filled-in fields,
+    # OR any of the entered vehicle numbers.
+    query = f"""
+            SELECT {', '.join(FORM_COLUMNS)}
+            FROM traffic_project
+        """
+
+    and_conditions = []
+    or_conditions = []
+    values = []
+
+    # Date OR Time inside parentheses
+    date_time_conditions = []
+    if stop_date:
+        date_time_conditions.append("stop_date=%s")
+        values.append(stop_date.isoformat())
+    if stop_time:
+        date_time_conditions.append("stop_time=%s")
+        values.append(stop_time.strftime("%H:%M:%S"))
+    if date_time_conditions:
+        and_conditions.append("(" + " OR ".join(date_time_conditions) + ")")
+
+    # Other AND conditions
+    for column, value in [("country_name", country_name), ("driver_gender", driver_gender),
+                          ("driver_race", driver_race)]:
+        if value:
+            and_conditions.append(f"{column}=%s")
+            values.append(value)
+    if driver_age != 0:
+        and_conditions.append("driver_age=%s")
+        values.append(driver_age)
+    if search_conducted:
+        and_conditions.append("search_conducted=%s")
+        values.append(1 if search_conducted == "Yes" else 0)
+    if search_type:
+        and_conditions.append("search_type=%s")
+        values.append(search_type)
+    if stop_duration:
+        and_conditions.append("stop_duration=%s")
+        values.append(stop_duration)
+    if drugs_related_stop:
+        and_conditions.append("drugs_related_stop=%s")
+        values.append(1 if drugs_related_stop == "Yes" else 0)
+
+    # Vehicle_number as OR condition outside
+    vehicle_list = [v.strip() for v in vehicle_numbers if v.strip()]
+    if vehicle_list:
+        placeholders = ", ".join(["%s"] * len(vehicle_list))
+        or_conditions.append(f"vehicle_number IN ({placeholders})")
+        values.extend(vehicle_list)
+
+    # Combine AND and OR conditions
+    all_conditions = ""
+    if and_conditions:
+        all_conditions += " AND ".join(and_conditions)
+    if or_conditions:
+        if all_conditions:
+            all_conditions = "(" + all_conditions + ") OR " + " OR ".join(or_conditions)
+        else:
+            all_conditions = " OR ".join(or_conditions)
+
+    if all_conditions:
+        query += " WHERE " + all_conditions
+
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    return query, values
@@ -0,0 +1,99 @@
+import argparse
+import csv
+import random
+from datetime import date, timedelta
+
+from bulk_load import LOAD_COLUMNS
+
+
+# -------------------------------
+# COLUMN DISTRIBUTIONS
+# -------------------------------
+# The vocabularies of the traffic_stops export the notebook loads (and of
+# Traffic.py's form). Its columns are drawn independently and evenly: violation
+# is not derived from violation_raw, is_arrested not from stop_outcome, and
+# search_type is set or blank whether or not a search was conducted.
+COUNTRIES = {"Canada": 1, "India": 1, "USA": 1}
+GENDERS = {"M": 1, "F": 1}
+RACES = {"Asian": 1, "Black": 1, "Hispanic": 1, "White": 1, "Other": 1}
+VIOLATIONS_RAW = {"Drunk Driving": 1, "Other": 1, "Signal Violation": 1, "Speeding": 1, "Seatbelt": 1}
+VIOLATIONS = {"Speeding": 1, "Other": 1, "DUI": 1}
+OUTCOMES = {"Ticket": 1, "Warning": 1, "Arrest": 1}
+DURATIONS = {"0-15 Min": 1, "16-30 Min": 1, "30+ Min": 1}
+SEARCH_TYPES = {"Vehicle Search": 1, "Frisk": 1, "": 1}
+MIN_AGE, MAX_AGE = 18, 80
+
+LETTERS = "ABCDEFGHJKLMNPRSTUVWXYZ"
+INDIA_STATES = ["TN", "KA", "KL", "MH", "DL", "AP", "TS", "GJ"]
+
+
+def _weighted(rng, table):
+    return rng.choices(list(table), list(table.values()))[0]
+
+
+def make_plate(index, country):
+    # Deterministic per (index, country) so a reused plate keeps its format.
+    rng = random.Random(index * 31 + len(country))
+    letters = "".join(rng.choice(LETTERS) for _ in range(4))
+    if country == "India":
+        return f"{rng.choice(INDIA_STATES)}{rng.randint(1, 99):02d}{letters[:2]}{rng.randint(0, 9999):04d}"
+    if country == "Canada":
+        return f"{letters}{rng.randint(100, 999)}"
+    return f"{rng.randint(1, 9)}{letters[:3]}{rng.randint(100, 999)}"
+
+
+# -------------------------------
+# ROW GENERATOR
+# -------------------------------
+def generate_rows(n, seed=42, start=date(2020, 1, 1), days=5 * 365, plates_per_stop=0.4, plate_skew=3.0):
+    rng = random.Random(seed)
+    n_plates = max(int(n * plates_per_stop), 1)
+    for _ in range(n):
+        country = _weighted(rng, COUNTRIES)
+        age = rng.randint(MIN_AGE, MAX_AGE)
+        # Power-law plate reuse: low indices are drawn far more often, so a
+        # few plates collect many stops and most appear once.
+        plate_index = int(n_plates * rng.random() ** plate_skew)
+
+        yield {
+            "stop_date": (start + timedelta(days=rng.randrange(days))).isoformat(),
+            "stop_time": f"{rng.randrange(24):02d}:{rng.randrange(60):02d}:00",
+            "country_name": country,
+            "driver_gender": _weighted(rng, GENDERS),
+            "driver_age_raw": age,
+            "driver_age": age,
+            "driver_race": _weighted(rng, RACES),
+            "violation_raw": _weighted(rng, VIOLATIONS_RAW),
+            "violation": _weighted(rng, VIOLATIONS),
+            "search_conducted": rng.random() < 0.5,
+            "search_type": _weighted(rng, SEARCH_TYPES),
+            "stop_outcome": _weighted(rng, OUTCOMES),
+            "is_arrested": rng.random() < 0.5,
+            "stop_duration": _weighted(rng, DURATIONS),
+            "drugs_related_stop": rng.random() < 0.5,
+            "vehicle_number": make_plate(plate_index, country),
+        }
+
+
+def write_csv(path, n, seed=42, **kw):
+    columns = LOAD_COLUMNS[:4] + ["driver_age_raw"] + LOAD_COLUMNS[4:]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        for row in generate_rows(n, seed, **kw):
+            writer.writerow(row)
+    return path
+
+
+# -------------------------------
+# COMMAND LINE
+# -------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic traffic stops in the notebook's CSV layout.")
+    parser.add_argument("csv_path")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    write_csv(args.csv_path, args.rows, args.seed)
+    print(f"Wrote {args.rows:,} rows to {args.csv_path}")
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, text
+
+# The modules live at the repository root rather than in a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import reset_schema  # noqa: E402
+
+
+@pytest.fixture
+def sqlite_url(tmp_path):
+    # Empty traffic_project (scratch schema from benchmark.py) in a file
+    # database, so several engines/connections see the same rows.
+    url = f"sqlite:///{tmp_path / 'traffic.db'}"
+    engine = create_engine(url)
+    reset_schema(engine)
+    engine.dispose()
+    return url
+
+
+@pytest.fixture
+def sqlite_engine(sqlite_url):
+    engine = create_engine(sqlite_url)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def insert_stops(sqlite_engine):
+    # insert_stops(3, 1, 2, plate=...) writes minimal stops with explicit
+    # ids, in the given order.
+    def insert(*ids, plate="TN01AB1234", stop_date="2024-05-01"):
+        with sqlite_engine.begin() as conn:
+            conn.execute(
+                text("INSERT INTO traffic_project (id, stop_date, violation, stop_outcome, search_conducted, "
+                     "drugs_related_stop, vehicle_number) "
+                     "VALUES (:id, :d, 'Speeding', 'Citation', 0, 0, :v)"),
+                [{"id": i, "d": stop_date, "v": plate} for i in ids],
+            )
+    return insert
@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import text
+
+from bitmap_search import IntBitmap, StopSearchIndex, make_bitmap
+from bulk_load import load_csv
+from synth import write_csv
+
+
+@pytest.fixture
+def loaded_engine(tmp_path, sqlite_url, sqlite_engine):
+    path = write_csv(str(tmp_path / "stops.csv"), 2000)
+    load_csv(path, url=sqlite_url, workers=1, log=lambda msg: None)
+    return sqlite_engine
+
+
+def _matching_ids(engine, where, params):
+    with engine.connect() as conn:
+        return {r[0] for r in conn.execute(text(f"SELECT id FROM traffic_project WHERE {where}"), params)}
+
+
+def _plates(engine):
+    with engine.connect() as conn:
+        return [r[0] for r in conn.execute(text("SELECT DISTINCT vehicle_number FROM traffic_project LIMIT 5"))]
+
+
+def test_int_bitmap_ops():
+    a = IntBitmap.from_positions([1, 3, 64, 200])
+    b = IntBitmap.from_positions([3, 200, 201])
+    assert (a & b).to_array().tolist() == [3, 200]
+    assert (a | b).to_array().tolist() == [1, 3, 64, 200, 201]
+    assert len(a) == 4
+    assert len(IntBitmap.from_positions([])) == 0
+
+
+def test_search_matches_sql(loaded_engine):
+    index = StopSearchIndex()
+    index.refresh(loaded_engine)
+
+    result = index.search(country_name="india", driver_gender="F", search_conducted="No")
+    expected = _matching_ids(
+        loaded_engine, "country_name = 'India' AND driver_gender = 'F' AND search_conducted = 0", {},
+    )
+    assert set(index.page_ids(result, 1, 10_000).tolist()) == expected
+
+    plate = _plates(loaded_engine)[0]
+    result = index.search(driver_race="Asian", vehicle_numbers=[plate.lower()])
+    expected = _matching_ids(loaded_engine, "driver_race = 'Asian' OR vehicle_number = :v", {"v": plate})
+    assert set(index.page_ids(result, 1, 10_000).tolist()) == expected
+
+
+def test_results_do_not_change_when_the_index_grows(loaded_engine):
+    index = StopSearchIndex()
+    index.refresh(loaded_engine)
+    with loaded_engine.connect() as conn:
+        country = conn.execute(text("SELECT country_name FROM traffic_project LIMIT 1")).scalar()
+    result = index.search(country_name=country)
+    before = len(result)
+
+    with loaded_engine.begin() as conn:
+        conn.execute(text("INSERT INTO traffic_project (stop_date, country_name) VALUES ('2024-01-01', :c)"),
+                     {"c": country})
+    index.refresh(loaded_engine)
+
+    assert len(result) == before
+    assert len(index.search(country_name=country)) == before + 1
+
+
+def test_concurrent_refreshes_index_each_row_once(loaded_engine):
+    index = StopSearchIndex()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda _: index.refresh(loaded_engine, chunk_size=100), range(6)))
+    assert index.rows == 2000
+    assert len(index.search()) == 2000
+    assert len(make_bitmap()) == 0
@@ -0,0 +1,115 @@
+import csv
+
+from sqlalchemy import create_engine, text
+
+from bulk_load import LOAD_COLUMNS, completed_batches, iter_batches, load_csv
+from synth import write_csv
+
+
+def _count(url, sql):
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        value = conn.execute(text(sql)).scalar()
+    engine.dispose()
+    return value
+
+
+def test_load_csv_sqlite(tmp_path, sqlite_url):
+    path = write_csv(str(tmp_path / "stops.csv"), 250)
+    loaded = load_csv(path, url=sqlite_url, batch_size=40, workers=1, log=lambda msg: None)
+
+    assert loaded == 250
+    assert _count(sqlite_url, "SELECT COUNT(*) FROM traffic_project") == 250
+    assert _count(sqlite_url, "SELECT COUNT(*) FROM traffic_load_batches") == 7
+
+
+def test_load_csv_resumes_committed_batches(tmp_path, sqlite_url):
+    path = write_csv(str(tmp_path / "stops.csv"), 100)
+    engine = create_engine(sqlite_url)
+    # Pretend a previous run committed the first two batches before crashing.
+    done = completed_batches(engine, "resume-test")
+    assert done == set()
+    batches = list(iter_batches(path, 30))
+    with engine.begin() as conn:
+        for batch_no, rows, _ in batches[:2]:
+            conn.execute(text(
+                "INSERT INTO traffic_load_batches (load_name, batch_no, rows_loaded) VALUES (:n, :b, :r)"
+            ), {"n": "resume-test", "b": batch_no, "r": len(rows)})
+    engine.dispose()
+
+    messages = []
+    loaded = load_csv(path, url=sqlite_url, batch_size=30, workers=1, load_name="resume-test", log=messages.append)
+
+    assert loaded == 40
+    assert messages[0] == "Resuming 'resume-test': 2 batches already committed"
+    assert _count(sqlite_url, "SELECT COUNT(*) FROM traffic_project") == 40
+
+
+def test_resume_keeps_the_interrupted_batch_size(tmp_path, sqlite_url):
+    # Batches 0-1 of 30 rows were committed; resuming with --batch-size 40
+    # must not skip rows 60-79 (batch 1 of 40) or replay rows 30-59.
+    path = write_csv(str(tmp_path / "stops.csv"), 100)
+    engine = create_engine(sqlite_url)
+    completed_batches(engine, "resize-test")
+    with engine.begin() as conn:
+        for batch_no, rows, _ in list(iter_batches(path, 30))[:2]:
+            conn.execute(text(
+                "INSERT INTO traffic_load_batches (load_name, batch_no, rows_loaded, batch_size) "
+                "VALUES (:n, :b, :r, 30)"
+            ), {"n": "resize-test", "b": batch_no, "r": len(rows)})
+    engine.dispose()
+
+    messages = []
+    loaded = load_csv(path, url=sqlite_url, batch_size=40, workers=1, load_name="resize-test", log=messages.append)
+
+    assert loaded == 40
+    assert messages[1] == "Using its batch size of 30 rows instead of 40"
+    assert _count(sqlite_url, "SELECT COUNT(*) FROM traffic_load_batches WHERE batch_size = 30") == 4
+
+def test_checkpoint_table_without_rows_rejected_is_upgraded(sqlite_url):
+    engine = create_engine(sqlite_url)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE traffic_load_batches (load_name VARCHAR(255) NOT NULL, batch_no INT NOT NULL, "
+            "rows_loaded INT NOT NULL, loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, "
+            "PRIMARY KEY (load_name, batch_no))"
+        ))
+    completed_batches(engine, "old")
+    with engine.connect() as conn:
+        columns = [r[1] for r in conn.execute(text("PRAGMA table_info(traffic_load_batches)"))]
+    engine.dispose()
+    assert "rows_rejected" in columns
+
+
+def test_rows_without_stop_date_are_rejected(tmp_path, sqlite_url):
+    path = tmp_path / "stops.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=LOAD_COLUMNS)
+        writer.writeheader()
+        for i, stop_date in enumerate(["2021-03-01", "", "not a date", "03/04/2021"]):
+            writer.writerow({"stop_date": stop_date, "vehicle_number": f"P{i}"})
+
+    messages = []
+    loaded = load_csv(str(path), url=sqlite_url, batch_size=3, workers=1, log=messages.append)
+
+    assert loaded == 2
+    assert _count(sqlite_url, "SELECT SUM(rows_rejected) FROM traffic_load_batches") == 2
+    assert messages[-1] == "Rejected (no parseable stop_date), CSV lines: 3, 4"
+
+
+def test_rejected_line_report_is_bounded(tmp_path, sqlite_url):
+    path = tmp_path / "stops.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=LOAD_COLUMNS)
+        writer.writeheader()
+        for i in range(50):
+            writer.writerow({"stop_date": "", "vehicle_number": f"P{i}"})
+
+    messages = []
+    load_csv(str(path), url=sqlite_url, batch_size=7, workers=1, log=messages.append)
+
+    assert messages[-2].endswith("50 rows rejected")
+    assert messages[-1] == (
+        "Rejected (no parseable stop_date), CSV lines: "
+        + ", ".join(str(n) for n in range(2, 22)) + " and 30 more"
+    )
@@ -0,0 +1,84 @@
+import pandas as pd
+
+from cleaning import clean_age, clean_date, clean_time, clean_violation, concat_clean, normalize_violation, read_clean_csv
+
+
+def test_all_blank_column_parses_to_missing_values():
+    blank = pd.Series([None, None, None], dtype=object)
+    dates = clean_date(blank)
+    assert pd.api.types.is_datetime64_dtype(dates.dtype) and dates.isna().all()
+    times = clean_time(blank)
+    assert pd.api.types.is_timedelta64_dtype(times.dtype) and times.isna().all()
+
+
+def test_chunk_with_a_blank_column(tmp_path):
+    # The second chunk has no stop_time and no driver_age at all.
+    path = tmp_path / "stops.csv"
+    pd.DataFrame({
+        "stop_date": ["2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05"],
+        "stop_time": ["10:30", "11:00", "", ""],
+        "country_name": ["India", "Canada", "India", "USA"],
+        "driver_gender": ["M", "female", "F", "M"],
+        "driver_age": ["30", "41", "", ""],
+        "driver_race": ["Asian", "White", "Asian", "Black"],
+        "violation_raw": ["Speeding", "Seatbelt", "DUI", "Speeding"],
+        "search_conducted": ["1", "0", "no", "yes"],
+        "search_type": ["", "Frisk", "", ""],
+        "stop_outcome": ["Citation", "Warning", "Arrest", "Citation"],
+        "is_arrested": ["0", "0", "1", "0"],
+        "stop_duration": ["0-15 Min"] * 4,
+        "drugs_related_stop": ["0"] * 4,
+        "vehicle_number": ["TN01", "TN02", "TN03", "TN04"],
+    }).to_csv(path, index=False)
+
+    df = read_clean_csv(path, chunk_size=2)
+    assert len(df) == 4
+    assert df["stop_time"].isna().tolist() == [False, False, True, True]
+    assert df["driver_age"].tolist()[:2] == [30, 41] and df["driver_age"].isna().tolist()[2:] == [True, True]
+    assert df["driver_gender"].tolist() == ["M", "F", "F", "M"]
+    assert df["search_conducted"].tolist() == [True, False, False, True]
+
+
+def test_violation_spellings():
+    assert normalize_violation("Speeding") == "Speeding"
+    assert normalize_violation(" drunk driving ") == "DUI"
+    assert normalize_violation("Signal Violation") == "Other"
+    assert normalize_violation("Seatbelt") == "Other"
+    assert normalize_violation("Driving while impaired") == "DUI"
+    assert normalize_violation("Something else") is None
+    assert normalize_violation(float("nan")) is None
+
+
+def test_violation_keeps_the_export_labels():
+    # The export's violation does not follow violation_raw; only missing or
+    # unknown labels are filled, and no new categories appear.
+    df = pd.DataFrame({"violation_raw": ["Drunk Driving", "Seatbelt", "Drunk Driving", "Speeding", None],
+                       "violation": ["Speeding", "DUI", None, "bogus", None]})
+    violation = clean_violation(df)
+    assert violation.astype(object).where(violation.notna(), None).tolist() == \
+        ["Speeding", "DUI", "DUI", "Speeding", None]
+    assert violation.cat.categories.tolist() == ["Speeding", "Other", "DUI"]
+
+
+def test_age_raw_is_an_age_unless_it_is_a_birth_year():
+    df = pd.DataFrame({"driver_age": [None, None, None, 40], "driver_age_raw": ["59", "1990", "300", "25"]})
+    age = clean_age(df, pd.Series(pd.to_datetime(["2020-01-01"] * 4)))
+    assert age.astype(object).where(age.notna(), None).tolist() == [59, 30, None, 40]
+
+
+def test_dates_and_times_in_mixed_formats():
+    dates = clean_date(pd.Series(["2024-01-02", "01/03/2024", "not a date", None]))
+    assert dates.dt.strftime("%Y-%m-%d").tolist()[:2] == ["2024-01-02", "2024-01-03"]
+    assert dates.isna().tolist() == [False, False, True, True]
+    times = clean_time(pd.Series(["9:05", "23:59:59", "bad"]))
+    assert times.tolist()[:2] == [pd.Timedelta("09:05:00"), pd.Timedelta("23:59:59")]
+    assert pd.isna(times.iloc[2])
+
+
+def test_concat_keeps_categoricals_with_different_categories():
+    frames = [pd.DataFrame({"country_name": ["India"], "violation_raw": ["Speeding"], "stop_outcome": ["Arrest"]}),
+              pd.DataFrame({"country_name": ["Canada"], "violation_raw": ["DUI"], "stop_outcome": ["Warning"]})]
+    frames = [f.astype("category") for f in frames]
+    df = concat_clean(frames)
+    assert isinstance(df["country_name"].dtype, pd.CategoricalDtype)
+    assert df["country_name"].tolist() == ["India", "Canada"]
@@ -0,0 +1,40 @@
+import json
+import re
+
+import pytest
+
+from cube import CUBE_DDL, CUBE_TABLES, cube_queries, cube_supported, insight_sql, rebuild_cube
+from queries import queries
+
+# Folding (refresh_cube vs rebuild_cube) needs MySQL's ON DUPLICATE KEY
+# UPDATE and locking reads, so only the catalog wiring is checked here.
+
+
+def test_every_catalog_query_has_a_cube_version():
+    assert set(cube_queries) == set(queries)
+
+
+def test_cube_queries_read_only_cube_tables():
+    for name, sql in cube_queries.items():
+        tables = set(re.findall(r"\b(?:FROM|JOIN)\s+(\w+)", sql, re.IGNORECASE))
+        assert tables <= set(CUBE_TABLES), name
+
+
+def test_rebuild_truncates_every_cube_table():
+    # Everything CUBE_DDL creates except the watermark row, which
+    # rebuild_cube resets instead.
+    created = {m for ddl in CUBE_DDL for m in re.findall(r"CREATE TABLE IF NOT EXISTS (\w+)", ddl)}
+    assert created - {"traffic_cube_state"} == set(CUBE_TABLES)
+
+
+def test_fact_table_fallback(sqlite_engine):
+    assert not cube_supported(sqlite_engine)
+    name = next(iter(queries))
+    assert insight_sql(name, use_cube=False) == queries[name]
+    assert insight_sql(name) == cube_queries[name]
+
+
+def test_rebuild_refuses_once_years_are_archived(tmp_path, sqlite_engine):
+    (tmp_path / "manifest.json").write_text(json.dumps({"files": [{"partition": "p2019", "state": "done"}]}))
+    with pytest.raises(RuntimeError, match="archived stops"):
+        rebuild_cube(sqlite_engine, archive_dir=str(tmp_path))
@@ -0,0 +1,28 @@
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+from index_advisor import used_indexes
+
+
+def _mysql_row(**columns):
+    return SimpleNamespace(_mapping=columns)
+
+
+def test_mysql_plan_credits_only_the_chosen_key():
+    rows = [
+        _mysql_row(table="traffic_project", possible_keys="idx_tp_country_name,idx_tp_violation",
+                   key="idx_tp_violation"),
+        _mysql_row(table="traffic_project", possible_keys="idx_tp_driver_age", key=None),
+        _mysql_row(table="traffic_project", possible_keys="idx_tp_a,idx_tp_b", key="idx_tp_a,idx_tp_b"),
+    ]
+    assert used_indexes(rows, "mysql") == {"idx_tp_violation", "idx_tp_a", "idx_tp_b"}
+
+
+def test_sqlite_plan_indexes(sqlite_engine):
+    with sqlite_engine.begin() as conn:
+        conn.execute(text("CREATE INDEX idx_tp_violation ON traffic_project (violation)"))
+        conn.execute(text("CREATE INDEX idx_tp_country_name ON traffic_project (country_name)"))
+        plan = conn.execute(text("EXPLAIN QUERY PLAN SELECT COUNT(*) FROM traffic_project "
+                                 "WHERE violation = 'Speeding'")).fetchall()
+    assert used_indexes(plan, "sqlite") == {"idx_tp_violation"}
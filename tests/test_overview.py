@@ -0,0 +1,39 @@
+import time
+
+import pytest
+
+from db import read_sql
+from overview import run_concurrently
+
+SLOW_SQL = ("WITH RECURSIVE r(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM r WHERE x < 1000000000) "
+            "SELECT COUNT(*) AS n FROM r")
+
+
+def test_read_sql_timeout_aborts_the_query(sqlite_engine):
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        read_sql(SLOW_SQL, sqlite_engine, timeout=0.2)
+    assert time.perf_counter() - start < 5
+    # The connection went back to the pool usable.
+    assert read_sql("SELECT 1 AS one", sqlite_engine, timeout=5)["one"].tolist() == [1]
+    assert sqlite_engine.pool.checkedout() == 0
+
+
+def test_queued_queries_get_their_own_timeout():
+    # One worker: each task waits behind the previous ones, but only its
+    # own running time counts against the timeout.
+    def sleep(seconds):
+        return lambda: time.sleep(seconds) or seconds
+
+    results = {name: error for name, _, error, _ in
+               run_concurrently({"a": sleep(0.2), "b": sleep(0.2), "c": sleep(0.2), "slow": sleep(2)},
+                                max_workers=1, timeout=0.5)}
+    assert results == {"a": None, "b": None, "c": None, "slow": "timed out after 0.5s"}
+
+
+def test_run_concurrently_reports_errors_per_task():
+    def fail():
+        raise ValueError("boom")
+
+    results = {name: (df, error) for name, df, error, _ in run_concurrently({"ok": lambda: 1, "bad": fail})}
+    assert results == {"ok": (1, None), "bad": (None, "boom")}
@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from benchmark import reset_schema
+from bulk_load import load_csv
+from db import read_sql
+from pagination import PAGINATION_KEYS, estimate_rows, next_cursor, page_sql
+from queries import queries
+from synth import write_csv
+
+
+@pytest.fixture(scope="module")
+def loaded_engine(tmp_path_factory):
+    # 3,000 synthetic stops (with the usual NULLs), loaded once for every
+    # catalog query below.
+    tmp = tmp_path_factory.mktemp("pagination")
+    url = f"sqlite:///{tmp / 'traffic.db'}"
+    engine = create_engine(url)
+    reset_schema(engine)
+    load_csv(write_csv(str(tmp / "stops.csv"), 3_000), url=url, workers=1, log=lambda msg: None)
+    yield engine
+    engine.dispose()
+
+
+def _pages(sql, keys, engine, page_size):
+    pages, cursor = [], None
+    while True:
+        statement, params = page_sql(sql, keys, cursor, page_size)
+        page = read_sql(statement, engine, params=params)
+        pages.append(page)
+        if len(page) < page_size:
+            return pages
+        cursor = next_cursor(page, keys)
+
+
+def _key_rows(df, columns):
+    keys = df[columns].astype(object)
+    return sorted(map(repr, keys.where(keys.notna(), None).itertuples(index=False)))
+
+
+@pytest.mark.parametrize("name", sorted(PAGINATION_KEYS))
+def test_keyset_pages_cover_the_result_once(loaded_engine, name):
+    keys = PAGINATION_KEYS[name]
+    full = read_sql(queries[name], loaded_engine)
+    # About 20 pages whatever the result size, with a partial last page.
+    pages = _pages(queries[name], keys, loaded_engine, page_size=max(len(full) // 20, 1) + 1)
+    paged = pd.concat(pages, ignore_index=True)
+    key_columns = [c for c, _ in keys]
+    assert len(paged) == len(full)
+    assert not paged.duplicated(key_columns).any()
+    assert _key_rows(paged, key_columns) == _key_rows(full, key_columns)
+    assert estimate_rows(queries[name], loaded_engine) == (len(full), True)
+
+
+def test_null_keys_sort_first_ascending_and_last_descending(sqlite_engine, insert_stops):
+    insert_stops(1, 2, plate=None)
+    insert_stops(3, plate="A")
+    insert_stops(4, plate="B")
+    sql = "SELECT id, vehicle_number FROM traffic_project"
+    asc = pd.concat(_pages(sql, [("vehicle_number", "ASC"), ("id", "ASC")], sqlite_engine, 1))
+    assert asc["id"].tolist() == [1, 2, 3, 4]
+    desc = pd.concat(_pages(sql, [("vehicle_number", "DESC"), ("id", "ASC")], sqlite_engine, 1))
+    assert desc["id"].tolist() == [4, 3, 1, 2]
+
+
+def test_next_cursor_of_an_empty_page():
+    assert next_cursor(pd.DataFrame({"a": []}), [("a", "ASC")]) is None
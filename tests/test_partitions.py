@@ -0,0 +1,71 @@
+from datetime import date, time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from db import read_sql
+from partitions import _union_engine, referenced_columns, scope_table, table_schema
+
+
+def _chunk(ids, keys, search_types, ages):
+    return pd.DataFrame({
+        "id": ids,
+        "stop_date": [date(2019, 6, 1)] * len(ids),
+        "stop_time": [time(10, 30)] * len(ids),
+        "driver_age": ages,
+        "search_type": search_types,
+        "idempotency_key": keys,
+    })
+
+
+# First chunk: idempotency_key / search_type all NULL, driver_age with a NULL.
+CHUNKS = [
+    _chunk([1, 2], [None, None], [None, None], [float("nan"), 30.0]),
+    _chunk([3, 4], ["k-3", None], ["Frisk", None], [40.0, 41.0]),
+]
+
+
+def test_chunks_with_all_null_columns_share_one_schema(tmp_path):
+    path = tmp_path / "archive.parquet"
+    writer = None
+    for df in CHUNKS:
+        schema = table_schema(list(df.columns))
+        writer = writer or pq.ParquetWriter(path, schema, compression="zstd")
+        writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+    writer.close()
+
+    table = pq.read_table(path)
+    assert table.schema.field("idempotency_key").type == pa.string()
+    assert table.schema.field("driver_age").type == pa.int16()
+    assert table.column("search_type").to_pylist() == [None, None, "Frisk", None]
+
+
+def test_union_engine_types_hot_rows_from_the_table(tmp_path):
+    path = str(tmp_path / "cold.parquet")
+    pq.write_table(pa.Table.from_pandas(CHUNKS[1], schema=table_schema(list(CHUNKS[1].columns)),
+                                        preserve_index=False), path)
+    hot = [CHUNKS[0].assign(id=[11, 12]), CHUNKS[1].assign(id=[13, 14])]
+    engine = _union_engine([path], iter(hot), list(CHUNKS[0].columns))
+    try:
+        df = read_sql("SELECT COUNT(*) AS n, COUNT(idempotency_key) AS keyed, SUM(driver_age) AS ages "
+                      "FROM traffic_project", engine)
+    finally:
+        engine.dispose()
+    assert df.iloc[0].tolist() == [6, 2, 192]
+
+
+def test_scope_table_bounds_every_reference():
+    sql, params = scope_table("SELECT COUNT(*) FROM traffic_project t JOIN traffic_project ON 1=1",
+                              date(2020, 1, 1), None)
+    assert sql.count("(SELECT * FROM traffic_project WHERE stop_date >= :range_start)") == 2
+    assert " AS t JOIN" in sql
+    assert params == {"range_start": date(2020, 1, 1)}
+    assert scope_table("SELECT 1 FROM traffic_project") == ("SELECT 1 FROM traffic_project", {})
+
+
+def test_referenced_columns():
+    assert referenced_columns("SELECT country_name, COUNT(*) FROM traffic_project GROUP BY country_name") == [
+        "id", "country_name",
+    ]
+    assert "idempotency_key" in referenced_columns("SELECT * FROM traffic_project")
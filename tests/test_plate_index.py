@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from plate_index import BloomFilter, PlateIndex, parse_plates
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000)
+    keys = [f"KEY{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"OTHER{i}" in bloom for i in range(10_000))
+    assert false_positives < 300
+
+
+def test_lookup_is_case_and_space_insensitive(sqlite_engine, insert_stops):
+    insert_stops(1, 2, plate="ka05mn0001 ")
+    index = PlateIndex()
+    index.refresh(sqlite_engine)
+
+    assert [r["id"] for r in index.lookup(" KA05MN0001")] == [2, 1]
+    assert index.lookup_many("KA05MN0001, NOPE") == {
+        "KA05MN0001": index.lookup("KA05MN0001"), "NOPE": [],
+    }
+    assert parse_plates(" a, ,b ") == ["a", "b"]
+
+
+def test_concurrent_refreshes_add_each_row_once(sqlite_engine, insert_stops):
+    insert_stops(*range(1, 201))
+    index = PlateIndex(history=500)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda _: index.refresh(sqlite_engine, chunk_size=10), range(8)))
+
+    assert len(index.lookup("TN01AB1234")) == 200
+    assert index.last_id == 200
@@ -0,0 +1,61 @@
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import text
+
+import predictor
+from batch_score import score_file
+
+
+def _model(engine, path, ids, outcome):
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM traffic_project"))
+        conn.execute(
+            text("INSERT INTO traffic_project (id, stop_date, stop_time, country_name, driver_gender, driver_age, "
+                 "violation, stop_outcome, search_conducted, drugs_related_stop) "
+                 "VALUES (:id, '2024-05-01', '10:30:00', 'India', 'M', 30, 'Speeding', :outcome, 0, 0)"),
+            [{"id": i, "outcome": outcome} for i in ids],
+        )
+    predictor.save_model(predictor.train(engine), str(path))
+
+
+def test_predictors_are_cached_per_model_file(tmp_path, sqlite_engine):
+    _model(sqlite_engine, tmp_path / "a.json", [1, 2], "Citation")
+    _model(sqlite_engine, tmp_path / "b.json", [3, 4, 5], "Arrest")
+    a = predictor.load_predictor(str(tmp_path / "a.json"))
+    b = predictor.load_predictor(str(tmp_path / "b.json"))
+    assert (a.rows, b.rows) == (2, 3)
+    assert predictor.load_predictor(str(tmp_path / "a.json")) is a
+    assert predictor.load_predictor(str(tmp_path / "missing.json")) is None
+
+
+def test_score_file_keeps_input_order(tmp_path, sqlite_engine):
+    model_path = tmp_path / "model.json"
+    _model(sqlite_engine, model_path, [1, 2, 3], "Citation")
+    stops = pd.DataFrame({"id": range(1, 101), "stop_date": "2024-05-01", "stop_time": "10:30:00",
+                          "country_name": "India", "driver_gender": "M", "driver_age": "30", "driver_race": "Asian",
+                          "search_conducted": "0", "drugs_related_stop": "0", "stop_duration": "0-15 Min"})
+    stops.to_csv(tmp_path / "stops.csv", index=False)
+    scored = score_file(str(tmp_path / "stops.csv"), str(tmp_path / "out.csv"), str(model_path), chunk_size=7,
+                        workers=2, log=lambda msg: None)
+    assert scored == 100
+    out = pd.read_csv(tmp_path / "out.csv")
+    assert out["id"].tolist() == list(range(1, 101))
+    assert (out["predicted_stop_outcome"] == "Citation").all()
+
+
+def test_parquet_output_with_a_column_blank_in_the_first_chunk(tmp_path, sqlite_engine):
+    # A chunk of Parquet input whose dates are all missing reaches pandas as
+    # object None values, which Arrow types as null.
+    model_path = tmp_path / "model.json"
+    _model(sqlite_engine, model_path, [1, 2, 3], "Citation")
+    stops = pd.DataFrame({"id": range(1, 21), "stop_date": [None] * 10 + [date(2024, 5, 1)] * 10,
+                          "stop_time": "10:30:00", "country_name": "India", "driver_gender": "M", "driver_age": 30,
+                          "driver_race": "Asian", "search_conducted": 0, "drugs_related_stop": 0,
+                          "stop_duration": "0-15 Min"})
+    stops.to_parquet(tmp_path / "stops.parquet", index=False)
+    scored = score_file(str(tmp_path / "stops.parquet"), str(tmp_path / "out.parquet"), str(model_path),
+                        chunk_size=10, workers=1, log=lambda msg: None)
+    assert scored == 20
+    out = pd.read_parquet(tmp_path / "out.parquet")
+    assert out["stop_date"].isna().sum() == 10 and out["stop_date"].iloc[-1] == "2024-05-01"
@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from sketches import HeavyHitters, HyperLogLog, Reservoir, StopSketches
+
+
+def test_heavy_hitters_never_undercount_and_stay_within_bound():
+    rng = np.random.default_rng(1)
+    plates = pd.Series([f"P{int(i)}" for i in rng.zipf(1.5, 50_000) % 5000])
+    sketch = HeavyHitters(width=2 ** 10, depth=4, capacity=50)
+    for start in range(0, len(plates), 10_000):
+        sketch.update(plates.iloc[start:start + 10_000])
+
+    exact = plates.value_counts()
+    top = sketch.top(10)
+    assert list(top.index[:3]) == list(exact.index[:3])
+    for plate, estimate in top.items():
+        assert exact[plate] <= estimate <= exact[plate] + sketch.error_bound()
+
+
+def test_hyperloglog_estimate_within_error_and_merges():
+    first, second = HyperLogLog(12), HyperLogLog(12)
+    first.add_hashes(pd.util.hash_array(np.array([f"A{i}" for i in range(30_000)], dtype=object)))
+    second.add_hashes(pd.util.hash_array(np.array([f"A{i}" for i in range(20_000, 50_000)], dtype=object)))
+    first.merge(second)
+    assert abs(first.estimate() - 50_000) / 50_000 < 4 * first.relative_error()
+
+
+def test_small_cardinality_uses_linear_counting():
+    sketch = HyperLogLog(14)
+    sketch.add_hashes(pd.util.hash_array(np.array([f"V{i}" for i in range(100)], dtype=object)))
+    assert round(sketch.estimate()) in range(97, 104)
+
+
+def test_reservoir_is_bounded_and_counts_everything():
+    reservoir = Reservoir(size=100, seed=3)
+    for start in range(0, 1000, 250):
+        reservoir.update(pd.DataFrame({"n": range(start, start + 250)}))
+    assert reservoir.seen == 1000
+    assert len(reservoir.sample) == 100
+    assert reservoir.sample["n"].nunique() == 100
+    # A uniform sample of 0..999 should not sit in the first chunk.
+    assert reservoir.sample["n"].max() >= 250
+
+
+def test_concurrent_refreshes_count_each_stop_once(sqlite_engine, insert_stops):
+    insert_stops(*range(1, 301))
+    sketches = StopSketches(width=2 ** 10, precision=10, sample_size=50)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda _: sketches.refresh(sqlite_engine, chunk_size=25), range(6)))
+
+    assert sketches.rows == 300
+    assert sketches.sample.seen == 300
+    assert sketches.distinct_vehicles()["distinct_vehicles"].tolist() == [1]
@@ -0,0 +1,90 @@
+import gzip
+import io
+import json
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy import text
+
+import charts
+import predictor
+from export import count_stops, export_stops
+from insight_defs import Filters, run_insights
+from partitions import archive_files, read_tiers, table_schema
+
+
+@pytest.fixture
+def archive(tmp_path, sqlite_engine, insert_stops, monkeypatch):
+    # 2019 stops (ids 1-3) archived the way archive_partition leaves them:
+    # in a "done" Parquet file and gone from traffic_project, which keeps
+    # the 2024 stops (ids 4-5).
+    insert_stops(1, 2, 3, stop_date="2019-06-01")
+    insert_stops(4, 5, stop_date="2024-05-01")
+    df = pd.read_sql(text("SELECT * FROM traffic_project WHERE id <= 3 ORDER BY id"), sqlite_engine)
+    df["stop_date"] = pd.to_datetime(df["stop_date"]).dt.date
+    df["created_at"] = pd.to_datetime(df["created_at"])
+    archive_dir = tmp_path / "archive"
+    archive_dir.mkdir()
+    schema = table_schema(list(df.columns))
+    pq.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False),
+                   archive_dir / "traffic_project_p2019_000.parquet")
+    manifest = {"files": [{"partition": "p2019", "file": "traffic_project_p2019_000.parquet",
+                           "start": "2019-01-01", "end": "2020-01-01", "rows": 3, "state": "done"}]}
+    (archive_dir / "manifest.json").write_text(json.dumps(manifest))
+    with sqlite_engine.begin() as conn:
+        conn.execute(text("DELETE FROM traffic_project WHERE id <= 3"))
+    # ARCHIVE_DIR is relative: code that uses the default reads this one.
+    monkeypatch.chdir(tmp_path)
+    return str(archive_dir)
+
+
+def test_archive_files_by_date_range(archive):
+    assert len(archive_files(archive_dir=archive)) == 1
+    assert len(archive_files("2019-06-01", "2019-07-01", archive)) == 1
+    assert archive_files(date(2024, 1, 1), None, archive) == []
+
+
+def test_read_tiers_runs_on_both_tiers(archive, sqlite_engine):
+    frames = read_tiers("SELECT COUNT(*) AS n FROM traffic_project", sqlite_engine, archive_dir=archive)
+    assert [int(df["n"].iloc[0]) for df in frames] == [2, 3]
+    frames = read_tiers("SELECT COUNT(*) AS n FROM traffic_project", sqlite_engine, start=date(2024, 1, 1),
+                        archive_dir=archive)
+    assert len(frames) == 1
+
+
+def test_filtered_insights_include_archived_stops(archive, sqlite_engine):
+    name = "Gender distribution of drivers stopped in each country"
+    assert int(run_insights([name], None, sqlite_engine)[name]["total_stops"].sum()) == 5
+    only_2019 = Filters(start=date(2019, 1, 1), end=date(2020, 1, 1))
+    assert int(run_insights([name], only_2019, sqlite_engine)[name]["total_stops"].sum()) == 3
+
+
+def test_charts_include_archived_years(archive, sqlite_engine):
+    df, grain = charts.stops_over_time(sqlite_engine)
+    assert grain == "month"
+    assert df.groupby(df["period"].dt.year)["stops"].sum().to_dict() == {2019: 3, 2024: 2}
+    counts = charts.violation_counts(sqlite_engine)
+    assert counts.set_index("violation")["count"].to_dict() == {"Speeding": 5}
+
+
+def test_stop_export_streams_archived_then_hot_stops(archive, sqlite_engine):
+    assert count_stops(None, sqlite_engine) == (5, True)
+    out = io.BytesIO()
+    stats = export_stops(None, out, "csv.gz", sqlite_engine, chunk_size=2)
+    assert stats["rows"] == 5
+    exported = pd.read_csv(io.BytesIO(gzip.decompress(out.getvalue())))
+    assert exported["id"].tolist() == [1, 2, 3, 4, 5]
+
+    recent = Filters(start=date(2024, 1, 1))
+    assert count_stops(recent, sqlite_engine) == (2, True)
+    out = io.BytesIO()
+    assert export_stops(recent, out, "csv.gz", sqlite_engine)["rows"] == 2
+
+
+def test_training_counts_archived_stops(archive, sqlite_engine):
+    model = predictor.train(sqlite_engine)
+    assert model["rows"] == 5
+    assert model["targets"]["stop_outcome"]["classes"] == {"Citation": 5}
@@ -0,0 +1,60 @@
+from live import LiveAggregates
+from plate_index import PlateIndex
+from watermark import IdWatermark, find_gaps
+
+
+def test_find_gaps():
+    assert find_gaps([2, 3, 7], 0, 7) == [(1, 1), (4, 6)]
+    assert find_gaps([2, 3], 1, 6) == [(4, 6)]
+    assert find_gaps([], 5, 8) == [(6, 8)]
+    assert find_gaps([1, 2, 3], 0, 3) == []
+
+
+def test_fill_splits_gaps_and_keeps_their_age():
+    watermark = IdWatermark()
+    watermark.advance([1, 10], now=100.0)
+    assert watermark.gaps == {(2, 9): 100.0}
+
+    watermark.fill([4, 5])
+    assert watermark.gaps == {(2, 3): 100.0, (6, 9): 100.0}
+    assert watermark.last_id == 10
+
+    watermark.expire(now=100.0 + watermark.ttl + 1)
+    assert watermark.gaps == {}
+    assert watermark.gap_filter() == (None, {})
+
+
+def test_gap_count_is_capped():
+    watermark = IdWatermark(max_gaps=2)
+    watermark.advance([2], now=1.0)
+    watermark.advance([4], now=2.0)
+    watermark.advance([6], now=3.0)
+    assert sorted(watermark.gaps) == [(3, 3), (5, 5)]
+
+
+def test_live_folds_rows_that_commit_below_the_watermark(sqlite_engine, insert_stops):
+    live = LiveAggregates()
+    insert_stops(1, 2, 4)
+    assert live.poll(sqlite_engine) == 3
+    assert live.last_id == 4
+
+    # id 3 commits after id 4 was already folded.
+    insert_stops(3)
+    insert_stops(5)
+    assert live.poll(sqlite_engine) == 2
+    assert live.snapshot()["totals"]["stops"] == 5
+    assert live.watermark.gaps == {}
+    assert live.poll(sqlite_engine) == 0
+
+
+def test_plate_index_keeps_late_rows_in_id_order(sqlite_engine, insert_stops):
+    index = PlateIndex(history=2)
+    insert_stops(1, 4)
+    index.refresh(sqlite_engine)
+    insert_stops(3)
+    insert_stops(2, plate=None)
+    index.refresh(sqlite_engine)
+
+    assert [r["id"] for r in index.lookup("tn01ab1234")] == [4, 3]
+    assert index.watermark.gaps == {}
+
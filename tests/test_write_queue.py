@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import text
+
+from bulk_load import LOAD_COLUMNS
+from write_queue import StopWriter
+
+
+def _record(plate, **values):
+    return {**dict.fromkeys(LOAD_COLUMNS), "stop_date": "2025-06-01", "vehicle_number": plate, **values}
+
+
+def _plates(engine):
+    with engine.connect() as conn:
+        return sorted(r[0] for r in conn.execute(text("SELECT vehicle_number FROM traffic_project")))
+
+
+@pytest.fixture
+def writer(sqlite_engine):
+    # A long max_delay so every submission below lands in one batch.
+    writer = StopWriter(sqlite_engine, max_delay=0.2)
+    yield writer
+    writer.close()
+
+
+def test_duplicate_keys_are_reported_and_stored_once(writer, sqlite_engine):
+    first = writer.submit(_record("A"), "k1").result()
+    futures = [writer.submit(_record("A"), "k1"), writer.submit(_record("B"), "k2"),
+               writer.submit(_record("C"))]
+    assert first["status"] == "inserted"
+    assert [f.result()["status"] for f in futures] == ["duplicate", "inserted", "inserted"]
+    assert _plates(sqlite_engine) == ["A", "B", "C"]
+
+
+def test_key_committed_after_the_check_is_a_duplicate(writer, sqlite_engine):
+    # Another process commits k1 between the batch's key check and its
+    # INSERT: the row is reported as a duplicate, the rest go in.
+    with sqlite_engine.begin() as conn:
+        conn.execute(text("INSERT INTO traffic_project (stop_date, vehicle_number, idempotency_key) "
+                          "VALUES ('2025-06-01', 'OTHER', 'k1')"))
+    check = writer._existing_keys
+    calls = []
+
+    def stale_check(conn, keys):
+        calls.append(keys)
+        return set() if len(calls) == 1 else check(conn, keys)
+
+    writer._existing_keys = stale_check
+    futures = [writer.submit(_record("A"), "k1"), writer.submit(_record("B"), "k2")]
+    assert [f.result()["status"] for f in futures] == ["duplicate", "inserted"]
+    assert _plates(sqlite_engine) == ["B", "OTHER"]
+    assert writer.stats()["duplicates"] == 1 and writer.stats()["rows"] == 1
+
+
+def test_bad_row_fails_alone(writer, sqlite_engine):
+    futures = [writer.submit(_record("A"), "k1"), writer.submit(_record("B", driver_age=object()), "k2"),
+               writer.submit(_record("C"), "k3")]
+    assert futures[0].result()["status"] == "inserted"
+    assert futures[2].result()["status"] == "inserted"
+    with pytest.raises(Exception):
+        futures[1].result()
+    assert _plates(sqlite_engine) == ["A", "C"]
+    assert writer.stats()["failures"] == 1
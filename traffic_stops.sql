@@ -3,9 +3,13 @@ USE vehicle;
 SHOW TABLES;
   
 DROP TABLE IF EXISTS traffic_project;
+-- Range-partitioned by stop_date (one partition per year) so date-bounded
+-- queries only read the matching partitions, and cold years can be moved to
+-- Parquet with partitions.py. MySQL requires the partitioning
+-- column in every unique key, hence the (id, stop_date) primary key.
 CREATE TABLE traffic_project (
-  id BIGINT AUTO_INCREMENT PRIMARY KEY,
-  stop_date DATE,
+  id BIGINT AUTO_INCREMENT,
+  stop_date DATE NOT NULL,
   stop_time TIME,
   country_name VARCHAR(100),
   driver_gender VARCHAR(20),
@@ -20,7 +24,22 @@ CREATE TABLE traffic_project (
   stop_duration VARCHAR(30),
   drugs_related_stop TINYINT(1),
   vehicle_number VARCHAR(50),
-  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  -- Set by write_queue.py so a double-submitted log is stored once.
+  idempotency_key VARCHAR(64),
+  PRIMARY KEY (id, stop_date),
+  UNIQUE KEY uq_idempotency (idempotency_key, stop_date)
+)
+PARTITION BY RANGE COLUMNS (stop_date) (
+  PARTITION p_history VALUES LESS THAN ('2020-01-01'),
+  PARTITION p2020 VALUES LESS THAN ('2021-01-01'),
+  PARTITION p2021 VALUES LESS THAN ('2022-01-01'),
+  PARTITION p2022 VALUES LESS THAN ('2023-01-01'),
+  PARTITION p2023 VALUES LESS THAN ('2024-01-01'),
+  PARTITION p2024 VALUES LESS THAN ('2025-01-01'),
+  PARTITION p2025 VALUES LESS THAN ('2026-01-01'),
+  PARTITION p2026 VALUES LESS THAN ('2027-01-01'),
+  PARTITION p_future VALUES LESS THAN (MAXVALUE)
 );
 SHOW TABLES;
 DESCRIBE traffic_project;
@@ -0,0 +1,86 @@
+import os
+from decimal import Decimal
+
+import pandas as pd
+
+try:
+    import connectorx
+except ImportError:  # optional: Arrow-native MySQL reads
+    connectorx = None
+
+# connectorx opens a new MySQL connection for every read, outside the pool
+# and its size limit, so it is opt-in (TRAFFIC_CONNECTORX=1): the connect
+# cost pays off on large results (exports, full-table reads), not on the
+# dashboard's small aggregates, which stay on pooled connections.
+USE_CONNECTORX = os.environ.get("TRAFFIC_CONNECTORX", "0") == "1"
+
+
+# -------------------------------
+# ARROW-NATIVE FETCH
+# -------------------------------
+# Both paths hand back a pyarrow.Table built column by column in native
+# code, instead of a Python tuple (and object) per value through the DBAPI
+# cursor. Returns None when the backend/driver cannot do it, and the
+# caller falls back to the cursor.
+def fetch_arrow(result):
+    # DuckDB cursors can return the executed result as Arrow directly
+    # (fetch_arrow_table() on DuckDB releases without to_arrow_table()).
+    cursor = result.cursor
+    if hasattr(cursor, "to_arrow_table"):
+        return cursor.to_arrow_table()
+    if hasattr(cursor, "fetch_arrow_table"):
+        return cursor.fetch_arrow_table()
+    return None
+
+
+def read_arrow_mysql(engine, statement, params=None):
+    # connectorx only takes literal SQL, so parameterized statements (page
+    # cursors) keep using the pooled connection.
+    if connectorx is None or not USE_CONNECTORX or params or engine.dialect.name != "mysql":
+        return None
+    url = engine.url.set(drivername="mysql").render_as_string(hide_password=False)
+    return connectorx.read_sql(url, statement, return_type="arrow")
+
+
+# -------------------------------
+# COMPACT DTYPES
+# -------------------------------
+# Low-cardinality text columns in traffic_project (and the labels the
+# insight queries derive from them) become categoricals: one small integer
+# code per row instead of one Python str object.
+CATEGORY_COLUMNS = {
+    "country_name", "violation", "violation_raw", "driver_gender", "driver_race", "race",
+    "stop_outcome", "stop_duration", "search_type", "age_group", "time_of_day",
+}
+
+
+def _decimal_to_number(series):
+    # MySQL returns SUM()/ROUND()/AVG() as DECIMAL -> Python Decimal objects.
+    numbers = series.astype("float64")
+    return pd.to_numeric(numbers, downcast="integer") if numbers.notna().all() else numbers
+
+
+def compact_frame(df):
+    for col in df.columns:
+        series = df[col]
+        if col in CATEGORY_COLUMNS and not isinstance(series.dtype, pd.CategoricalDtype):
+            df[col] = series.astype("category")
+        elif series.dtype == object:
+            sample = series.dropna()
+            if not sample.empty and isinstance(sample.iloc[0], Decimal):
+                df[col] = _decimal_to_number(series)
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            # Counts fit comfortably in 32 bits; going narrower would risk
+            # overflow in later arithmetic (rates, chart scaling).
+            df[col] = series.astype("int32") if series.abs().max() < 2**31 else series
+        if pd.api.types.is_integer_dtype(df[col].dtype) and df[col].dtype.itemsize < 4:
+            df[col] = df[col].astype("int32")
+    return df
+
+
+def arrow_to_frame(table):
+    return compact_frame(table.to_pandas())
+
+
+def records_to_frame(rows, columns):
+    return compact_frame(pd.DataFrame.from_records(rows, columns=columns))
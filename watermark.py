@@ -0,0 +1,95 @@
+import time
+from bisect import bisect_left, bisect_right
+
+
+# -------------------------------
+# ID WATERMARK WITH GAPS
+# -------------------------------
+# Everything that tails traffic_project by id (cube, live monitor, plate
+# index, sketches, bitmap search) reads "id > last_id". Ids do not become
+# visible in id order: parallel bulk_load workers and concurrent group-commit
+# writers commit out of order, so a row can appear below the watermark after
+# the watermark passed it. Every id skipped on the way is kept as a gap and
+# re-read on the next refresh. Gaps that stay empty for GAP_TTL seconds
+# (rolled back inserts, ids burned by duplicate keys) are dropped.
+GAP_TTL = 600
+MAX_GAPS = 1000
+
+
+def find_gaps(ids, lo, hi):
+    # Inclusive (first, last) ranges of the ids in (lo, hi] missing from the
+    # ascending ids.
+    gaps = []
+    prev = lo
+    for i in ids:
+        i = int(i)
+        if i > prev + 1:
+            gaps.append((prev + 1, i - 1))
+        prev = i
+    if hi > prev:
+        gaps.append((prev + 1, hi))
+    return gaps
+
+
+class IdWatermark:
+    def __init__(self, last_id=0, ttl=GAP_TTL, max_gaps=MAX_GAPS):
+        self.last_id = last_id
+        self.ttl = ttl
+        self.max_gaps = max_gaps
+        # (first, last) -> time the gap was first seen
+        self.gaps = {}
+
+    def advance(self, ids, hi=None, now=None):
+        # ids: ascending ids read past last_id. The watermark moves to hi
+        # (default: the last of them) and every id skipped becomes a gap.
+        if hi is None:
+            if not len(ids):
+                return
+            hi = ids[-1]
+        hi = int(hi)
+        if hi <= self.last_id:
+            return
+        now = time.monotonic() if now is None else now
+        for gap in find_gaps(ids, self.last_id, hi):
+            self.gaps[gap] = now
+        self.last_id = hi
+        if len(self.gaps) > self.max_gaps:
+            # Oldest first: the rows most likely never to arrive.
+            for gap in sorted(self.gaps, key=self.gaps.get)[:len(self.gaps) - self.max_gaps]:
+                del self.gaps[gap]
+
+    def add_gaps(self, gaps, now=None):
+        # Gaps inherited from another consumer (e.g. the cube a seed read).
+        now = time.monotonic() if now is None else now
+        for first, last in gaps:
+            self.gaps[(int(first), int(last))] = now
+
+    def fill(self, ids):
+        # ids: ascending ids found inside the gaps; what is left of each gap
+        # stays open with its original age.
+        ids = [int(i) for i in ids]
+        for (first, last), seen in list(self.gaps.items()):
+            inside = ids[bisect_left(ids, first):bisect_right(ids, last)]
+            if inside:
+                del self.gaps[(first, last)]
+                for gap in find_gaps(inside, first - 1, last):
+                    self.gaps[gap] = seen
+
+    def expire(self, now=None):
+        now = time.monotonic() if now is None else now
+        for gap, seen in list(self.gaps.items()):
+            if now - seen > self.ttl:
+                del self.gaps[gap]
+
+    def gap_filter(self):
+        # SQL predicate on id matching the open gaps, with its parameters;
+        # None when there is nothing to re-check.
+        self.expire()
+        if not self.gaps:
+            return None, {}
+        terms, params = [], {}
+        for n, (first, last) in enumerate(sorted(self.gaps)):
+            terms.append(f"id BETWEEN :gap_first_{n} AND :gap_last_{n}")
+            params[f"gap_first_{n}"] = first
+            params[f"gap_last_{n}"] = last
+        return f"({' OR '.join(terms)})", params
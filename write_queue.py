@@ -0,0 +1,338 @@
+import argparse
+import hashlib
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from bulk_load import LOAD_COLUMNS
+from db import get_engine
+
+
+# -------------------------------
+# IDEMPOTENCY KEY COLUMN
+# -------------------------------
+# traffic_project.idempotency_key is unique per stop_date (MySQL wants the
+# partitioning column in every unique key). Bulk loads leave it NULL, and
+# NULLs never collide.
+WRITE_COLUMNS = LOAD_COLUMNS + ["idempotency_key"]
+KEY_DDL = {
+    "mysql": [
+        "ALTER TABLE traffic_project ADD COLUMN idempotency_key VARCHAR(64) NULL",
+        "ALTER TABLE traffic_project ADD UNIQUE KEY uq_idempotency (idempotency_key, stop_date)",
+    ],
+    "sqlite": [
+        "ALTER TABLE traffic_project ADD COLUMN idempotency_key TEXT",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_idempotency ON traffic_project (idempotency_key, stop_date)",
+    ],
+}
+KEY_COLUMN_SQL = {
+    "mysql": """
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'traffic_project' AND COLUMN_NAME = 'idempotency_key'
+    """,
+    "sqlite": "SELECT COUNT(*) FROM pragma_table_info('traffic_project') WHERE name = 'idempotency_key'",
+}
+
+
+def ensure_key_column(engine):
+    # Adds the column and unique key to a table created before they were in
+    # traffic_stops.sql.
+    dialect = engine.dialect.name
+    if dialect not in KEY_DDL:
+        return
+    with engine.begin() as conn:
+        if conn.execute(text(KEY_COLUMN_SQL[dialect])).scalar():
+            return
+        for ddl in KEY_DDL[dialect]:
+            conn.execute(text(ddl))
+
+
+def record_key(record, scope=""):
+    # Content key for callers without their own request ids: the same
+    # record submitted twice under the same scope (e.g. a browser session)
+    # is stored once.
+    payload = "|".join([scope] + ["" if record.get(c) is None else str(record.get(c)) for c in LOAD_COLUMNS])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:40]
+
+
+def form_record(stop_date, stop_time, country_name, driver_gender, driver_age, driver_race,
+                search_conducted, search_type, drugs_related_stop, stop_duration, vehicle_number):
+    # The "Add New Police Log" form as a traffic_project row. The form does
+    # not collect the violation or outcome, so those stay NULL.
+    record = dict.fromkeys(LOAD_COLUMNS)
+    record.update(
+        stop_date=stop_date.isoformat(),
+        stop_time=stop_time.strftime("%H:%M:%S"),
+        country_name=country_name,
+        driver_gender=driver_gender,
+        driver_age=int(driver_age),
+        driver_race=(driver_race or "").strip() or None,
+        search_conducted=1 if search_conducted == "Yes" else 0,
+        # Same default the notebook applies with fillna("other").
+        search_type=(search_type or "").strip() or "other",
+        stop_duration=stop_duration,
+        drugs_related_stop=1 if drugs_related_stop == "Yes" else 0,
+        vehicle_number=(vehicle_number or "").strip().upper() or None,
+    )
+    return record
+
+
+# -------------------------------
+# GROUP-COMMIT WRITER
+# -------------------------------
+class StopWriter:
+    # Submissions from any thread go into one queue. A single writer thread
+    # takes whatever has arrived, up to max_batch rows or max_delay seconds
+    # after the first one, and commits it as one multi-row INSERT; every
+    # caller gets a Future resolving to {"key", "status"} with status
+    # "inserted" or "duplicate".
+    def __init__(self, engine=None, max_batch=500, max_delay=0.005, dedupe_ttl=600.0):
+        self.engine = engine or get_engine()
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.dedupe_ttl = dedupe_ttl
+        self._queue = queue.Queue()
+        self._recent = {}
+        self._recent_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self.duplicates = 0
+        self.failures = 0
+        self.commit_time = 0.0
+        self.max_batch_seen = 0
+        ensure_key_column(self.engine)
+        self._insert = text(
+            f"INSERT INTO traffic_project ({', '.join(WRITE_COLUMNS)}) "
+            f"VALUES ({', '.join(':' + c for c in WRITE_COLUMNS)})"
+        )
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="stop-writer", daemon=True)
+        self._thread.start()
+
+    # Callers -----------------------------------------------------------
+    def submit(self, record, key=None):
+        if self._closed:
+            raise RuntimeError("StopWriter is closed")
+        row = {c: record.get(c) for c in LOAD_COLUMNS}
+        row["idempotency_key"] = key
+        future = Future()
+        if key is not None:
+            # A key seen within dedupe_ttl (double click, client retry) is
+            # answered by the first submission without touching the queue.
+            now = time.monotonic()
+            with self._recent_lock:
+                if len(self._recent) > 10_000:
+                    self._recent = {k: v for k, v in self._recent.items() if v[0] > now}
+                seen = self._recent.get(key)
+                if seen and seen[0] > now:
+                    seen[1].add_done_callback(lambda first: self._as_duplicate(first, future))
+                    return future
+                self._recent[key] = (now + self.dedupe_ttl, future)
+            future.add_done_callback(lambda f: self._forget_failed(key, f))
+        self._queue.put((row, future))
+        return future
+
+    def submit_many(self, records, keys=None):
+        keys = keys or [None] * len(records)
+        return [self.submit(record, key) for record, key in zip(records, keys)]
+
+    def _as_duplicate(self, first, future):
+        with self._stats_lock:
+            self.duplicates += 1
+        if first.exception() is not None:
+            future.set_exception(first.exception())
+        else:
+            future.set_result({**first.result(), "status": "duplicate"})
+
+    def _forget_failed(self, key, future):
+        # A failed write may be retried with the same key.
+        if future.exception() is not None:
+            with self._recent_lock:
+                if self._recent.get(key, (0, None))[1] is future:
+                    del self._recent[key]
+
+    # Writer thread -----------------------------------------------------
+    def _next_batch(self):
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _existing_keys(self, conn, keys):
+        if not keys:
+            return set()
+        params = {f"k{i}": key for i, key in enumerate(keys)}
+        rows = conn.execute(
+            text(f"SELECT idempotency_key FROM traffic_project "
+                 f"WHERE idempotency_key IN ({', '.join(':' + k for k in params)})"),
+            params,
+        ).fetchall()
+        return {r[0] for r in rows}
+
+    def _commit(self, batch):
+        # Keys already in the table (a retry after a restart, or another
+        # app process) are reported as duplicates. A plain INSERT, so a key
+        # landing between that check and the insert (or any bad row) fails
+        # the batch instead of being dropped and reported as inserted.
+        with self.engine.begin() as conn:
+            existing = self._existing_keys(conn, [r["idempotency_key"] for r, _ in batch if r["idempotency_key"]])
+            fresh, seen = [], set()
+            for row, future in batch:
+                key = row["idempotency_key"]
+                if key in existing or (key is not None and key in seen):
+                    continue
+                seen.add(key)
+                fresh.append(row)
+            if fresh:
+                # A list of parameter sets goes out as multi-row INSERTs
+                # (pymysql rewrites executemany).
+                conn.execute(self._insert, fresh)
+        return existing
+
+    def _commit_one(self, row, future):
+        # A row whose key another writer committed after the check fails
+        # the unique key; the second attempt's check reports it as a
+        # duplicate. Any other bad row fails both times.
+        try:
+            return self._commit([(row, future)])
+        except IntegrityError:
+            return self._commit([(row, future)])
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            start = time.perf_counter()
+            failed = {}
+            try:
+                existing = self._commit(batch)
+            except Exception:
+                # One bad row must not fail everyone else's submission:
+                # retry the batch row by row and fail only the rows that
+                # still do not go in.
+                existing = set()
+                for row, future in batch:
+                    try:
+                        existing |= self._commit_one(row, future)
+                    except Exception as e:
+                        failed[id(future)] = e
+            elapsed = time.perf_counter() - start
+            inserted = duplicates = 0
+            keys_done = set()
+            for row, future in batch:
+                key = row["idempotency_key"]
+                if id(future) in failed:
+                    future.set_exception(failed[id(future)])
+                    continue
+                duplicate = key is not None and (key in existing or key in keys_done)
+                keys_done.add(key)
+                inserted += not duplicate
+                duplicates += duplicate
+                future.set_result({"key": key, "status": "duplicate" if duplicate else "inserted"})
+            with self._stats_lock:
+                self.batches += 1
+                self.rows += inserted
+                self.duplicates += duplicates
+                self.failures += len(failed)
+                self.commit_time += elapsed
+                self.max_batch_seen = max(self.max_batch_seen, len(batch))
+
+    # Lifecycle -----------------------------------------------------------
+    def close(self, timeout=10.0):
+        # Writes everything already queued, then stops the writer thread.
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queued": self._queue.qsize(),
+                "batches": self.batches,
+                "rows": self.rows,
+                "duplicates": self.duplicates,
+                "failures": self.failures,
+                "avg_batch": round(self.rows / self.batches, 1) if self.batches else 0.0,
+                "max_batch": self.max_batch_seen,
+                "avg_commit_ms": round(self.commit_time / self.batches * 1000, 2) if self.batches else 0.0,
+            }
+
+
+# -------------------------------
+# COMMAND LINE
+# -------------------------------
+# python write_queue.py --url sqlite:////tmp/writes.db --officers 200 --per-officer 20
+# Concurrent "officers" submitting one stop at a time, group-committed
+# versus one INSERT transaction per stop.
+if __name__ == "__main__":
+    from benchmark import reset_schema
+    from db import create_pooled_engine
+
+    parser = argparse.ArgumentParser(description="Compare group-committed and per-row stop inserts.")
+    parser.add_argument("--url", required=True, help="scratch database (its traffic_project is recreated)")
+    parser.add_argument("--officers", type=int, default=200, help="concurrent submitting threads")
+    parser.add_argument("--per-officer", type=int, default=20)
+    parser.add_argument("--max-batch", type=int, default=500)
+    parser.add_argument("--max-delay-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    engine = create_pooled_engine(args.url)
+    total = args.officers * args.per_officer
+
+    def make_record(officer, n):
+        return {
+            **dict.fromkeys(LOAD_COLUMNS),
+            "stop_date": "2025-06-01", "stop_time": f"{n % 24:02d}:{officer % 60:02d}:00",
+            "country_name": "India", "driver_gender": "M", "driver_age": 30, "driver_race": "Asian",
+            "search_conducted": 0, "search_type": "other", "stop_duration": "0-15 Min",
+            "drugs_related_stop": 0, "vehicle_number": f"TN{officer:04d}{n:04d}",
+        }
+
+    def run(submit_one):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.officers) as pool:
+            list(pool.map(lambda o: [submit_one(o, n) for n in range(args.per_officer)], range(args.officers)))
+        return time.perf_counter() - start
+
+    reset_schema(engine)
+    ensure_key_column(engine)
+    single = text(f"INSERT INTO traffic_project ({', '.join(WRITE_COLUMNS)}) "
+                  f"VALUES ({', '.join(':' + c for c in WRITE_COLUMNS)})")
+
+    def insert_one(officer, n):
+        with engine.begin() as conn:
+            conn.execute(single, {**make_record(officer, n), "idempotency_key": f"r-{officer}-{n}"})
+
+    elapsed = run(insert_one)
+    print(f"per-row INSERT:  {total:,} stops in {elapsed:.2f}s ({total / elapsed:,.0f} stops/sec)")
+
+    reset_schema(engine)
+    writer = StopWriter(engine, max_batch=args.max_batch, max_delay=args.max_delay_ms / 1000)
+
+    def submit_one(officer, n):
+        key = f"g-{officer}-{n}"
+        writer.submit(make_record(officer, n), key)
+        return writer.submit(make_record(officer, n), key).result()  # the double click
+
+    elapsed = run(submit_one)
+    writer.close()
+    print(f"group commit:    {total:,} stops in {elapsed:.2f}s ({total / elapsed:,.0f} stops/sec) {writer.stats()}")